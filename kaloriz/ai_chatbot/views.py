@@ -12,6 +12,7 @@ from ai_chatbot.services.openrouter_client import ask_ai_with_priority
 from ai_chatbot.utils.intent_classifier import classify_intent
 from catalog.models import Product
 from core.models import Order
+from core.services.session_state import clear_chatbot_orders, get_chatbot_orders, set_chatbot_orders
 from shipping.models import District
 
 logger = logging.getLogger(__name__)
@@ -504,9 +505,9 @@ def chatbot_view(request):
             "tracking order",
         )
 
-        chatbot_state = request.session.get("chatbot_state")
-        last_order_ids = request.session.get("chatbot_last_orders") or []
-        awaiting_order_selection = chatbot_state == "awaiting_order_selection"
+        # The order ids offered last time; only set while waiting for a choice.
+        last_order_ids = get_chatbot_orders(request)
+        awaiting_order_selection = bool(last_order_ids)
         looks_like_order_reference = bool(
             re.match(r"(?i)^(ord|inv)[\w-]+$", normalized_message.replace(" ", ""))
         )
@@ -515,8 +516,7 @@ def chatbot_view(request):
         ) or awaiting_order_selection or looks_like_order_reference
 
         def reset_order_session():
-            request.session.pop("chatbot_state", None)
-            request.session.pop("chatbot_last_orders", None)
+            clear_chatbot_orders(request)
 
         if is_track_order_intent:
             try:
@@ -604,8 +604,7 @@ def chatbot_view(request):
                         }
                     )
 
-                request.session["chatbot_state"] = "awaiting_order_selection"
-                request.session["chatbot_last_orders"] = [order.id for order in last_orders]
+                set_chatbot_orders(request, [order.id for order in last_orders])
 
                 lines = ["Berikut 3 pesanan terakhir kamu:"]
                 for idx, order in enumerate(last_orders, start=1):
@@ -1,7 +1,55 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils.html import format_html
 
-from .models import Category, Product, Testimonial, DiscountCode, ContactMessage
+from core.exports import CONTACT_MESSAGE_EXPORT, PRODUCT_EXPORT, export_actions
+
+from .flash_sales import withdraw_campaign_products
+from .importer import ImportFileError, import_products, open_upload, read_rows
+from .promotions import apply_markdown, revert_to_list_price, schedule_flash_sale
+from .models import (
+    Category,
+    ContactMessage,
+    DiscountCode,
+    DiscountRedemption,
+    FlashSaleCampaign,
+    FlashSaleItem,
+    Product,
+    Testimonial,
+)
+
+
+class ProductImportForm(forms.Form):
+    file = forms.FileField(label="File CSV/JSONL", help_text="Kolom wajib: name, category, price")
+    dry_run = forms.BooleanField(label="Uji coba (tanpa menyimpan)", required=False, initial=True)
+    create_categories = forms.BooleanField(label="Buat kategori yang belum ada", required=False)
+
+class BulkPricingForm(forms.Form):
+    percent = forms.DecimalField(
+        label="Diskon (%)", required=False, min_value=0, max_value=100, decimal_places=2
+    )
+    amount = forms.DecimalField(label="Potongan (Rp)", required=False, min_value=0, decimal_places=2)
+    start = forms.DateTimeField(
+        label="Mulai",
+        required=False,
+        input_formats=['%Y-%m-%dT%H:%M', '%Y-%m-%d %H:%M'],
+        widget=forms.DateTimeInput(attrs={'type': 'datetime-local'}),
+        help_text="Kosongkan untuk mulai sekarang (atau pertahankan jadwal yang ada)",
+    )
+    duration_hours = forms.IntegerField(label="Durasi (Jam)", required=False, min_value=1)
+
+    def __init__(self, *args, flash_sale=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        if flash_sale:
+            self.fields['duration_hours'].required = True
+        else:
+            del self.fields['start']
+            del self.fields['duration_hours']
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -38,6 +86,12 @@ class ProductAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     date_hierarchy = 'created_at'
     ordering = ['-created_at']
+    change_list_template = 'admin/catalog/product/change_list.html'
+    actions = export_actions(PRODUCT_EXPORT) + [
+        'apply_markdown_action',
+        'schedule_flash_sale_action',
+        'revert_to_list_price_action',
+    ]
 
     fieldsets = (
         ('Informasi Dasar', {
@@ -69,6 +123,96 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_urls(self):
+        urls = [
+            path(
+                'import/',
+                self.admin_site.admin_view(self.import_view),
+                name='catalog_product_import',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def import_view(self, request):
+        """Upload a CSV/JSONL catalog; dry-run shows the diff before saving."""
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            raise PermissionDenied
+        report = None
+        form = ProductImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            handle, file_format = open_upload(form.cleaned_data['file'])
+            try:
+                report = import_products(
+                    read_rows(handle, file_format),
+                    dry_run=form.cleaned_data['dry_run'],
+                    create_categories=form.cleaned_data['create_categories'],
+                )
+            except ImportFileError as exc:
+                form.add_error('file', str(exc))
+            if report is not None and not report.dry_run:
+                messages.success(
+                    request,
+                    f"Impor selesai: {len(report.created)} produk baru, {len(report.updated)} diperbarui.",
+                )
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Impor Produk',
+            'form': form,
+            'report': report,
+            'diff_lines': report.diff_lines(limit=500) if report else [],
+        }
+        return TemplateResponse(request, 'admin/catalog/product/import.html', context)
+
+    def _bulk_pricing(self, request, queryset, title, flash_sale=False):
+        """Ask for discount parameters, then run one set-based UPDATE."""
+        form = BulkPricingForm(request.POST if 'apply' in request.POST else None, flash_sale=flash_sale)
+        if form.is_valid():
+            data = form.cleaned_data
+            try:
+                if flash_sale:
+                    count = schedule_flash_sale(
+                        queryset,
+                        duration_hours=data['duration_hours'],
+                        start=data['start'],
+                        percent=data['percent'],
+                        amount=data['amount'],
+                    )
+                else:
+                    count = apply_markdown(queryset, percent=data['percent'], amount=data['amount'])
+            except ValueError as exc:
+                form.add_error(None, str(exc))
+            else:
+                messages.success(request, f"{title}: {count} produk diperbarui.")
+                return None
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': title,
+            'form': form,
+            'queryset': queryset,
+            'action': request.POST.get('action'),
+            'selected_ids': request.POST.getlist(ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+            'action_checkbox_name': ACTION_CHECKBOX_NAME,
+        }
+        return TemplateResponse(request, 'admin/catalog/product/bulk_pricing.html', context)
+
+    @admin.action(description="Terapkan diskon massal", permissions=['change'])
+    def apply_markdown_action(self, request, queryset):
+        return self._bulk_pricing(request, queryset, "Diskon Massal")
+
+    @admin.action(description="Jadwalkan flash sale massal", permissions=['change'])
+    def schedule_flash_sale_action(self, request, queryset):
+        return self._bulk_pricing(request, queryset, "Flash Sale Massal", flash_sale=True)
+
+    @admin.action(description="Kembalikan ke harga normal", permissions=['change'])
+    def revert_to_list_price_action(self, request, queryset):
+        count = revert_to_list_price(queryset)
+        messages.success(request, f"{count} produk kembali ke harga normal.")
+
     @admin.display(description='Favorit', ordering='is_featured')
     def favorite_star(self, obj):
         star_color = '#f7c32e' if obj.is_featured else '#d6d6d6'
@@ -100,6 +244,59 @@ class TestimonialAdmin(admin.ModelAdmin):
     )
 
 
+class FlashSaleItemInline(admin.TabularInline):
+    model = FlashSaleItem
+    extra = 1
+    autocomplete_fields = ['product']
+    readonly_fields = ['sold']
+
+
+@admin.register(FlashSaleCampaign)
+class FlashSaleCampaignAdmin(admin.ModelAdmin):
+    list_display = ['name', 'start', 'end', 'status', 'created_at']
+    list_filter = ['status', 'start']
+    search_fields = ['name']
+    readonly_fields = ['status', 'created_at', 'updated_at']
+    inlines = [FlashSaleItemInline]
+
+    def save_related(self, request, form, formsets, change):
+        campaign = form.instance
+        previous_products = set(campaign.items.values_list('product_id', flat=True)) if change else set()
+        super().save_related(request, form, formsets, change)
+        if change and campaign.status != FlashSaleCampaign.STATUS_ENDED:
+            # Products copied from the campaign as it was before this edit keep
+            # that flash price until cleared: dropped ones, or all of them if
+            # the window moved.
+            start, end = form.initial.get('start'), form.initial.get('end')
+            stale = previous_products
+            if (start, end) == (campaign.start, campaign.end):
+                stale -= set(campaign.items.values_list('product_id', flat=True))
+            withdraw_campaign_products(stale, start, end)
+        if campaign.status == FlashSaleCampaign.STATUS_ACTIVE:
+            # Let the scheduler copy the edited prices onto the products again.
+            FlashSaleCampaign.objects.filter(pk=campaign.pk).update(status=FlashSaleCampaign.STATUS_SCHEDULED)
+            self.message_user(
+                request,
+                "Perubahan kampanye yang sedang berlangsung diterapkan saat penjadwal flash sale berjalan berikutnya.",
+                messages.INFO,
+            )
+
+    def delete_model(self, request, obj):
+        self._withdraw([obj])
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        self._withdraw(queryset)
+        super().delete_queryset(request, queryset)
+
+    def _withdraw(self, campaigns):
+        for campaign in campaigns:
+            if campaign.status != FlashSaleCampaign.STATUS_ENDED:
+                withdraw_campaign_products(
+                    campaign.items.values_list('product_id', flat=True), campaign.start, campaign.end
+                )
+
+
 @admin.register(DiscountCode)
 class DiscountCodeAdmin(admin.ModelAdmin):
     list_display = [
@@ -107,6 +304,7 @@ class DiscountCodeAdmin(admin.ModelAdmin):
         'discount_overview',
         'min_spend',
         'allowed_shipping',
+        'usage_overview',
         'active',
         'valid_from',
         'valid_to',
@@ -115,7 +313,7 @@ class DiscountCodeAdmin(admin.ModelAdmin):
     list_filter = ['discount_type', 'allowed_shipping', 'active', 'valid_from', 'valid_to', 'created_at']
     search_fields = ['code']
     ordering = ['-created_at']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['times_used', 'created_at', 'updated_at']
     fieldsets = (
         (None, {
             'fields': ('code', 'active', 'valid_from', 'valid_to')
@@ -130,6 +328,9 @@ class DiscountCodeAdmin(admin.ModelAdmin):
                 'allowed_shipping',
             )
         }),
+        ('Batas Pemakaian', {
+            'fields': ('usage_limit', 'per_user_limit', 'times_used'),
+        }),
         ('Metadata', {
             'fields': ('created_at', 'updated_at'),
         }),
@@ -139,6 +340,22 @@ class DiscountCodeAdmin(admin.ModelAdmin):
     def discount_overview(self, obj):
         return obj.get_type_label()
 
+    @admin.display(description='Pemakaian')
+    def usage_overview(self, obj):
+        return f"{obj.times_used}/{obj.usage_limit}" if obj.usage_limit else f"{obj.times_used}/∞"
+
+
+@admin.register(DiscountRedemption)
+class DiscountRedemptionAdmin(admin.ModelAdmin):
+    list_display = ['discount', 'order', 'user', 'amount', 'created_at']
+    list_filter = ['created_at']
+    search_fields = ['discount__code', 'order__order_number', 'user__username']
+    list_select_related = ['discount', 'order', 'user']
+    readonly_fields = ['discount', 'order', 'user', 'amount', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
 
 @admin.register(ContactMessage)
 class ContactMessageAdmin(admin.ModelAdmin):
@@ -146,3 +363,4 @@ class ContactMessageAdmin(admin.ModelAdmin):
     search_fields = ['name', 'email', 'phone', 'subject', 'message']
     list_filter = ['created_at']
     readonly_fields = ['name', 'email', 'phone', 'subject', 'message', 'created_at']
+    actions = export_actions(CONTACT_MESSAGE_EXPORT)
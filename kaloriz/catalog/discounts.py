@@ -0,0 +1,179 @@
+"""Discount code lookup, validation and redemption.
+
+Codes are stored upper-cased (see ``DiscountCode.save``), so a lookup is an
+exact match on the unique index instead of ``code__iexact``.
+:func:`get_discount_code` caches the row, and unknown codes, for
+``DISCOUNT_CODE_CACHE_TTL`` seconds; saving or deleting a code drops its
+entry.
+
+:func:`evaluate_discount` runs the checks every checkout step needs and
+raises :class:`DiscountError` with the message to show. Usage caps are
+enforced when the order is placed: :func:`redeem_discount` bumps
+``times_used`` with ``UPDATE ... WHERE times_used < usage_limit`` and writes a
+:class:`~catalog.models.DiscountRedemption` inside the order's transaction,
+so concurrent checkouts can never take a capped code past its limit.
+Cancelled orders hand their redemption back.
+
+:func:`find_best_discounts` ranks every code that applies to a checkout in
+one query: validity window, ``min_spend``, courier, global cap and the
+user's own redemption count are filtered in SQL, and only the survivors go
+through ``calculate_discount``.
+"""
+
+from __future__ import annotations
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.formats import number_format
+
+from catalog.models import DiscountCode, DiscountRedemption
+
+CACHE_KEY = "catalog:discount:{code}"
+_MISS = "missing"
+
+
+class DiscountError(Exception):
+    """A discount code that does not apply; ``str(exc)`` is shown to the user."""
+
+
+def _cache_key(code: str) -> str:
+    return CACHE_KEY.format(code=code)
+
+
+def _format_rupiah(value) -> str:
+    return f"Rp {number_format(Decimal(value or 0), decimal_pos=0, force_grouping=True)}"
+
+
+def get_discount_code(code) -> DiscountCode | None:
+    code = DiscountCode.normalize_code(code)
+    if not code:
+        return None
+    key = _cache_key(code)
+    cached = cache.get(key)
+    if cached is None:
+        cached = DiscountCode.objects.filter(code=code).first() or _MISS
+        cache.set(key, cached, getattr(settings, "DISCOUNT_CODE_CACHE_TTL", 60))
+    return None if cached == _MISS else cached
+
+
+def invalidate_discount_code(code) -> None:
+    cache.delete(_cache_key(DiscountCode.normalize_code(code)))
+
+
+def evaluate_discount(
+    discount: DiscountCode,
+    subtotal: Decimal,
+    shipping_cost: Decimal,
+    shipping_method: str | None,
+    user=None,
+) -> Decimal:
+    """Return the discount for this checkout or raise :class:`DiscountError`."""
+
+    if not discount.is_valid():
+        raise DiscountError("Kupon tidak aktif.")
+    if discount.is_usage_exhausted():
+        raise DiscountError("Kuota kupon sudah habis.")
+    if not discount.is_shipping_allowed(shipping_method):
+        raise DiscountError("Kupon tidak berlaku untuk kurir ini.")
+
+    grand_total = subtotal + shipping_cost
+    min_spend = discount.get_min_spend()
+    if grand_total < min_spend:
+        raise DiscountError(f"Minimal belanja {_format_rupiah(min_spend)}")
+
+    if discount.per_user_limit and user is not None and user.is_authenticated:
+        used = DiscountRedemption.objects.filter(discount=discount, user=user).count()
+        if used >= discount.per_user_limit:
+            raise DiscountError("Kupon sudah mencapai batas pemakaian untuk akun Anda.")
+
+    return min(discount.calculate_discount(grand_total), grand_total)
+
+
+def find_best_discounts(
+    subtotal: Decimal,
+    shipping_cost: Decimal,
+    shipping_method: str | None,
+    user=None,
+    limit: int = 4,
+) -> list[tuple[DiscountCode, Decimal]]:
+    """Return up to ``limit`` ``(code, amount)`` pairs, biggest discount first."""
+
+    method = str(shipping_method or "").upper()
+    if not method:
+        return []
+    allowed = [DiscountCode.SHIPPING_BOTH]
+    if method == "EXP":
+        allowed.append(DiscountCode.SHIPPING_EXPRESS)
+    elif method == "REG":
+        allowed.append(DiscountCode.SHIPPING_REGULER)
+
+    now = timezone.now()
+    grand_total = subtotal + shipping_cost
+    candidates = DiscountCode.objects.filter(
+        Q(valid_from__isnull=True) | Q(valid_from__lte=now),
+        Q(valid_to__isnull=True) | Q(valid_to__gte=now),
+        Q(usage_limit=0) | Q(times_used__lt=F("usage_limit")),
+        active=True,
+        min_spend__lte=grand_total,
+        allowed_shipping__in=allowed,
+    )
+    if user is not None and user.is_authenticated:
+        candidates = candidates.annotate(
+            user_redemptions=Count("redemptions", filter=Q(redemptions__user=user))
+        ).filter(Q(per_user_limit=0) | Q(user_redemptions__lt=F("per_user_limit")))
+
+    ranked = []
+    for discount in candidates:
+        amount = min(discount.calculate_discount(grand_total), grand_total)
+        if amount > 0:
+            ranked.append((discount, amount))
+    ranked.sort(key=lambda pair: (-pair[1], pair[0].code))
+    return ranked[:limit]
+
+
+def redeem_discount(discount: DiscountCode, *, user, order, amount: Decimal) -> DiscountRedemption:
+    """Record that ``order`` used ``discount``; call inside the order's transaction."""
+
+    with transaction.atomic():
+        taken = DiscountCode.objects.filter(
+            Q(usage_limit=0) | Q(times_used__lt=F("usage_limit")), pk=discount.pk
+        ).update(times_used=F("times_used") + 1)
+        if not taken:
+            raise DiscountError("Kuota kupon sudah habis.")
+
+        if discount.per_user_limit:
+            # Serialise this user's checkouts so two tabs cannot both pass the check.
+            list(User.objects.select_for_update().filter(pk=user.pk).values_list("pk"))
+            used = DiscountRedemption.objects.filter(discount=discount, user=user).count()
+            if used >= discount.per_user_limit:
+                raise DiscountError("Kupon sudah mencapai batas pemakaian untuk akun Anda.")
+
+        redemption = DiscountRedemption.objects.create(discount=discount, user=user, order=order, amount=amount)
+    if discount.usage_limit:
+        # Cached copies would otherwise report the old ``times_used``.
+        transaction.on_commit(lambda: invalidate_discount_code(discount.code))
+    return redemption
+
+
+def release_discount_redemptions(order_ids) -> int:
+    """Give the codes used by cancelled orders their uses back."""
+
+    redemptions = DiscountRedemption.objects.filter(order_id__in=list(order_ids))
+    counts = dict(
+        redemptions.values("discount_id").annotate(total=Count("pk")).order_by().values_list("discount_id", "total")
+    )
+    for discount_id in sorted(counts):
+        DiscountCode.objects.filter(pk=discount_id).update(
+            times_used=Greatest(F("times_used") - counts[discount_id], 0)
+        )
+    for code in DiscountCode.objects.filter(pk__in=list(counts)).values_list("code", flat=True):
+        invalidate_discount_code(code)
+    redemptions.delete()
+    return sum(counts.values())
@@ -0,0 +1,416 @@
+"""Flash sale campaigns and the cached set of currently active flash sales.
+
+A :class:`~catalog.models.FlashSaleCampaign` lists products with their flash
+price and quota. ``manage.py run_flash_sales`` activates campaigns whose start
+has passed by copying the prices onto the products' ``flash_sale_*`` fields
+(one ``UPDATE`` per distinct price) and clears those fields again once the
+campaign has ended. Flash sales scheduled directly on a product keep working
+the same way.
+
+Which products are on flash sale right now is computed once from those fields
+and cached until the next start or end, keyed on
+:func:`~catalog.promotions.get_price_version` so any price write shows up
+immediately. The home page, product cards and checkout pricing all read that
+set, so a storefront read is one cache lookup and every page agrees on the
+price. :class:`~catalog.middleware.ActiveFlashSalesMiddleware` keeps the set
+for the rest of the request after the first read, so a page listing many
+products still does the cache round trips once.
+
+Campaign items with a quota are sold through :func:`claim_flash_sale_unit`:
+a conditional ``UPDATE ... SET sold = sold + 1 WHERE sold < quota`` takes a
+unit and a :class:`~catalog.models.FlashSaleClaim` holds it for the buyer for
+``FLASH_SALE_HOLD_MINUTES``. Only a line whose every unit is covered by an
+unexpired hold gets the flash price (:func:`flash_sale_unit_price`); larger
+quantities and lapsed holds are sold at the regular price. Placing the order
+attaches the claim to it; holds that run out are handed back by
+:func:`release_expired_flash_sale_claims` (run by the scheduler, and by a
+claimer that finds the quota used up). Both
+lock the item row before touching claims, so claimers and releasers never
+wait on each other in opposite order.
+"""
+
+from __future__ import annotations
+
+import math
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from catalog.models import FlashSaleCampaign, FlashSaleClaim, FlashSaleItem, Product
+from catalog.promotions import FLASH_SALE_FIELDS, _notify, get_price_version
+
+ACTIVE_CACHE_KEY = "catalog:flash_sales:active:{version}"
+# Upper bound for the cache TTL when no boundary is coming up.
+MAX_CACHE_SECONDS = 3600
+# Per-request copy of the active set; ``None`` outside ``request_flash_sales``.
+_request_active: ContextVar[dict | None] = ContextVar("request_active_flash_sales", default=None)
+
+
+class ActiveFlashSale(NamedTuple):
+    price: Decimal
+    end: datetime
+    # Campaign item whose quota has to be claimed; ``None`` when unlimited.
+    item_id: int | None = None
+
+
+class HeldUnits(NamedTuple):
+    units: int
+    expires_at: datetime
+
+
+class FlashSaleSoldOut(Exception):
+    """Raised when every unit of a flash sale quota is claimed."""
+
+
+class FlashSaleHoldExpired(Exception):
+    """Raised when an order carries a flash price whose hold is gone."""
+
+
+def _product_end(product: Product) -> datetime | None:
+    return product.flash_sale_end or product.calculate_flash_sale_end()
+
+
+def next_flash_sale_boundary(now: datetime | None = None) -> datetime | None:
+    """Return the next moment any flash sale or campaign starts or ends."""
+
+    now = now or timezone.now()
+    candidates = []
+    products = Product.objects.filter(is_flash_sale=True, flash_sale_price__isnull=False, flash_sale_start__isnull=False)
+    upcoming = products.filter(flash_sale_start__gt=now).aggregate(at=Min("flash_sale_start"))["at"]
+    ending = products.filter(flash_sale_start__lte=now, flash_sale_end__gt=now).aggregate(at=Min("flash_sale_end"))["at"]
+    candidates.extend([upcoming, ending])
+
+    campaigns = FlashSaleCampaign.objects.exclude(status=FlashSaleCampaign.STATUS_ENDED)
+    candidates.append(campaigns.filter(start__gt=now).aggregate(at=Min("start"))["at"])
+    candidates.append(campaigns.filter(end__gt=now).aggregate(at=Min("end"))["at"])
+    candidates = [moment for moment in candidates if moment is not None]
+    return min(candidates) if candidates else None
+
+
+def _load_active_flash_sales(now: datetime) -> dict[int, ActiveFlashSale]:
+    products = (
+        Product.objects.filter(
+            is_flash_sale=True,
+            flash_sale_price__isnull=False,
+            flash_sale_start__lte=now,
+        )
+        .exclude(flash_sale_end__lte=now)
+        .only("pk", "flash_sale_price", "flash_sale_start", "flash_sale_duration_hours", "flash_sale_end")
+        .order_by("-created_at")
+    )
+    active = {}
+    for product in products:
+        end = _product_end(product)
+        if end is not None and now < end:
+            active[product.pk] = ActiveFlashSale(product.flash_sale_price, end)
+    if active:
+        items = FlashSaleItem.objects.filter(
+            product_id__in=list(active),
+            quota__gt=0,
+            campaign__status=FlashSaleCampaign.STATUS_ACTIVE,
+            campaign__start__lte=now,
+            campaign__end__gt=now,
+        ).values_list("product_id", "pk", "campaign__end")
+        for product_id, item_id, end in items:
+            if active[product_id].end == end:
+                active[product_id] = active[product_id]._replace(item_id=item_id)
+
+    # Campaigns that have started but that the scheduler has not copied onto
+    # the products yet; otherwise a worker would cache the set without them
+    # until their end.
+    started = FlashSaleItem.objects.filter(
+        campaign__status=FlashSaleCampaign.STATUS_SCHEDULED, campaign__start__lte=now, campaign__end__gt=now
+    ).order_by("campaign__start").values_list("product_id", "pk", "price", "quota", "campaign__end")
+    pending = {
+        product_id: ActiveFlashSale(price, end, item_id if quota > 0 else None)
+        for product_id, item_id, price, quota, end in started
+    }
+    if pending:
+        active.update(pending)
+        newest_first = Product.objects.filter(pk__in=list(active)).order_by("-created_at").values_list("pk", flat=True)
+        active = {product_id: active[product_id] for product_id in newest_first}
+    return active
+
+
+def get_active_flash_sales() -> dict[int, ActiveFlashSale]:
+    """Return ``{product_id: ActiveFlashSale}`` ordered newest product first."""
+
+    memo = _request_active.get()
+    if memo is not None and "active" in memo:
+        return memo["active"]
+    key = ACTIVE_CACHE_KEY.format(version=get_price_version())
+    active = cache.get(key)
+    if active is None:
+        now = timezone.now()
+        active = _load_active_flash_sales(now)
+        boundary = next_flash_sale_boundary(now)
+        timeout = MAX_CACHE_SECONDS
+        if boundary is not None:
+            timeout = max(1, min(timeout, math.ceil((boundary - now).total_seconds())))
+        cache.set(key, active, timeout)
+    if memo is not None:
+        memo["active"] = active
+    return active
+
+
+@contextmanager
+def request_flash_sales():
+    """Remember the active set read first inside the block until it exits."""
+
+    token = _request_active.set({})
+    try:
+        yield
+    finally:
+        _request_active.reset(token)
+
+
+def forget_request_flash_sales() -> None:
+    """Drop the remembered set after a price write inside the request."""
+
+    memo = _request_active.get()
+    if memo is not None:
+        memo.clear()
+
+
+def _activate(campaign: FlashSaleCampaign) -> list[int]:
+    by_price = defaultdict(list)
+    for product_id, price in campaign.items.values_list("product_id", "price"):
+        by_price[price].append(product_id)
+    for price, product_ids in by_price.items():
+        Product.objects.filter(pk__in=product_ids).update(
+            is_flash_sale=True,
+            flash_sale_price=price,
+            flash_sale_start=campaign.start,
+            flash_sale_duration_hours=campaign.duration_hours,
+            flash_sale_end=campaign.end,
+            updated_at=timezone.now(),
+        )
+    return [product_id for product_ids in by_price.values() for product_id in product_ids]
+
+
+def _clear(product_ids, start: datetime, end: datetime) -> list[int]:
+    # Leave products alone that were put on another flash sale meanwhile.
+    products = Product.objects.filter(pk__in=product_ids, flash_sale_start=start, flash_sale_end=end)
+    product_ids = list(products.values_list("pk", flat=True))
+    Product.objects.filter(pk__in=product_ids).update(
+        is_flash_sale=False,
+        flash_sale_price=None,
+        flash_sale_start=None,
+        flash_sale_duration_hours=0,
+        flash_sale_end=None,
+        updated_at=timezone.now(),
+    )
+    return product_ids
+
+
+def _expire(campaign: FlashSaleCampaign) -> list[int]:
+    return _clear(campaign.items.values("product_id"), campaign.start, campaign.end)
+
+
+def withdraw_campaign_products(product_ids, start: datetime, end: datetime) -> list[int]:
+    """Take ``product_ids`` off a campaign's flash sale that ran ``start``-``end``.
+
+    For products dropped from (or a whole deleted) campaign whose flash fields
+    the scheduler has already set; products since put on another sale are
+    left alone.
+    """
+
+    with transaction.atomic():
+        product_ids = _clear(list(product_ids), start, end)
+        _notify(product_ids, FLASH_SALE_FIELDS)
+    return product_ids
+
+
+def _hold_window() -> timedelta:
+    return timedelta(minutes=getattr(settings, "FLASH_SALE_HOLD_MINUTES", 15))
+
+
+def _take_unit(item_id: int) -> bool:
+    return bool(FlashSaleItem.objects.filter(pk=item_id, sold__lt=F("quota")).update(sold=F("sold") + 1))
+
+
+def _return_units(item_id: int, count: int) -> None:
+    if count:
+        FlashSaleItem.objects.filter(pk=item_id).update(sold=Greatest(F("sold") - count, 0))
+
+
+def claim_flash_sale_unit(product: Product, user, now: datetime | None = None) -> FlashSaleClaim | None:
+    """Hold one unit of ``product``'s flash sale quota for ``user``.
+
+    A user who already holds a unit keeps it with a renewed hold. Returns
+    ``None`` if the product's flash sale has no quota; raises
+    :class:`FlashSaleSoldOut` once the quota is used up.
+    """
+
+    flash_sale = product.active_flash_sale
+    if flash_sale is None or flash_sale.item_id is None:
+        return None
+    return claim_flash_sale_item(flash_sale.item_id, user, now)
+
+
+def claim_flash_sale_item(item_id: int, user, now: datetime | None = None) -> FlashSaleClaim:
+    now = now or timezone.now()
+    expires_at = now + _hold_window()
+    open_claims = FlashSaleClaim.objects.filter(item_id=item_id, user=user, order__isnull=True)
+
+    with transaction.atomic():
+        if open_claims.filter(expires_at__gt=now).update(expires_at=expires_at):
+            return open_claims.get()
+        if not _take_unit(item_id):
+            release_expired_flash_sale_claims(now, item_ids=[item_id])
+            if not _take_unit(item_id):
+                raise FlashSaleSoldOut(item_id)
+
+        # The item row is locked now; drop this user's lapsed hold so the new one fits.
+        lapsed, _ = open_claims.filter(expires_at__lte=now).delete()
+        _return_units(item_id, lapsed)
+        try:
+            with transaction.atomic():
+                return FlashSaleClaim.objects.create(item_id=item_id, user=user, expires_at=expires_at)
+        except IntegrityError:
+            # A double click got there first; keep its unit and give ours back.
+            _return_units(item_id, 1)
+            return open_claims.get()
+
+
+def release_expired_flash_sale_claims(now: datetime | None = None, item_ids=None) -> int:
+    """Hand back units whose hold ran out without an order."""
+
+    now = now or timezone.now()
+    expired = FlashSaleClaim.objects.filter(order__isnull=True, expires_at__lte=now)
+    if item_ids is not None:
+        expired = expired.filter(item_id__in=item_ids)
+    pending = sorted(set(expired.values_list("item_id", flat=True)))
+    released = 0
+    for item_id in pending:
+        with transaction.atomic():
+            list(FlashSaleItem.objects.select_for_update().filter(pk=item_id).values_list("pk"))
+            deleted, _ = expired.filter(item_id=item_id).delete()
+            _return_units(item_id, deleted)
+            released += deleted
+    return released
+
+
+def held_flash_sale_units(user, products, now: datetime | None = None) -> dict[int, HeldUnits]:
+    """Return ``{product_id: HeldUnits}`` for the user's unexpired holds.
+
+    Only products on a flash sale with a quota are looked up, so carts
+    without one cost no query.
+    """
+
+    item_ids = [
+        product.active_flash_sale.item_id
+        for product in products
+        if product.active_flash_sale is not None and product.active_flash_sale.item_id is not None
+    ]
+    if not item_ids or user is None:
+        return {}
+    rows = (
+        FlashSaleClaim.objects.filter(
+            user=user, order__isnull=True, expires_at__gt=now or timezone.now(), item_id__in=item_ids
+        )
+        .values("item__product_id")
+        .annotate(units=Count("pk"), expires_at=Min("expires_at"))
+        .order_by()
+        .values_list("item__product_id", "units", "expires_at")
+    )
+    return {product_id: HeldUnits(units, expires_at) for product_id, units, expires_at in rows}
+
+
+def flash_sale_unit_price(product: Product, quantity: int, held_units: int) -> Decimal:
+    """Return the unit price for a line of ``quantity`` units of ``product``.
+
+    A flash sale with a quota gives its price only to a line fully covered by
+    ``held_units``; one line cannot carry two prices, so anything more sells
+    at the regular price.
+    """
+
+    flash_sale = product.active_flash_sale
+    if flash_sale is not None and flash_sale.item_id is not None and quantity > held_units:
+        return product.get_regular_price()
+    return product.get_display_price()
+
+
+def attach_flash_sale_claims(order, user, product_ids, now: datetime | None = None) -> dict[int, int]:
+    """Mark the user's unexpired holds for ``product_ids`` as sold with ``order``.
+
+    Returns ``{product_id: units}`` attached; attached claims no longer expire.
+    """
+
+    FlashSaleClaim.objects.filter(
+        user=user, order__isnull=True, expires_at__gt=now or timezone.now(), item__product_id__in=list(product_ids)
+    ).update(order=order)
+    return dict(
+        FlashSaleClaim.objects.filter(order=order)
+        .values("item__product_id")
+        .annotate(units=Count("pk"))
+        .order_by()
+        .values_list("item__product_id", "units")
+    )
+
+
+def release_order_flash_sale_claims(order_ids) -> int:
+    """Return the flash sale units of cancelled orders to their quota."""
+
+    claims = FlashSaleClaim.objects.filter(order_id__in=list(order_ids))
+    counts = dict(claims.values("item_id").annotate(total=Count("pk")).order_by().values_list("item_id", "total"))
+    for item_id in sorted(counts):
+        _return_units(item_id, counts[item_id])
+    claims.delete()
+    return sum(counts.values())
+
+
+def run_flash_sale_scheduler(now: datetime | None = None) -> dict:
+    """Expire finished campaigns, activate started ones and release lapsed holds."""
+
+    now = now or timezone.now()
+    released = release_expired_flash_sale_claims(now)
+    expired = activated = 0
+    touched = set()
+    with transaction.atomic():
+        finished = FlashSaleCampaign.objects.select_for_update().filter(
+            status__in=[FlashSaleCampaign.STATUS_SCHEDULED, FlashSaleCampaign.STATUS_ACTIVE], end__lte=now
+        )
+        for campaign in finished:
+            if campaign.status == FlashSaleCampaign.STATUS_ACTIVE:
+                touched.update(_expire(campaign))
+            expired += 1
+        finished.update(status=FlashSaleCampaign.STATUS_ENDED, updated_at=now)
+
+        started = FlashSaleCampaign.objects.select_for_update().filter(
+            status=FlashSaleCampaign.STATUS_SCHEDULED, start__lte=now, end__gt=now
+        ).order_by("start")
+        for campaign in started:
+            touched.update(_activate(campaign))
+            activated += 1
+        started.update(status=FlashSaleCampaign.STATUS_ACTIVE, updated_at=now)
+
+        _notify(sorted(touched), FLASH_SALE_FIELDS)
+    return {
+        "activated": activated,
+        "expired": expired,
+        "products": len(touched),
+        "released": released,
+        "next_boundary": next_flash_sale_boundary(now),
+    }
+
+
+def seconds_until_next_boundary(now: datetime | None = None, default: float = 60) -> float:
+    """Return how long the scheduler can sleep, at most ``default`` seconds."""
+
+    now = now or timezone.now()
+    boundary = next_flash_sale_boundary(now)
+    if boundary is None:
+        return default
+    return max(0.0, min(default, (boundary - now).total_seconds()))
+
@@ -0,0 +1,327 @@
+"""Bulk product import from CSV or JSONL.
+
+Rows are read lazily and processed in batches. Per batch the importer issues
+one query for categories, one for products sharing the batch's slugs (so slug
+collisions are resolved in memory, following ``Product.save``'s ``-1``, ``-2``
+suffixes) and one ``bulk_create(update_conflicts=True)`` keyed on ``slug``.
+``Product.save`` is not called; the touched products are queued for the
+similarity job once the import commits, and products whose price changed are
+announced through ``product_prices_changed`` like the bulk price operations.
+
+A row updates the product whose slug it names. Without a ``slug`` column the
+slug of ``name`` is used, and an existing product with that slug is updated
+only if its name matches; otherwise the row gets the next free suffix.
+Columns missing from a row (or from the whole file) are left untouched on
+existing products; JSONL rows may each carry a different set of keys.
+
+With ``dry_run`` nothing is written and the report lists what would be
+created and which fields would change.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import re
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Iterable, Iterator
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+
+from catalog.models import Category, Product
+from catalog.promotions import PRICE_FIELDS, _notify
+from catalog.similarity import mark_similarity_stale
+
+IMPORT_FIELDS = (
+    "slug", "name", "category", "description", "price", "discount_price", "stock", "available",
+    "calories", "protein", "fat", "carbohydrates", "vitamins", "fiber", "weight_gram", "is_featured",
+)
+REQUIRED_FIELDS = ("name", "category", "price")
+DEFAULT_BATCH_SIZE = 500
+_TRUE_VALUES = {"1", "true", "ya", "yes", "y"}
+_FALSE_VALUES = {"0", "false", "tidak", "no", "n", ""}
+_FORMULA_ESCAPES = ("'=", "'+", "'-", "'@")
+
+
+@dataclass
+class ImportReport:
+    dry_run: bool = False
+    created: list[str] = field(default_factory=list)
+    updated: list[tuple[str, dict]] = field(default_factory=list)
+    unchanged: int = 0
+    errors: list[tuple[int, str]] = field(default_factory=list)
+
+    def diff_lines(self, limit: int | None = None) -> list[str]:
+        lines = [f"+ {slug}" for slug in self.created]
+        for slug, changes in self.updated:
+            details = ", ".join(f"{name}: {old!r} → {new!r}" for name, (old, new) in changes.items())
+            lines.append(f"~ {slug} ({details})")
+        lines.extend(f"! baris {line}: {message}" for line, message in self.errors)
+        return lines[:limit] if limit else lines
+
+
+class ImportFileError(Exception):
+    """Raised when the file as a whole cannot be read (encoding, CSV syntax)."""
+
+
+def read_rows(handle, file_format: str) -> Iterator[tuple[int, dict]]:
+    """Yield ``(line_number, row)`` from a CSV or JSONL text stream.
+
+    Raises :class:`ImportFileError` while iterating if the stream is not
+    UTF-8 or not parseable as CSV; :func:`import_products` then rolls back.
+    """
+
+    try:
+        yield from _iter_rows(handle, file_format)
+    except UnicodeDecodeError as exc:
+        raise ImportFileError("File harus berenkode UTF-8.") from exc
+    except csv.Error as exc:
+        raise ImportFileError(f"CSV tidak valid: {exc}") from exc
+
+
+def _iter_rows(handle, file_format: str) -> Iterator[tuple[int, dict]]:
+    if file_format == "jsonl":
+        for line_number, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield line_number, {"__error__": f"JSON tidak valid: {exc}"}
+                continue
+            yield line_number, row if isinstance(row, dict) else {"__error__": "Baris harus berupa objek JSON"}
+        return
+
+    reader = csv.DictReader(handle)
+    for line_number, row in enumerate(reader, start=2):
+        yield line_number, row
+
+
+def open_upload(uploaded_file) -> tuple[io.TextIOWrapper, str]:
+    """Wrap an uploaded file as text and guess its format from the extension."""
+
+    file_format = "jsonl" if uploaded_file.name.lower().endswith((".jsonl", ".json")) else "csv"
+    return io.TextIOWrapper(uploaded_file.file, encoding="utf-8-sig", newline=""), file_format
+
+
+def _clean_value(name: str, raw):
+    model_field = Product._meta.get_field(name)
+    if isinstance(raw, str):
+        raw = raw.strip()
+        if raw.startswith(_FORMULA_ESCAPES):
+            raw = raw[1:]
+    if model_field.get_internal_type() == "BooleanField" and not isinstance(raw, bool):
+        text = str(raw or "").lower()
+        if text not in _TRUE_VALUES | _FALSE_VALUES:
+            raise ValidationError(f"{name}: nilai boolean tidak dikenal ({raw})")
+        return text in _TRUE_VALUES
+    if raw in ("", None):
+        if model_field.null:
+            return None
+        if model_field.has_default():
+            return model_field.get_default()
+        if model_field.blank:
+            return ""
+    return model_field.clean(raw, None)
+
+
+def _row_columns(row: dict, allowed: set[str] | None) -> tuple[str, ...]:
+    keys = set(row) if allowed is None else set(row) & allowed
+    return tuple(name for name in IMPORT_FIELDS if name in keys | set(REQUIRED_FIELDS))
+
+
+def _clean_row(row: dict, columns: tuple[str, ...]) -> dict:
+    if "__error__" in row:
+        raise ValidationError(row["__error__"])
+    missing = [name for name in REQUIRED_FIELDS if not str(row.get(name) or "").strip()]
+    if missing:
+        raise ValidationError(f"kolom wajib kosong: {', '.join(missing)}")
+
+    values = {"category": str(row["category"]).strip()}
+    for name in columns:
+        if name in ("category", "slug"):
+            continue
+        try:
+            values[name] = _clean_value(name, row.get(name))
+        except ValidationError as exc:
+            raise ValidationError(f"{name}: {'; '.join(exc.messages)}")
+    values["slug"] = slugify(str(row.get("slug") or "")) or None
+    return values
+
+
+class _CategoryResolver:
+    def __init__(self, create_missing: bool, dry_run: bool):
+        self.create_missing = create_missing
+        self.dry_run = dry_run
+        self._by_key: dict[str, Category | None] = {}
+
+    def resolve(self, keys: set[str]) -> None:
+        pending = {key for key in keys if key.lower() not in self._by_key}
+        if not pending:
+            return
+        query = Q(slug__in=[slugify(key) for key in pending])
+        for key in pending:
+            query |= Q(name__iexact=key)
+        for category in Category.objects.filter(query):
+            self._by_key[category.name.lower()] = category
+            self._by_key[category.slug] = category
+
+        missing = [key for key in pending if self.get(key) is None]
+        if missing and self.create_missing:
+            new = [Category(name=key, slug=slugify(key)) for key in missing]
+            if not self.dry_run:
+                Category.objects.bulk_create(new, ignore_conflicts=True)
+                new = list(Category.objects.filter(slug__in=[category.slug for category in new]))
+            for category in new:
+                self._by_key[category.name.lower()] = category
+                self._by_key[category.slug] = category
+        for key in pending:
+            # Remember misses so later batches do not query them again.
+            self._by_key.setdefault(key.lower(), None)
+
+    def get(self, key: str) -> Category | None:
+        return self._by_key.get(key.lower()) or self._by_key.get(slugify(key))
+
+
+def _allocate_slugs(rows: list[dict], existing: dict[str, dict]) -> None:
+    """Assign ``slug`` to rows without one, mirroring ``Product.save``."""
+
+    taken = set(existing)
+    claimed = set()
+    for values in rows:
+        if values["slug"]:
+            claimed.add(values["slug"])
+    for values in rows:
+        if values["slug"]:
+            continue
+        base = slugify(values["name"]) or "produk"
+        match = existing.get(base)
+        if base not in claimed and match and match["name"].lower() == values["name"].lower():
+            values["slug"] = base
+        else:
+            candidate, counter = base, 1
+            while candidate in taken or candidate in claimed:
+                candidate = f"{base}-{counter}"
+                counter += 1
+            values["slug"] = candidate
+        claimed.add(values["slug"])
+
+
+def _existing_products(rows: list[dict], columns: Iterable[str]) -> dict[str, dict]:
+    explicit = [values["slug"] for values in rows if values["slug"]]
+    bases = {slugify(values["name"]) or "produk" for values in rows if not values["slug"]}
+    query = Q(slug__in=explicit)
+    if bases:
+        # One pattern instead of an OR per base: "base" or "base-<n>".
+        query |= Q(slug__regex=rf"^({'|'.join(re.escape(base) for base in sorted(bases))})(-[0-9]+)?$")
+    fields = {"pk", "slug", "name", "category_id", *(name for name in columns if name not in ("slug", "category"))}
+    return {row["slug"]: row for row in Product.objects.filter(query).values(*fields)}
+
+
+def _import_batch(batch, allowed, categories: _CategoryResolver, report: ImportReport, repriced: dict) -> list[str]:
+    cleaned = []
+    for line_number, row in batch:
+        try:
+            cleaned.append((line_number, _clean_row(row, _row_columns(row, allowed))))
+        except ValidationError as exc:
+            report.errors.append((line_number, "; ".join(exc.messages)))
+
+    categories.resolve({values["category"] for _, values in cleaned})
+    valid = []
+    for line_number, values in cleaned:
+        category = categories.get(values.pop("category"))
+        if category is None:
+            report.errors.append((line_number, "kategori tidak ditemukan"))
+            continue
+        values["category_id"] = category.pk
+        valid.append(values)
+    if not valid:
+        return []
+
+    # Every column any row in the batch sets; rows lacking one keep the stored value.
+    present = {name for values in valid for name in values}
+    columns = tuple(name for name in IMPORT_FIELDS if name in present or name == "category")
+    existing = _existing_products(valid, columns)
+    _allocate_slugs(valid, existing)
+
+    # Later rows win when a file repeats a slug.
+    by_slug = {values["slug"]: values for values in valid}
+    products = []
+    for slug, values in by_slug.items():
+        current = existing.get(slug)
+        if current is None:
+            report.created.append(slug)
+        else:
+            changes = {
+                name: (current[name], value)
+                for name, value in values.items()
+                if name in current and current[name] != value
+            }
+            if changes:
+                report.updated.append((slug, changes))
+                price_changes = PRICE_FIELDS.intersection(changes)
+                if price_changes:
+                    repriced[current["pk"]] = price_changes
+            else:
+                report.unchanged += 1
+                continue
+            for name in columns:
+                key = "category_id" if name == "category" else name
+                values.setdefault(key, current[key])
+        products.append(Product(**values))
+
+    if report.dry_run or not products:
+        return []
+
+    now = timezone.now()
+    for product in products:
+        product.updated_at = now
+    Product.objects.bulk_create(
+        products,
+        update_conflicts=True,
+        unique_fields=["slug"],
+        update_fields=[name for name in columns if name != "slug"] + ["updated_at"],
+    )
+    return [product.slug for product in products]
+
+
+def import_products(
+    rows: Iterable[tuple[int, dict]],
+    *,
+    columns: Iterable[str] | None = None,
+    dry_run: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    create_categories: bool = False,
+) -> ImportReport:
+    """Validate and upsert ``(line_number, row)`` pairs from :func:`read_rows`."""
+
+    report = ImportReport(dry_run=dry_run)
+    categories = _CategoryResolver(create_categories, dry_run)
+    allowed = None if columns is None else set(columns)
+    rows = iter(rows)
+
+    written_slugs, repriced = [], {}
+    with transaction.atomic():
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            written_slugs.extend(_import_batch(batch, allowed, categories, report, repriced))
+
+        if written_slugs and repriced:
+            _notify(sorted(repriced), tuple(sorted(set().union(*repriced.values()))))
+
+        if written_slugs:
+            transaction.on_commit(
+                lambda: mark_similarity_stale(
+                    Product.objects.filter(slug__in=written_slugs).values_list("pk", flat=True)
+                )
+            )
+    report.errors.sort()
+    return report
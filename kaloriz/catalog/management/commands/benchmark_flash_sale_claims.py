@@ -0,0 +1,113 @@
+"""
+Management command untuk mengukur jalur klaim kuota flash sale di bawah beban.
+
+Membuat kategori, produk, kampanye dan pengguna sementara, lalu menjalankan
+banyak klaim bersamaan dari beberapa thread (masing-masing dengan koneksi
+database sendiri). Di akhir ditampilkan jumlah klaim berhasil, kuota terjual,
+retry/deadlock, klaim yang menyerah setelah --max-attempts percobaan,
+throughput dan latensi; semua data sementara dihapus lagi.
+Jalankan di staging atau database lokal, bukan di produksi.
+
+Usage:
+    python manage.py benchmark_flash_sale_claims
+    python manage.py benchmark_flash_sale_claims --claims 1000 --workers 64 --quota 200
+"""
+
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.utils import timezone
+
+from catalog.flash_sales import FlashSaleSoldOut, claim_flash_sale_item
+from catalog.models import Category, FlashSaleCampaign, FlashSaleItem, Product
+
+
+class Command(BaseCommand):
+    help = 'Uji beban klaim kuota flash sale secara bersamaan dan pastikan tidak ada oversell maupun deadlock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--claims', type=int, default=500, help='Jumlah klaim (satu pengguna per klaim)')
+        parser.add_argument('--workers', type=int, default=32, help='Jumlah thread yang mengklaim bersamaan')
+        parser.add_argument('--quota', type=int, default=100, help='Kuota produk flash sale')
+        parser.add_argument(
+            '--max-attempts', type=int, default=200, help='Batas percobaan per klaim saat database terkunci'
+        )
+
+    def handle(self, *args, **options):
+        claims, workers, quota = options['claims'], options['workers'], options['quota']
+        max_attempts = options['max_attempts']
+        if min(claims, workers, quota, max_attempts) <= 0:
+            raise CommandError('--claims, --workers, --quota dan --max-attempts harus lebih dari 0.')
+
+        tag = f'bench-{uuid.uuid4().hex[:8]}'
+        now = timezone.now()
+        category = Category.objects.create(name=tag)
+        product = Product.objects.create(
+            category=category, name=tag, description=tag, price=Decimal(10000), stock=claims
+        )
+        campaign = FlashSaleCampaign.objects.create(
+            name=tag, start=now, end=now + timedelta(hours=1), status=FlashSaleCampaign.STATUS_ACTIVE
+        )
+        item = FlashSaleItem.objects.create(campaign=campaign, product=product, price=Decimal(5000), quota=quota)
+        User.objects.bulk_create(User(username=f'{tag}-{index}') for index in range(claims))
+        users = list(User.objects.filter(username__startswith=f'{tag}-'))
+
+        lock = threading.Lock()
+        stats = {'claimed': 0, 'sold_out': 0, 'gave_up': 0, 'retries': 0, 'deadlocks': 0}
+        latencies = []
+
+        def claim(user):
+            started = time.monotonic()
+            outcome = 'gave_up'
+            try:
+                for _ in range(max_attempts):
+                    try:
+                        claim_flash_sale_item(item.pk, user)
+                        outcome = 'claimed'
+                        break
+                    except FlashSaleSoldOut:
+                        outcome = 'sold_out'
+                        break
+                    except OperationalError as exc:
+                        # SQLite reports "database is locked" instead of waiting.
+                        with lock:
+                            stats['deadlocks' if 'deadlock' in str(exc).lower() else 'retries'] += 1
+                        time.sleep(0.005)
+            finally:
+                connection.close()
+            with lock:
+                stats[outcome] += 1
+                latencies.append(time.monotonic() - started)
+
+        try:
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(claim, users))
+            elapsed = time.monotonic() - started
+
+            item.refresh_from_db()
+            held = item.claims.count()
+            latencies.sort()
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(
+                f"{claims} klaim oleh {workers} thread dalam {elapsed:.2f}s ({claims / elapsed:.0f} klaim/detik)\n"
+                f"berhasil {stats['claimed']}, kuota habis {stats['sold_out']}, menyerah {stats['gave_up']}, "
+                f"terjual {item.sold}/{quota}, klaim tersimpan {held}\n"
+                f"retry {stats['retries']}, deadlock {stats['deadlocks']}, "
+                f"latensi p50 {statistics.median(latencies) * 1000:.1f}ms, p95 {p95 * 1000:.1f}ms"
+            )
+            if item.sold != held or item.sold > quota or stats['claimed'] != held or stats['deadlocks']:
+                raise CommandError('Kuota tidak konsisten atau terjadi deadlock.')
+            self.stdout.write(self.style.SUCCESS('Tidak ada oversell maupun deadlock'))
+        finally:
+            campaign.delete()
+            category.delete()
+            User.objects.filter(username__startswith=f'{tag}-').delete()
@@ -0,0 +1,69 @@
+"""
+Management command untuk diskon massal, flash sale massal, dan mengembalikan harga normal.
+
+Setiap operasi dijalankan sebagai satu UPDATE berbasis set.
+
+Usage:
+    python manage.py bulk_pricing markdown --category salad --percent 20
+    python manage.py bulk_pricing markdown --products salad-ayam,jus-jeruk --amount 5000
+    python manage.py bulk_pricing flash-sale --category minuman --percent 30 --start "2025-12-12 10:00" --hours 6
+    python manage.py bulk_pricing revert --category salad
+"""
+
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from catalog.models import Product
+from catalog.promotions import apply_markdown, revert_to_list_price, schedule_flash_sale
+
+
+class Command(BaseCommand):
+    help = 'Terapkan diskon/flash sale massal atau kembalikan harga normal untuk kategori atau daftar produk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('operation', choices=['markdown', 'flash-sale', 'revert'], help='Jenis operasi')
+        parser.add_argument('--category', help='Slug kategori')
+        parser.add_argument('--products', help='Daftar slug produk dipisah koma')
+        parser.add_argument('--percent', type=Decimal, help='Diskon dalam persen')
+        parser.add_argument('--amount', type=Decimal, help='Potongan nominal dalam Rupiah')
+        parser.add_argument('--start', help='Mulai flash sale (YYYY-MM-DD HH:MM, default sekarang)')
+        parser.add_argument('--hours', type=int, help='Durasi flash sale dalam jam')
+
+    def handle(self, *args, **options):
+        if not options['category'] and not options['products']:
+            raise CommandError('Isi --category atau --products')
+        queryset = Product.objects.all()
+        if options['category']:
+            queryset = queryset.filter(category__slug=options['category'])
+        if options['products']:
+            queryset = queryset.filter(slug__in=[slug.strip() for slug in options['products'].split(',')])
+
+        start = None
+        if options['start']:
+            try:
+                start = timezone.make_aware(datetime.strptime(options['start'], '%Y-%m-%d %H:%M'))
+            except ValueError:
+                raise CommandError('Format --start harus YYYY-MM-DD HH:MM')
+
+        try:
+            if options['operation'] == 'markdown':
+                count = apply_markdown(queryset, percent=options['percent'], amount=options['amount'])
+            elif options['operation'] == 'flash-sale':
+                if not options['hours']:
+                    raise CommandError('Flash sale membutuhkan --hours')
+                count = schedule_flash_sale(
+                    queryset,
+                    duration_hours=options['hours'],
+                    start=start,
+                    percent=options['percent'],
+                    amount=options['amount'],
+                )
+            else:
+                count = revert_to_list_price(queryset)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(f'{count} produk diperbarui'))
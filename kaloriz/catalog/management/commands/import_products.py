@@ -0,0 +1,57 @@
+"""
+Management command untuk impor produk massal dari CSV atau JSONL.
+
+Kolom yang dikenali: slug, name, category, description, price, discount_price, stock,
+available, calories, protein, fat, carbohydrates, vitamins, fiber, weight_gram, is_featured.
+Wajib: name, category (nama atau slug), price.
+
+Usage:
+    python manage.py import_products katalog.csv --dry-run
+    python manage.py import_products katalog.jsonl --create-categories
+    python manage.py export_records products --output produk.csv   # format yang sama untuk ekspor
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.importer import DEFAULT_BATCH_SIZE, ImportFileError, import_products, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Impor atau perbarui produk massal dari file CSV/JSONL dengan mode uji coba (dry-run)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path file CSV atau JSONL')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Format file (default: dari ekstensi)')
+        parser.add_argument('--dry-run', action='store_true', help='Tampilkan perubahan tanpa menyimpan')
+        parser.add_argument('--create-categories', action='store_true', help='Buat kategori yang belum ada')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Jumlah baris per batch')
+        parser.add_argument('--diff-limit', type=int, default=200, help='Jumlah baris laporan diff yang ditampilkan')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.lower().endswith(('.jsonl', '.json')) else 'csv')
+        try:
+            handle = open(path, encoding='utf-8-sig', newline='')
+        except OSError as exc:
+            raise CommandError(f'Tidak dapat membuka {path}: {exc}')
+
+        with handle:
+            try:
+                report = import_products(
+                    read_rows(handle, file_format),
+                    dry_run=options['dry_run'],
+                    batch_size=options['batch_size'],
+                    create_categories=options['create_categories'],
+                )
+            except ImportFileError as exc:
+                raise CommandError(f'{path}: {exc}')
+
+        for line in report.diff_lines(limit=options['diff_limit']):
+            self.stdout.write(line)
+        prefix = '[DRY RUN] ' if report.dry_run else ''
+        summary = (
+            f'{prefix}{len(report.created)} baru, {len(report.updated)} diperbarui, '
+            f'{report.unchanged} tidak berubah, {len(report.errors)} error'
+        )
+        style = self.style.WARNING if report.errors else self.style.SUCCESS
+        self.stdout.write(style(summary))
@@ -0,0 +1,38 @@
+"""
+Management command untuk membangun ulang indeks kemiripan produk (nutrisi & harga).
+
+Perubahan produk hanya dicatat di antrean; jalankan ``--stale`` berkala (mis. tiap
+beberapa menit lewat cron) agar produk serupa ikut diperbarui.
+
+Usage:
+    python manage.py rebuild_product_similarity
+    python manage.py rebuild_product_similarity --top-k 12
+    python manage.py rebuild_product_similarity --stale
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.similarity import DEFAULT_TOP_K, rebuild_similarity_index, refresh_stale_product_similarity
+
+
+class Command(BaseCommand):
+    help = 'Hitung ulang produk serupa berdasarkan nutrisi dan harga untuk semua produk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help='Jumlah tetangga per produk')
+        parser.add_argument(
+            '--stale', action='store_true', help='Hanya perbarui produk yang berubah sejak proses terakhir'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['stale']:
+            affected = refresh_stale_product_similarity(k=options['top_k'])
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(f'Kemiripan {len(affected)} produk diperbarui dalam {elapsed:.2f}s'))
+            return
+        written = rebuild_similarity_index(k=options['top_k'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Indeks kemiripan diperbarui: {written} baris dalam {elapsed:.2f}s'))
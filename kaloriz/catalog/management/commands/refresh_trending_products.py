@@ -0,0 +1,32 @@
+"""
+Management command untuk menghitung ulang skor produk trending.
+
+Jalankan berkala (mis. setiap 15 menit lewat cron).
+
+Usage:
+    python manage.py refresh_trending_products
+    python manage.py refresh_trending_products --half-life-hours 48 --sales-weight 10
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.stats import refresh_trending_scores
+
+
+class Command(BaseCommand):
+    help = 'Hitung ulang skor trending produk dari jumlah dilihat dan penjualan dengan peluruhan waktu'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--half-life-hours', type=float, default=None, help='Waktu paruh skor dalam jam')
+        parser.add_argument('--sales-weight', type=float, default=None, help='Bobot satu unit terjual relatif terhadap satu kali dilihat')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with_sales = refresh_trending_scores(
+            half_life_hours=options['half_life_hours'],
+            sales_weight=options['sales_weight'],
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Skor trending diperbarui ({with_sales} produk terjual) dalam {elapsed:.2f}s'))
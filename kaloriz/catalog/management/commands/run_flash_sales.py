@@ -0,0 +1,41 @@
+"""
+Management command untuk mengaktifkan dan mengakhiri kampanye flash sale
+serta melepas kuota yang ditahan terlalu lama tanpa pesanan.
+
+Jalankan setiap menit lewat cron, atau sebagai proses tetap dengan --loop
+yang tidur sampai batas mulai/berakhir berikutnya.
+
+Usage:
+    python manage.py run_flash_sales
+    python manage.py run_flash_sales --loop --max-sleep 30
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from catalog.flash_sales import run_flash_sale_scheduler, seconds_until_next_boundary
+
+
+class Command(BaseCommand):
+    help = 'Aktifkan kampanye flash sale yang sudah dimulai dan akhiri yang sudah selesai'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Terus berjalan dan bangun tepat di batas kampanye berikutnya')
+        parser.add_argument('--max-sleep', type=float, default=60, help='Jeda maksimum antar pengecekan dalam detik (mode --loop)')
+
+    def handle(self, *args, **options):
+        while True:
+            result = run_flash_sale_scheduler()
+            next_boundary = result['next_boundary']
+            self.stdout.write(self.style.SUCCESS(
+                f"{result['activated']} kampanye diaktifkan, {result['expired']} diakhiri, "
+                f"{result['products']} produk diperbarui, {result['released']} klaim kedaluwarsa dilepas. "
+                f"Batas berikutnya: "
+                f"{timezone.localtime(next_boundary) if next_boundary else '-'}"
+            ))
+            if not options['loop']:
+                break
+            # Wake up just after the boundary so the campaign is due.
+            time.sleep(seconds_until_next_boundary(default=options['max_sleep']) + 0.5)
@@ -0,0 +1,12 @@
+from .flash_sales import request_flash_sales
+
+
+class ActiveFlashSalesMiddleware:
+    """Read the active flash sale set at most once per request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_flash_sales():
+            return self.get_response(request)
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0009_contactmessage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSimilarity",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rank", models.PositiveSmallIntegerField(verbose_name="Peringkat")),
+                ("score", models.FloatField(verbose_name="Skor Kemiripan")),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similar_entries",
+                        to="catalog.product",
+                        verbose_name="Produk",
+                    ),
+                ),
+                (
+                    "similar",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="catalog.product",
+                        verbose_name="Produk Mirip",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Kemiripan Produk",
+                "verbose_name_plural": "Kemiripan Produk",
+                "ordering": ["product", "rank"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("product", "rank"),
+                        name="unique_product_similarity_rank",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0010_product_similarity"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductStats",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="catalog.product",
+                        verbose_name="Produk",
+                    ),
+                ),
+                (
+                    "view_count",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="Total Dilihat"
+                    ),
+                ),
+                (
+                    "pending_views",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Dilihat Sejak Perhitungan Terakhir"
+                    ),
+                ),
+                (
+                    "recent_views",
+                    models.FloatField(default=0, verbose_name="Dilihat (Meluruh)"),
+                ),
+                (
+                    "recent_sales",
+                    models.FloatField(default=0, verbose_name="Terjual (Meluruh)"),
+                ),
+                (
+                    "trending_score",
+                    models.FloatField(
+                        db_index=True, default=0, verbose_name="Skor Trending"
+                    ),
+                ),
+                (
+                    "last_viewed_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Terakhir Dilihat"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Statistik Produk",
+                "verbose_name_plural": "Statistik Produk",
+            },
+        ),
+    ]
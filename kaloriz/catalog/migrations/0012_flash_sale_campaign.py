@@ -0,0 +1,137 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0011_product_stats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FlashSaleCampaign",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(max_length=200, verbose_name="Nama Kampanye"),
+                ),
+                ("start", models.DateTimeField(verbose_name="Mulai")),
+                ("end", models.DateTimeField(verbose_name="Berakhir")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("scheduled", "Terjadwal"),
+                            ("active", "Berlangsung"),
+                            ("ended", "Selesai"),
+                        ],
+                        default="scheduled",
+                        help_text="Diatur otomatis oleh penjadwal flash sale",
+                        max_length=20,
+                        verbose_name="Status",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Kampanye Flash Sale",
+                "verbose_name_plural": "Kampanye Flash Sale",
+                "ordering": ["-start"],
+            },
+        ),
+        migrations.CreateModel(
+            name="FlashSaleItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "price",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=10, verbose_name="Harga Flash Sale"
+                    ),
+                ),
+                (
+                    "quota",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Jumlah unit yang dijual dengan harga flash sale (0 = tanpa batas)",
+                        verbose_name="Kuota",
+                    ),
+                ),
+                (
+                    "sold",
+                    models.PositiveIntegerField(default=0, verbose_name="Terjual"),
+                ),
+                (
+                    "campaign",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="items",
+                        to="catalog.flashsalecampaign",
+                        verbose_name="Kampanye",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="flash_sale_items",
+                        to="catalog.product",
+                        verbose_name="Produk",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Produk Flash Sale",
+                "verbose_name_plural": "Produk Flash Sale",
+            },
+        ),
+        migrations.AddField(
+            model_name="flashsalecampaign",
+            name="products",
+            field=models.ManyToManyField(
+                related_name="flash_sale_campaigns",
+                through="catalog.FlashSaleItem",
+                to="catalog.product",
+                verbose_name="Produk",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="flashsaleitem",
+            constraint=models.UniqueConstraint(
+                fields=("campaign", "product"), name="unique_flash_sale_item"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="flashsalecampaign",
+            index=models.Index(
+                fields=["status", "start"], name="catalog_campaign_status_start"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="flashsalecampaign",
+            index=models.Index(
+                fields=["status", "end"], name="catalog_campaign_status_end"
+            ),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0012_flash_sale_campaign"),
+        ("core", "0015_order_status_deadline_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FlashSaleClaim",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("expires_at", models.DateTimeField(verbose_name="Ditahan Sampai")),
+                (
+                    "item",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="claims",
+                        to="catalog.flashsaleitem",
+                        verbose_name="Produk Flash Sale",
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="flash_sale_claims",
+                        to="core.order",
+                        verbose_name="Pesanan",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="flash_sale_claims",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Pengguna",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Klaim Flash Sale",
+                "verbose_name_plural": "Klaim Flash Sale",
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("order__isnull", True)),
+                        fields=["expires_at"],
+                        name="catalog_claim_open_expiry",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("order__isnull", True)),
+                        fields=("item", "user"),
+                        name="unique_open_flash_sale_claim",
+                    )
+                ],
+            },
+        ),
+    ]
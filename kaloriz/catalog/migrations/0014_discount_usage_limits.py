@@ -0,0 +1,120 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def normalize_codes(apps, schema_editor):
+    DiscountCode = apps.get_model("catalog", "DiscountCode")
+    max_length = DiscountCode._meta.get_field("code").max_length
+    discounts = list(DiscountCode.objects.order_by("pk"))
+    # Codes already in normal form keep their value; the others fit around them.
+    taken = {discount.code for discount in discounts if discount.code == discount.code.strip().upper()}
+    for discount in discounts:
+        code = discount.code.strip().upper()
+        if code == discount.code:
+            continue
+        base, attempt = code, 0
+        while code in taken:
+            # Codes that only differed by case keep working under a visible
+            # suffix, with the base cut short so the result still fits.
+            attempt += 1
+            suffix = f"-{discount.pk}" if attempt == 1 else f"-{discount.pk}-{attempt}"
+            code = base[: max_length - len(suffix)] + suffix
+        taken.add(code)
+        DiscountCode.objects.filter(pk=discount.pk).update(code=code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0013_flash_sale_claim"),
+        ("core", "0015_order_status_deadline_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="discountcode",
+            name="per_user_limit",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Berapa kali satu akun boleh memakai kupon ini. Isi 0 untuk tanpa batas.",
+                verbose_name="Batas per Pengguna",
+            ),
+        ),
+        migrations.AddField(
+            model_name="discountcode",
+            name="times_used",
+            field=models.PositiveIntegerField(default=0, verbose_name="Sudah Dipakai"),
+        ),
+        migrations.AddField(
+            model_name="discountcode",
+            name="usage_limit",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Jumlah pesanan maksimum yang boleh memakai kupon ini. Isi 0 untuk tanpa batas.",
+                verbose_name="Batas Pemakaian",
+            ),
+        ),
+        migrations.CreateModel(
+            name="DiscountRedemption",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "amount",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=12, verbose_name="Potongan"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "discount",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="redemptions",
+                        to="catalog.discountcode",
+                        verbose_name="Kode Diskon",
+                    ),
+                ),
+                (
+                    "order",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="discount_redemption",
+                        to="core.order",
+                        verbose_name="Pesanan",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="discount_redemptions",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Pengguna",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Pemakaian Kode Diskon",
+                "verbose_name_plural": "Pemakaian Kode Diskon",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["discount", "user"], name="catalog_redemption_user_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(normalize_codes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0014_discount_usage_limits"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSimilarityRefresh",
+            fields=[
+                (
+                    "product_id",
+                    models.BigIntegerField(
+                        primary_key=True, serialize=False, verbose_name="ID Produk"
+                    ),
+                ),
+                (
+                    "queued_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Diantrekan Pada"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Antrean Kemiripan Produk",
+                "verbose_name_plural": "Antrean Kemiripan Produk",
+            },
+        ),
+    ]
@@ -1,3 +1,6 @@
+import math
+
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import Q
 from django.contrib.auth.models import User
@@ -192,20 +195,20 @@ class Product(models.Model):
         return reverse('catalog:product_detail', args=[self.slug])
 
     @property
-    def is_flash_sale_active(self):
-        """Return True if flash sale is active at current time"""
-        if not (self.is_flash_sale and self.flash_sale_price):
-            return False
+    def active_flash_sale(self):
+        """Return this product's entry in the cached active flash sale set, if any.
 
-        if not self.flash_sale_start:
-            return False
+        Cards, cart and checkout all read the same set, so they agree on the
+        price even when a sale ends between two requests.
+        """
+        from .flash_sales import get_active_flash_sales
 
-        end_time = self.flash_sale_end or self.calculate_flash_sale_end()
-        if not end_time:
-            return False
+        return get_active_flash_sales().get(self.pk)
 
-        now = timezone.now()
-        return self.flash_sale_start <= now <= end_time
+    @property
+    def is_flash_sale_active(self):
+        """Return True if flash sale is active at current time"""
+        return self.active_flash_sale is not None
 
     def calculate_flash_sale_end(self):
         if self.flash_sale_start and self.flash_sale_duration_hours:
@@ -214,8 +217,13 @@ class Product(models.Model):
 
     def get_display_price(self):
         """Return the active price considering flash sale or discount"""
-        if self.is_flash_sale_active:
-            return self.flash_sale_price
+        flash_sale = self.active_flash_sale
+        if flash_sale is not None:
+            return flash_sale.price
+        return self.get_regular_price()
+
+    def get_regular_price(self):
+        """Return the price outside any flash sale (discount price if set)"""
         if self.discount_price:
             return self.discount_price
         return self.price
@@ -286,6 +294,178 @@ class Testimonial(models.Model):
         return f"{self.user.username} - {self.product.name}"
 
 
+class ProductSimilarity(models.Model):
+    """Precomputed nearest neighbours by nutrition and price (see catalog.similarity)."""
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='similar_entries', verbose_name="Produk"
+    )
+    similar = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', verbose_name="Produk Mirip")
+    rank = models.PositiveSmallIntegerField(verbose_name="Peringkat")
+    score = models.FloatField(verbose_name="Skor Kemiripan")
+
+    class Meta:
+        verbose_name = "Kemiripan Produk"
+        verbose_name_plural = "Kemiripan Produk"
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_product_similarity_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} → {self.similar_id} ({self.score:.3f})"
+
+
+class ProductSimilarityRefresh(models.Model):
+    """Product whose similarity rows are stale, queued for ``rebuild_product_similarity --stale``."""
+
+    # Not a foreign key: deleted products stay queued so their neighbours get recomputed.
+    product_id = models.BigIntegerField(primary_key=True, verbose_name="ID Produk")
+    queued_at = models.DateTimeField(auto_now_add=True, verbose_name="Diantrekan Pada")
+
+    class Meta:
+        verbose_name = "Antrean Kemiripan Produk"
+        verbose_name_plural = "Antrean Kemiripan Produk"
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.queued_at:%Y-%m-%d %H:%M}"
+
+
+class ProductStats(models.Model):
+    """Popularity counters per product, written in batches (see catalog.stats)."""
+
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name='stats', verbose_name="Produk"
+    )
+    view_count = models.PositiveBigIntegerField(default=0, verbose_name="Total Dilihat")
+    pending_views = models.PositiveIntegerField(default=0, verbose_name="Dilihat Sejak Perhitungan Terakhir")
+    recent_views = models.FloatField(default=0, verbose_name="Dilihat (Meluruh)")
+    recent_sales = models.FloatField(default=0, verbose_name="Terjual (Meluruh)")
+    trending_score = models.FloatField(default=0, db_index=True, verbose_name="Skor Trending")
+    last_viewed_at = models.DateTimeField(null=True, blank=True, verbose_name="Terakhir Dilihat")
+
+    class Meta:
+        verbose_name = "Statistik Produk"
+        verbose_name_plural = "Statistik Produk"
+
+    def __str__(self):
+        return f"{self.product_id}: {self.view_count} dilihat, skor {self.trending_score:.2f}"
+
+
+class FlashSaleCampaign(models.Model):
+    """Time-boxed flash sale over several products (see catalog.flash_sales)."""
+
+    STATUS_SCHEDULED = 'scheduled'
+    STATUS_ACTIVE = 'active'
+    STATUS_ENDED = 'ended'
+    STATUS_CHOICES = [
+        (STATUS_SCHEDULED, 'Terjadwal'),
+        (STATUS_ACTIVE, 'Berlangsung'),
+        (STATUS_ENDED, 'Selesai'),
+    ]
+
+    name = models.CharField(max_length=200, verbose_name="Nama Kampanye")
+    start = models.DateTimeField(verbose_name="Mulai")
+    end = models.DateTimeField(verbose_name="Berakhir")
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_SCHEDULED,
+        verbose_name="Status",
+        help_text="Diatur otomatis oleh penjadwal flash sale",
+    )
+    products = models.ManyToManyField(
+        Product, through='FlashSaleItem', related_name='flash_sale_campaigns', verbose_name="Produk"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Kampanye Flash Sale"
+        verbose_name_plural = "Kampanye Flash Sale"
+        ordering = ['-start']
+        indexes = [
+            models.Index(fields=['status', 'start'], name='catalog_campaign_status_start'),
+            models.Index(fields=['status', 'end'], name='catalog_campaign_status_end'),
+        ]
+
+    def clean(self):
+        if self.start and self.end and self.end <= self.start:
+            raise ValidationError({'end': "Waktu berakhir harus setelah waktu mulai."})
+
+    @property
+    def duration_hours(self):
+        return max(1, math.ceil((self.end - self.start).total_seconds() / 3600))
+
+    def __str__(self):
+        return self.name
+
+
+class FlashSaleItem(models.Model):
+    campaign = models.ForeignKey(
+        FlashSaleCampaign, on_delete=models.CASCADE, related_name='items', verbose_name="Kampanye"
+    )
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='flash_sale_items', verbose_name="Produk"
+    )
+    price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Harga Flash Sale")
+    quota = models.PositiveIntegerField(
+        default=0, verbose_name="Kuota", help_text="Jumlah unit yang dijual dengan harga flash sale (0 = tanpa batas)"
+    )
+    sold = models.PositiveIntegerField(default=0, verbose_name="Terjual")
+
+    class Meta:
+        verbose_name = "Produk Flash Sale"
+        verbose_name_plural = "Produk Flash Sale"
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'product'], name='unique_flash_sale_item'),
+        ]
+
+    def __str__(self):
+        return f"{self.campaign} - {self.product}"
+
+
+class FlashSaleClaim(models.Model):
+    """One flash sale unit held for a user until their order is placed.
+
+    Holds without an order are released after ``FLASH_SALE_HOLD_MINUTES``.
+    """
+
+    item = models.ForeignKey(
+        FlashSaleItem, on_delete=models.CASCADE, related_name='claims', verbose_name="Produk Flash Sale"
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='flash_sale_claims', verbose_name="Pengguna")
+    order = models.ForeignKey(
+        'core.Order',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='flash_sale_claims',
+        verbose_name="Pesanan",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(verbose_name="Ditahan Sampai")
+
+    class Meta:
+        verbose_name = "Klaim Flash Sale"
+        verbose_name_plural = "Klaim Flash Sale"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['item', 'user'],
+                condition=Q(order__isnull=True),
+                name='unique_open_flash_sale_claim',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['expires_at'], condition=Q(order__isnull=True), name='catalog_claim_open_expiry'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.item}"
+
+
 class DiscountCode(models.Model):
     TYPE_FLAT = 'flat'
     TYPE_PERCENT = 'percent'
@@ -344,6 +524,17 @@ class DiscountCode(models.Model):
         default=SHIPPING_BOTH,
         verbose_name="Kurir yang Diizinkan",
     )
+    usage_limit = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Batas Pemakaian",
+        help_text="Jumlah pesanan maksimum yang boleh memakai kupon ini. Isi 0 untuk tanpa batas.",
+    )
+    per_user_limit = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Batas per Pengguna",
+        help_text="Berapa kali satu akun boleh memakai kupon ini. Isi 0 untuk tanpa batas.",
+    )
+    times_used = models.PositiveIntegerField(default=0, verbose_name="Sudah Dipakai")
     active = models.BooleanField(default=True, verbose_name="Aktif")
     valid_from = models.DateTimeField(
         null=True,
@@ -368,6 +559,21 @@ class DiscountCode(models.Model):
     def __str__(self):
         return self.code.upper()
 
+    @staticmethod
+    def normalize_code(code) -> str:
+        return str(code or '').strip().upper()
+
+    def clean(self):
+        # Before validate_unique, so "hemat10" clashes with an existing "HEMAT10".
+        self.code = self.normalize_code(self.code)
+
+    def save(self, *args, **kwargs):
+        self.code = self.normalize_code(self.code)
+        super().save(*args, **kwargs)
+
+    def is_usage_exhausted(self) -> bool:
+        return bool(self.usage_limit) and self.times_used >= self.usage_limit
+
     def is_valid(self, now=None):
         if not self.active:
             return False
@@ -425,6 +631,31 @@ class DiscountCode(models.Model):
         return f"{percent_display} cap {cap_display}"
 
 
+class DiscountRedemption(models.Model):
+    """One use of a discount code, written in the same transaction as the order."""
+
+    discount = models.ForeignKey(
+        DiscountCode, on_delete=models.CASCADE, related_name='redemptions', verbose_name="Kode Diskon"
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='discount_redemptions', verbose_name="Pengguna")
+    order = models.OneToOneField(
+        'core.Order', on_delete=models.CASCADE, related_name='discount_redemption', verbose_name="Pesanan"
+    )
+    amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Potongan")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Pemakaian Kode Diskon"
+        verbose_name_plural = "Pemakaian Kode Diskon"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['discount', 'user'], name='catalog_redemption_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.discount} - {self.order_id}"
+
+
 class ContactMessage(models.Model):
     name = models.CharField(max_length=150, verbose_name="Nama")
     email = models.EmailField(verbose_name="Email")
@@ -0,0 +1,135 @@
+"""Set-based price operations for many products at once.
+
+Each operation is a single ``UPDATE`` over the given queryset; discount and
+flash-sale prices and ``flash_sale_end`` are computed by the database, so a
+category-wide markdown costs one statement instead of one ``save()`` per
+product. Afterwards :data:`catalog.signals.product_prices_changed` is sent so
+price-dependent caches can drop their entries; they key on
+:func:`get_price_version`, which the default receiver bumps.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DateTimeField, DecimalField, ExpressionWrapper, F, Value
+from django.db.models.functions import Coalesce, Greatest, Round
+from django.utils import timezone
+
+from catalog.models import Product
+
+PRICE_VERSION_KEY = "catalog:price_version"
+MIN_PRICE = Decimal("1")
+FLASH_SALE_FIELDS = (
+    "is_flash_sale", "flash_sale_price", "flash_sale_start", "flash_sale_duration_hours", "flash_sale_end",
+)
+# Product fields behind ``get_display_price``; only writes to these bump the price version.
+PRICE_FIELDS = frozenset(("price", "discount_price") + FLASH_SALE_FIELDS)
+
+
+def get_price_version() -> int:
+    """Return a counter that changes whenever product prices change."""
+
+    return cache.get_or_set(PRICE_VERSION_KEY, 1, None)
+
+
+def bump_price_version() -> None:
+    try:
+        cache.incr(PRICE_VERSION_KEY)
+    except ValueError:
+        cache.set(PRICE_VERSION_KEY, 2, None)
+
+
+def _price_expression(percent: Decimal | None, amount: Decimal | None):
+    if (percent is None) == (amount is None):
+        raise ValueError("Isi salah satu: persentase atau potongan nominal.")
+    if percent is not None:
+        if not 0 < percent < 100:
+            raise ValueError("Persentase harus di antara 0 dan 100.")
+        expression = Round(F("price") * Value((Decimal(100) - percent) / Decimal(100)))
+    else:
+        if amount <= 0:
+            raise ValueError("Potongan nominal harus lebih dari 0.")
+        expression = F("price") - Value(amount)
+    return Greatest(
+        ExpressionWrapper(expression, output_field=DecimalField(max_digits=10, decimal_places=2)),
+        Value(MIN_PRICE),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def _notify(product_ids: list[int], fields: tuple[str, ...]) -> None:
+    from catalog.signals import product_prices_changed
+
+    if product_ids:
+        transaction.on_commit(
+            lambda: product_prices_changed.send(sender=Product, product_ids=product_ids, fields=fields)
+        )
+
+
+def _bulk_update(queryset, fields: dict) -> int:
+    with transaction.atomic():
+        product_ids = list(queryset.values_list("pk", flat=True))
+        updated = Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now(), **fields)
+        _notify(product_ids, tuple(fields))
+    return updated
+
+
+def apply_markdown(queryset, *, percent: Decimal | None = None, amount: Decimal | None = None) -> int:
+    """Set ``discount_price`` from list price minus a percentage or a fixed amount."""
+
+    return _bulk_update(queryset, {"discount_price": _price_expression(percent, amount)})
+
+
+def schedule_flash_sale(
+    queryset,
+    *,
+    duration_hours: int,
+    start: datetime | None = None,
+    percent: Decimal | None = None,
+    amount: Decimal | None = None,
+) -> int:
+    """Put products on flash sale for ``duration_hours`` starting at ``start``.
+
+    Without ``start`` products keep a start they already have, otherwise
+    start now; ``flash_sale_end`` is derived from that per row in SQL.
+    """
+
+    if duration_hours <= 0:
+        raise ValueError("Durasi flash sale harus lebih dari 0 jam.")
+    start_expression = (
+        Value(start, output_field=DateTimeField())
+        if start is not None
+        else Coalesce(F("flash_sale_start"), Value(timezone.now(), output_field=DateTimeField()))
+    )
+    return _bulk_update(
+        queryset,
+        {
+            "is_flash_sale": True,
+            "flash_sale_price": _price_expression(percent, amount),
+            "flash_sale_start": start_expression,
+            "flash_sale_duration_hours": duration_hours,
+            "flash_sale_end": ExpressionWrapper(
+                start_expression + Value(timedelta(hours=duration_hours)), output_field=DateTimeField()
+            ),
+        },
+    )
+
+
+def revert_to_list_price(queryset) -> int:
+    """Drop discounts and flash sales so products sell at ``price`` again."""
+
+    return _bulk_update(
+        queryset,
+        {
+            "discount_price": None,
+            "is_flash_sale": False,
+            "flash_sale_price": None,
+            "flash_sale_start": None,
+            "flash_sale_duration_hours": 0,
+            "flash_sale_end": None,
+        },
+    )
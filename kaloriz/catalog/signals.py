@@ -0,0 +1,41 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .discounts import invalidate_discount_code
+from .flash_sales import forget_request_flash_sales
+from .models import DiscountCode, Product
+from .promotions import PRICE_FIELDS, bump_price_version
+from .similarity import SIMILARITY_FIELDS, mark_similarity_stale
+
+# Sent after set-based price updates (catalog.promotions), which bypass post_save.
+# Arguments: ``product_ids`` and ``fields``.
+product_prices_changed = Signal()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def queue_similarity_refresh(sender, instance, update_fields=None, **kwargs):
+    """Queue this product for the similarity job if a feature may have changed."""
+    if update_fields is not None and not SIMILARITY_FIELDS.intersection(update_fields):
+        return
+    product_id = instance.pk
+    transaction.on_commit(lambda: mark_similarity_stale([product_id]))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(product_prices_changed, sender=Product)
+def invalidate_price_caches(sender, update_fields=None, **kwargs):
+    """Move price-dependent caches to a new key space once a price write commits."""
+    if update_fields is not None and not PRICE_FIELDS.intersection(update_fields):
+        return
+    transaction.on_commit(bump_price_version)
+    transaction.on_commit(forget_request_flash_sales)
+
+
+@receiver(post_save, sender=DiscountCode)
+@receiver(post_delete, sender=DiscountCode)
+def invalidate_discount_code_cache(sender, instance, **kwargs):
+    code = instance.code
+    transaction.on_commit(lambda: invalidate_discount_code(code))
@@ -0,0 +1,183 @@
+"""Nutrition and price similarity index for "related products".
+
+Each available product becomes a vector of ``calories``, ``protein``, ``fat``,
+``carbohydrates``, ``fiber`` and ``price``. Columns are z-scored (missing
+values take the column mean), weighted and L2-normalized, so a single matrix
+product gives cosine similarity for every pair. The top-k neighbours of each
+product are stored in :class:`~catalog.models.ProductSimilarity`.
+
+:func:`refresh_product_similarity` only rewrites the rows a product change can
+affect; normalization statistics drift slightly between full rebuilds, which
+``manage.py rebuild_product_similarity`` resets. Product writes only queue the
+product in :class:`~catalog.models.ProductSimilarityRefresh`;
+``rebuild_product_similarity --stale`` refreshes the queued products in one
+pass, outside the request that changed them.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from catalog.models import Product, ProductSimilarity, ProductSimilarityRefresh
+
+FEATURE_FIELDS = ("calories", "protein", "fat", "carbohydrates", "fiber", "price")
+# Saves that touch none of these (e.g. checkout's stock updates) leave the index alone.
+SIMILARITY_FIELDS = frozenset(FEATURE_FIELDS + ("available", "category", "category_id"))
+FEATURE_WEIGHTS = np.array([1.0, 1.0, 1.0, 1.0, 1.0, 0.5], dtype=np.float32)
+DEFAULT_TOP_K = 8
+
+
+def _normalize(raw: np.ndarray) -> np.ndarray:
+    missing = np.isnan(raw)
+    counts = np.maximum((~missing).sum(axis=0), 1)
+    means = np.where(missing, 0.0, raw).sum(axis=0) / counts
+    filled = np.where(missing, means, raw)
+
+    stds = filled.std(axis=0)
+    stds[stds == 0] = 1.0
+    vectors = (filled - means) / stds * FEATURE_WEIGHTS
+
+    norms = np.linalg.norm(vectors, axis=1)
+    norms[norms == 0] = 1.0
+    return (vectors / norms[:, None]).astype(np.float32)
+
+
+def load_feature_matrix() -> tuple[np.ndarray, np.ndarray]:
+    """Return ``(product_ids, unit_vectors)`` for every available product."""
+
+    rows = list(Product.objects.filter(available=True).order_by("pk").values_list("pk", *FEATURE_FIELDS))
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(FEATURE_FIELDS)), dtype=np.float32)
+
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    raw = np.array(
+        [[np.nan if value is None else float(value) for value in row[1:]] for row in rows],
+        dtype=np.float64,
+    )
+    return ids, _normalize(raw)
+
+
+def _top_k(row_positions: np.ndarray, ids: np.ndarray, matrix: np.ndarray, k: int) -> dict[int, list]:
+    """Return ``{product_id: [(similar_id, score), ...]}`` for the given rows."""
+
+    k = min(k, len(ids) - 1)
+    if k <= 0 or not len(row_positions):
+        return {int(ids[position]): [] for position in row_positions}
+
+    scores = matrix[row_positions] @ matrix.T
+    scores[np.arange(len(row_positions)), row_positions] = -np.inf
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+
+    result = {}
+    for row, position in enumerate(row_positions):
+        ranked = candidates[row][order[row]]
+        result[int(ids[position])] = [(int(ids[col]), float(scores[row, col])) for col in ranked]
+    return result
+
+
+def _write_neighbours(stale_rows, neighbours: dict[int, list]) -> None:
+    entries = [
+        ProductSimilarity(product_id=product_id, similar_id=similar_id, rank=rank, score=score)
+        for product_id, ranked in neighbours.items()
+        for rank, (similar_id, score) in enumerate(ranked, start=1)
+    ]
+    with transaction.atomic():
+        stale_rows.delete()
+        ProductSimilarity.objects.bulk_create(entries, batch_size=500)
+
+
+def rebuild_similarity_index(*, k: int = DEFAULT_TOP_K) -> int:
+    """Recompute neighbours for every product; return the number of rows written."""
+
+    started = timezone.now()
+    ids, matrix = load_feature_matrix()
+    neighbours = _top_k(np.arange(len(ids)), ids, matrix, k)
+    _write_neighbours(ProductSimilarity.objects.all(), neighbours)
+    # Everything queued before the features were read is covered by this rebuild.
+    ProductSimilarityRefresh.objects.filter(queued_at__lte=started).delete()
+    return sum(len(ranked) for ranked in neighbours.values())
+
+
+def refresh_product_similarity(changed_ids: Iterable[int], *, k: int = DEFAULT_TOP_K) -> set[int]:
+    """Recompute only the rows affected by changes to ``changed_ids``.
+
+    A row is affected when its product changed, when it currently lists a
+    changed product, or when a changed product now scores above its weakest
+    stored neighbour. Returns the ids whose rows were rewritten.
+    """
+
+    changed = {int(pk) for pk in changed_ids}
+    if not changed:
+        return set()
+
+    ids, matrix = load_feature_matrix()
+    position_by_id = {int(pk): position for position, pk in enumerate(ids)}
+
+    affected = set(changed)
+    affected.update(ProductSimilarity.objects.filter(similar_id__in=changed).values_list("product_id", flat=True))
+
+    # Rows that lost a neighbour (deleted or unavailable products) or that a
+    # changed product now beats must be recomputed as well.
+    changed_positions = [position_by_id[pk] for pk in changed if pk in position_by_id]
+    best_new_scores = (matrix[changed_positions] @ matrix.T).max(axis=0) if changed_positions else None
+    weakest = {
+        row["product_id"]: (row["weakest"], row["size"])
+        for row in ProductSimilarity.objects.values("product_id").annotate(weakest=Min("score"), size=Count("id"))
+    }
+    capacity = min(k, len(ids) - 1)
+    for pk, position in position_by_id.items():
+        weakest_score, size = weakest.get(pk, (None, 0))
+        if size < capacity:
+            affected.add(pk)
+        elif weakest_score is not None and best_new_scores is not None and best_new_scores[position] > weakest_score:
+            affected.add(pk)
+
+    present = np.array(sorted(position_by_id[pk] for pk in affected if pk in position_by_id), dtype=np.int64)
+    _write_neighbours(
+        ProductSimilarity.objects.filter(product_id__in=affected),
+        _top_k(present, ids, matrix, k),
+    )
+    return affected
+
+
+def mark_similarity_stale(product_ids: Iterable[int]) -> None:
+    """Queue products for the next ``rebuild_product_similarity --stale`` run."""
+
+    ProductSimilarityRefresh.objects.bulk_create(
+        [ProductSimilarityRefresh(product_id=pk) for pk in set(product_ids)],
+        update_conflicts=True,
+        unique_fields=["product_id"],
+        update_fields=["queued_at"],
+    )
+
+
+def refresh_stale_product_similarity(*, k: int = DEFAULT_TOP_K) -> set[int]:
+    """Refresh the rows affected by every queued product and dequeue them."""
+
+    started = timezone.now()
+    changed = set(ProductSimilarityRefresh.objects.values_list("product_id", flat=True))
+    if not changed:
+        return set()
+    with transaction.atomic():
+        affected = refresh_product_similarity(changed, k=k)
+        # A product queued again after the features were read waits for the next run.
+        ProductSimilarityRefresh.objects.filter(product_id__in=changed, queued_at__lte=started).delete()
+    return affected
+
+
+def get_similar_products(product: Product, limit: int = 4) -> list[Product]:
+    """Return up to ``limit`` stored neighbours of ``product`` in one query."""
+
+    entries = (
+        ProductSimilarity.objects.filter(product=product, similar__available=True)
+        .select_related("similar")
+        .order_by("rank")[:limit]
+    )
+    return [entry.similar for entry in entries]
@@ -0,0 +1,169 @@
+"""Buffered product view counters and the trending score.
+
+:func:`record_product_view` only bumps an in-process counter. Once
+``PRODUCT_VIEW_FLUSH_INTERVAL`` seconds have passed the buffer is swapped out
+and written to :class:`~catalog.models.ProductStats` with one ``UPDATE`` per
+distinct increment, so a popular product costs one row write per interval
+instead of one per page view.
+
+:func:`refresh_trending_scores` (``manage.py refresh_trending_products``)
+decays the stored view score to the current time, folds in the views flushed
+since the previous run, adds time-decayed units sold and stores the sum in
+``trending_score``. The home page only reads that indexed column.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from catalog.models import Product, ProductStats
+from core.models import JobWatermark, Order, OrderItem
+
+TRENDING_JOB = "trending_scores"
+DEFAULT_HALF_LIFE_HOURS = 72
+DEFAULT_SALES_WEIGHT = 5.0
+# Sales older than this many half-lives contribute less than 1/32 and are skipped.
+SALES_WINDOW_HALF_LIVES = 5
+
+logger = logging.getLogger(__name__)
+
+
+def write_view_counts(counts: dict[int, int]) -> None:
+    """Add ``{product_id: views}`` to ``ProductStats`` with set-based updates."""
+
+    product_ids = set(Product.objects.filter(pk__in=list(counts)).values_list("pk", flat=True))
+    by_increment = defaultdict(list)
+    for product_id, increment in counts.items():
+        if product_id in product_ids:
+            by_increment[increment].append(product_id)
+
+    now = timezone.now()
+    with transaction.atomic():
+        ProductStats.objects.bulk_create(
+            [ProductStats(product_id=product_id) for product_id in product_ids], ignore_conflicts=True
+        )
+        for increment, ids in by_increment.items():
+            ProductStats.objects.filter(product_id__in=ids).update(
+                view_count=F("view_count") + increment,
+                pending_views=F("pending_views") + increment,
+                last_viewed_at=now,
+            )
+
+
+class ViewCounterBuffer:
+    """Thread-safe per-process view counter flushed in batches."""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def add(self, product_id: int) -> None:
+        interval = getattr(settings, "PRODUCT_VIEW_FLUSH_INTERVAL", 5)
+        with self._lock:
+            self._counts[product_id] += 1
+            due = time.monotonic() - self._last_flush >= interval
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write buffered views; return how many were written."""
+
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._last_flush = time.monotonic()
+        if not counts:
+            return 0
+        try:
+            write_view_counts(counts)
+        except DatabaseError:
+            logger.exception("Failed to flush %s product views; keeping them for the next flush", len(counts))
+            with self._lock:
+                self._counts.update(counts)
+            return 0
+        return sum(counts.values())
+
+
+view_buffer = ViewCounterBuffer()
+atexit.register(view_buffer.flush)
+
+
+def record_product_view(product_id: int) -> None:
+    view_buffer.add(product_id)
+
+
+def _recent_sales(now, half_life_seconds: float) -> dict[int, float]:
+    since = now - timedelta(seconds=half_life_seconds * SALES_WINDOW_HALF_LIVES)
+    rows = list(
+        OrderItem.objects.filter(
+            order__status__in=Order.PAID_STATUSES,
+            order__created_at__gte=since,
+            product__isnull=False,
+        ).values_list("product_id", "quantity", "order__created_at")
+    )
+    if not rows:
+        return {}
+
+    product_ids = np.array([row[0] for row in rows], dtype=np.int64)
+    quantities = np.array([row[1] for row in rows], dtype=np.float64)
+    ages = np.array([(now - row[2]).total_seconds() for row in rows], dtype=np.float64)
+    weights = quantities * np.power(0.5, np.maximum(ages, 0) / half_life_seconds)
+
+    unique_ids, inverse = np.unique(product_ids, return_inverse=True)
+    totals = np.bincount(inverse, weights=weights)
+    return dict(zip(unique_ids.tolist(), totals.tolist()))
+
+
+def refresh_trending_scores(*, half_life_hours: float | None = None, sales_weight: float | None = None) -> int:
+    """Recompute ``trending_score`` for every product; return rows with sales."""
+
+    half_life_hours = half_life_hours or getattr(settings, "TRENDING_HALF_LIFE_HOURS", DEFAULT_HALF_LIFE_HOURS)
+    if sales_weight is None:
+        sales_weight = getattr(settings, "TRENDING_SALES_WEIGHT", DEFAULT_SALES_WEIGHT)
+    half_life_seconds = half_life_hours * 3600
+    now = timezone.now()
+
+    view_buffer.flush()
+    sales = _recent_sales(now, half_life_seconds)
+    watermark, _ = JobWatermark.objects.get_or_create(name=TRENDING_JOB)
+    factor = 1.0
+    if watermark.last_run_at:
+        factor = 0.5 ** (max((now - watermark.last_run_at).total_seconds(), 0) / half_life_seconds)
+
+    with transaction.atomic():
+        ProductStats.objects.bulk_create(
+            [ProductStats(product_id=product_id) for product_id in sales], ignore_conflicts=True
+        )
+        ProductStats.objects.update(
+            recent_views=F("recent_views") * factor + F("pending_views"),
+            pending_views=0,
+            recent_sales=0,
+        )
+        stats = list(ProductStats.objects.filter(product_id__in=list(sales)))
+        for entry in stats:
+            entry.recent_sales = sales[entry.product_id]
+        ProductStats.objects.bulk_update(stats, ["recent_sales"], batch_size=500)
+        ProductStats.objects.update(trending_score=F("recent_views") + F("recent_sales") * sales_weight)
+
+        watermark.last_run_at = now
+        watermark.save(update_fields=["last_run_at"])
+    return len(stats)
+
+
+def get_trending_products(limit: int = 8):
+    """Return the highest ``trending_score`` products from the stored column."""
+
+    return Product.objects.filter(available=True, stats__trending_score__gt=0).order_by(
+        "-stats__trending_score", "pk"
+    )[:limit]
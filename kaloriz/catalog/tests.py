@@ -1,3 +1,707 @@
-from django.test import TestCase
+import csv
+import io
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.discounts import (
+    DiscountError,
+    evaluate_discount,
+    find_best_discounts,
+    get_discount_code,
+    redeem_discount,
+    release_discount_redemptions,
+)
+from catalog.flash_sales import (
+    FlashSaleSoldOut,
+    attach_flash_sale_claims,
+    claim_flash_sale_item,
+    get_active_flash_sales,
+    next_flash_sale_boundary,
+    release_expired_flash_sale_claims,
+    release_order_flash_sale_claims,
+    request_flash_sales,
+    run_flash_sale_scheduler,
+)
+from catalog.importer import import_products, read_rows
+from catalog.promotions import apply_markdown, get_price_version, revert_to_list_price, schedule_flash_sale
+from catalog.models import (
+    Category,
+    DiscountCode,
+    FlashSaleCampaign,
+    FlashSaleClaim,
+    FlashSaleItem,
+    Product,
+    ProductSimilarity,
+    ProductSimilarityRefresh,
+    ProductStats,
+)
+from catalog.similarity import get_similar_products, rebuild_similarity_index, refresh_stale_product_similarity
+from catalog.stats import TRENDING_JOB, refresh_trending_scores, view_buffer
+from core.exports import PRODUCT_EXPORT, iter_csv
+from core.models import Cart, CartItem, JobWatermark, Order, OrderItem
+
+
+class ProductSimilarityTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Makanan")
+        self.chicken = self._product("Dada Ayam", calories=300, protein=40, fat=8, carbohydrates=5, price=40000)
+        self.tuna = self._product("Tuna Bowl", calories=320, protein=38, fat=9, carbohydrates=8, price=42000)
+        self.rice = self._product("Nasi Merah", calories=450, protein=6, fat=3, carbohydrates=90, price=20000)
+        self.oat = self._product("Oatmeal", calories=420, protein=8, fat=5, carbohydrates=85, price=22000)
+        rebuild_similarity_index(k=2)
+
+    def _product(self, name, price, **nutrition):
+        return Product.objects.create(
+            category=self.category,
+            name=name,
+            description=name,
+            price=Decimal(price),
+            **{field: Decimal(value) for field, value in nutrition.items()},
+        )
+
+    def test_nearest_neighbour_follows_nutrition_profile(self):
+        self.assertEqual(get_similar_products(self.chicken, limit=1), [self.tuna])
+        self.assertEqual(get_similar_products(self.rice, limit=1), [self.oat])
+        self.assertEqual(ProductSimilarity.objects.count(), 8)
+
+    def test_detail_page_reads_neighbours_in_one_query(self):
+        with self.assertNumQueries(1):
+            neighbours = get_similar_products(self.chicken)
+
+        self.assertEqual(len(neighbours), 2)
+        response = self.client.get(self.chicken.get_absolute_url())
+        self.assertEqual(list(response.context["related_products"]), neighbours)
+
+    def test_product_change_refreshes_affected_rows(self):
+        self.oat.protein = Decimal(39)
+        self.oat.carbohydrates = Decimal(6)
+        self.oat.calories = 310
+        self.oat.price = Decimal(41000)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.oat.save()
+        self.assertIn(self.oat.pk, refresh_stale_product_similarity(k=2))
+
+        self.assertIn(self.oat, get_similar_products(self.chicken))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tuna.delete()
+        refresh_stale_product_similarity(k=2)
+
+        self.assertEqual(get_similar_products(self.chicken, limit=1), [self.oat])
+        self.assertFalse(ProductSimilarityRefresh.objects.exists())
+
+    def test_stock_saves_do_not_queue_a_refresh(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.oat.stock = 3
+            self.oat.save(update_fields=["stock"])
+        self.assertFalse(ProductSimilarityRefresh.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.oat.save(update_fields=["stock", "price"])
+        self.assertEqual(list(ProductSimilarityRefresh.objects.values_list("product_id", flat=True)), [self.oat.pk])
+        self.assertEqual(len(get_similar_products(self.chicken)), 2)
+
+
+class ProductTrendingTests(TestCase):
+    def setUp(self):
+        view_buffer.flush()
+        category = Category.objects.create(name="Minuman")
+        self.juice = Product.objects.create(category=category, name="Jus", description="Jus", price=Decimal(15000))
+        self.tea = Product.objects.create(category=category, name="Teh", description="Teh", price=Decimal(8000))
+
+    def _sell(self, product, quantity):
+        user = User.objects.create_user(username=f"pembeli{quantity}", password="secret123")
+        order = Order.objects.create(
+            user=user,
+            order_number=f"INV-T{quantity}",
+            status="paid",
+            full_name="Pembeli",
+            email="pembeli@example.com",
+            phone="08123456789",
+            address="Jl. Contoh",
+            city="Makassar",
+            postal_code="90111",
+            subtotal=product.price * quantity,
+            total=product.price * quantity,
+        )
+        OrderItem.objects.create(
+            order=order,
+            product=product,
+            product_name=product.name,
+            product_price=product.price,
+            quantity=quantity,
+            subtotal=product.price * quantity,
+        )
+
+    @override_settings(PRODUCT_VIEW_FLUSH_INTERVAL=3600)
+    def test_views_are_buffered_until_flush(self):
+        for _ in range(3):
+            self.client.get(self.juice.get_absolute_url())
+        self.assertFalse(ProductStats.objects.exists())
+
+        self.assertEqual(view_buffer.flush(), 3)
+        stats = ProductStats.objects.get(product=self.juice)
+        self.assertEqual((stats.view_count, stats.pending_views), (3, 3))
+
+    @override_settings(PRODUCT_VIEW_FLUSH_INTERVAL=0)
+    def test_trending_rail_combines_views_and_sales(self):
+        for _ in range(10):
+            self.client.get(self.juice.get_absolute_url())
+        self._sell(self.tea, 3)
+        refresh_trending_scores(half_life_hours=72, sales_weight=5)
+
+        response = self.client.get("/")
+        self.assertEqual(list(response.context["trending_products"]), [self.tea, self.juice])
+        self.assertAlmostEqual(ProductStats.objects.get(product=self.juice).trending_score, 10)
+
+        JobWatermark.objects.filter(name=TRENDING_JOB).update(last_run_at=timezone.now() - timedelta(hours=72))
+        refresh_trending_scores(half_life_hours=72, sales_weight=5)
+        self.assertAlmostEqual(ProductStats.objects.get(product=self.juice).trending_score, 5, places=3)
+
+
+class ProductImportTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Salad")
+        self.existing = Product.objects.create(
+            category=self.category, name="Salad Ayam", description="Lama", price=Decimal(30000)
+        )
+        self.other = Product.objects.create(
+            category=self.category, name="Salad-Ayam!", description="Lain", price=Decimal(1000)
+        )
+
+    def _import(self, text, **kwargs):
+        return import_products(read_rows(io.StringIO(text), "csv"), **kwargs)
+
+    def test_dry_run_reports_diff_without_writing(self):
+        report = self._import(
+            "name,category,price,stock\n"
+            "Salad Ayam,Salad,32000,5\n"
+            "Salad Tuna,salad,28000,3\n"
+            "Jus Jeruk,Minuman,15000,2\n"
+            "Tanpa Harga,Salad,,1\n",
+            dry_run=True,
+        )
+
+        self.assertEqual(report.created, ["salad-tuna"])
+        self.assertEqual(report.updated[0][0], "salad-ayam")
+        self.assertEqual(report.updated[0][1]["price"], (Decimal("30000.00"), Decimal("32000")))
+        self.assertEqual([line for line, _ in report.errors], [4, 5])
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_import_upserts_with_batched_queries(self):
+        rows = "name,category,price\nSalad Ayam,Salad,32000\n" + "".join(
+            f"Salad Baru,Salad,{10000 + n}\n" for n in range(3)
+        )
+        # Savepoint, categories, existing slugs, upsert, release.
+        with self.assertNumQueries(5):
+            report = import_products(read_rows(io.StringIO(rows), "csv"))
+
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.price, Decimal("32000"))
+        self.assertEqual(self.existing.description, "Lama")
+        self.assertEqual(report.created, ["salad-baru", "salad-baru-1", "salad-baru-2"])
+        self.assertEqual(Product.objects.filter(slug__startswith="salad-baru").count(), 3)
+
+    def test_jsonl_rows_only_update_their_own_keys(self):
+        Product.objects.filter(pk=self.existing.pk).update(stock=7, is_featured=True)
+        rows = (
+            '{"name": "Salad Ayam", "category": "Salad", "price": 31000}\n'
+            '{"name": "Salad Tuna", "category": "Salad", "price": 28000, "stock": 4, "is_featured": true}\n'
+        )
+        report = import_products(read_rows(io.StringIO(rows), "jsonl"))
+
+        self.existing.refresh_from_db()
+        self.assertEqual(report.updated, [("salad-ayam", {"price": (Decimal("30000.00"), Decimal("31000"))})])
+        self.assertEqual((self.existing.price, self.existing.stock), (Decimal("31000"), 7))
+        self.assertTrue(self.existing.is_featured and self.existing.available)
+        tuna = Product.objects.get(slug="salad-tuna")
+        self.assertEqual((tuna.stock, tuna.is_featured), (4, True))
+
+    def test_export_round_trips_and_admin_page(self):
+        exported = "".join(iter_csv(PRODUCT_EXPORT)).lstrip("\ufeff")
+        report = self._import(exported, dry_run=True)
+        self.assertEqual((report.created, report.updated, report.unchanged), ([], [], 2))
+
+        admin = User.objects.create_superuser(username="admin", email="admin@example.com", password="secret123")
+        self.client.force_login(admin)
+        self.assertContains(self.client.get("/admin/catalog/product/"), "/admin/catalog/product/import/")
+        upload = SimpleUploadedFile("katalog.csv", b"name,category,price\nSalad Tuna,Salad,28000\n")
+        response = self.client.post("/admin/catalog/product/import/", {"file": upload, "dry_run": ""})
+        self.assertContains(response, "+ salad-tuna")
+        self.assertTrue(Product.objects.filter(slug="salad-tuna").exists())
+
+    def test_unreadable_file_is_reported_without_writing(self):
+        admin = User.objects.create_superuser(username="admin", email="admin@example.com", password="secret123")
+        self.client.force_login(admin)
+        latin1 = "name,category,price\nSalad Tuna,Salad,28000\nCafé,Salad,1\n".encode("latin-1")
+        upload = SimpleUploadedFile("katalog.csv", latin1)
+        response = self.client.post("/admin/catalog/product/import/", {"file": upload, "dry_run": ""})
+        self.assertContains(response, "File harus berenkode UTF-8.")
+        self.assertFalse(Product.objects.filter(slug="salad-tuna").exists())
+
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8") as handle:
+            handle.write('name,category,price\n"Salad Tuna,Salad,28000\n' + "x" * csv.field_size_limit())
+            handle.flush()
+            with self.assertRaisesMessage(CommandError, "CSV tidak valid"):
+                call_command("import_products", handle.name, stdout=io.StringIO())
+
+
+class BulkPricingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.salad = Category.objects.create(name="Salad")
+        self.drinks = Category.objects.create(name="Minuman")
+        self.caesar = Product.objects.create(category=self.salad, name="Caesar", description="-", price=Decimal(30000))
+        self.greek = Product.objects.create(category=self.salad, name="Greek", description="-", price=Decimal(45500))
+        self.juice = Product.objects.create(category=self.drinks, name="Jus", description="-", price=Decimal(15000))
+
+    def _refresh(self):
+        for product in (self.caesar, self.greek, self.juice):
+            product.refresh_from_db()
+
+    def test_markdown_is_one_update_and_bumps_price_version(self):
+        version = get_price_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(4):
+                # savepoint, ids, UPDATE, release
+                apply_markdown(Product.objects.filter(category=self.salad), percent=Decimal(20))
+
+        self._refresh()
+        self.assertEqual(self.caesar.discount_price, Decimal(24000))
+        self.assertEqual(self.greek.discount_price, Decimal(36400))
+        self.assertIsNone(self.juice.discount_price)
+        self.assertGreater(get_price_version(), version)
+
+        apply_markdown(Product.objects.filter(pk=self.juice.pk), amount=Decimal(20000))
+        self.juice.refresh_from_db()
+        self.assertEqual(self.juice.discount_price, Decimal(1))
+
+    def test_only_price_writes_bump_price_version(self):
+        version = get_price_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.caesar.stock = 3
+            self.caesar.save(update_fields=["stock"])
+            import_products(read_rows(io.StringIO("name,category,price\nGreek,Salad,45500\n"), "csv"))
+        self.assertEqual(get_price_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            import_products(read_rows(io.StringIO("name,category,price\nGreek,Salad,41000\n"), "csv"))
+        self.assertGreater(get_price_version(), version)
+
+    def test_flash_sale_end_is_computed_per_row(self):
+        existing_start = timezone.now() - timedelta(hours=1)
+        Product.objects.filter(pk=self.caesar.pk).update(flash_sale_start=existing_start)
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_flash_sale(Product.objects.filter(category=self.salad), duration_hours=6, percent=Decimal(50))
+
+        self._refresh()
+        self.assertEqual(self.caesar.flash_sale_end, existing_start + timedelta(hours=6))
+        self.assertEqual(self.greek.flash_sale_end - self.greek.flash_sale_start, timedelta(hours=6))
+        self.assertTrue(self.caesar.is_flash_sale_active)
+        self.assertEqual(self.caesar.get_display_price(), Decimal(15000))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            revert_to_list_price(Product.objects.all())
+        self._refresh()
+        self.assertEqual(self.caesar.get_display_price(), self.caesar.price)
+        self.assertIsNone(self.caesar.flash_sale_end)
+
+    def test_admin_action_and_command(self):
+        admin = User.objects.create_superuser(username="admin", email="admin@example.com", password="secret123")
+        self.client.force_login(admin)
+        data = {"action": "apply_markdown_action", "_selected_action": [self.caesar.pk, self.juice.pk]}
+
+        self.assertContains(self.client.post("/admin/catalog/product/", data), "Berlaku untuk 2 produk")
+        response = self.client.post("/admin/catalog/product/", {**data, "apply": "1", "amount": "5000"})
+        self.assertEqual(response.status_code, 302)
+        self._refresh()
+        self.assertEqual((self.caesar.discount_price, self.juice.discount_price), (Decimal(25000), Decimal(10000)))
+
+        call_command("bulk_pricing", "revert", "--category", "salad", stdout=io.StringIO())
+        self._refresh()
+        self.assertIsNone(self.caesar.discount_price)
+        self.assertEqual(self.juice.discount_price, Decimal(10000))
+
+
+class FlashSaleCampaignTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Salad")
+        self.caesar = Product.objects.create(category=category, name="Caesar", description="-", price=Decimal(30000))
+        self.greek = Product.objects.create(category=category, name="Greek", description="-", price=Decimal(45000))
+        now = timezone.now()
+        self.running = FlashSaleCampaign.objects.create(
+            name="Flash Siang", start=now - timedelta(minutes=5), end=now + timedelta(hours=2)
+        )
+        FlashSaleItem.objects.create(campaign=self.running, product=self.caesar, price=Decimal(20000), quota=10)
+        FlashSaleItem.objects.create(campaign=self.running, product=self.greek, price=Decimal(30000), quota=5)
+        self.upcoming = FlashSaleCampaign.objects.create(
+            name="Flash Malam", start=now + timedelta(hours=6), end=now + timedelta(hours=8)
+        )
+        FlashSaleItem.objects.create(campaign=self.upcoming, product=self.greek, price=Decimal(25000))
+
+    def _run(self, now=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return run_flash_sale_scheduler(now)
+
+    def test_scheduler_activates_and_storefront_reads_cached_set(self):
+        result = self._run()
+        self.assertEqual((result["activated"], result["expired"], result["products"]), (1, 0, 2))
+        self.assertEqual(result["next_boundary"], self.running.end)
+
+        self.running.refresh_from_db()
+        self.upcoming.refresh_from_db()
+        self.assertEqual(self.running.status, FlashSaleCampaign.STATUS_ACTIVE)
+        self.assertEqual(self.upcoming.status, FlashSaleCampaign.STATUS_SCHEDULED)
+
+        active = get_active_flash_sales()
+        self.assertEqual(set(active), {self.caesar.pk, self.greek.pk})
+        self.assertEqual(active[self.caesar.pk].end, self.running.end)
+        with self.assertNumQueries(0):
+            get_active_flash_sales()
+            self.assertEqual(self.caesar.get_display_price(), Decimal(20000))
+            self.assertEqual(self.greek.get_display_price(), Decimal(30000))
+
+        response = self.client.get("/")
+        self.assertEqual(
+            {product.pk for product in response.context["flash_sale_products"]}, {self.caesar.pk, self.greek.pk}
+        )
+
+    def test_started_campaign_is_on_sale_before_the_scheduler_runs(self):
+        self.assertEqual(list(get_active_flash_sales()), [self.greek.pk, self.caesar.pk])
+        self.assertEqual(self.caesar.get_display_price(), Decimal(20000))
+        self.assertEqual(self.caesar.active_flash_sale.end, self.running.end)
+        self.assertIsNotNone(self.greek.active_flash_sale.item_id)
+
+        self.running.start = timezone.now() + timedelta(minutes=1)
+        self.running.save()
+        cache.clear()
+        self.assertEqual(get_active_flash_sales(), {})
+
+    def test_active_set_is_read_from_the_cache_once_per_request(self):
+        self._run()
+        with mock.patch("catalog.flash_sales.cache", wraps=cache) as shared_cache:
+            with request_flash_sales():
+                prices = [product.get_display_price() for product in (self.caesar, self.greek, self.caesar)]
+            self.assertEqual(shared_cache.get.call_count, 1)
+        self.assertEqual(prices, [Decimal(20000), Decimal(30000), Decimal(20000)])
+
+    def test_scheduler_expires_campaign_and_hands_over(self):
+        self._run()
+        after_end = self.running.end + timedelta(minutes=1)
+        result = self._run(after_end)
+        self.assertEqual((result["activated"], result["expired"]), (0, 1))
+        self.assertEqual(result["next_boundary"], self.upcoming.start)
+
+        self.caesar.refresh_from_db()
+        self.assertFalse(self.caesar.is_flash_sale)
+        self.assertEqual(get_active_flash_sales(), {})
+        self.assertEqual(self.caesar.get_display_price(), self.caesar.price)
+
+        self._run(self.upcoming.start)
+        self.greek.refresh_from_db()
+        self.assertEqual(self.greek.flash_sale_price, Decimal(25000))
+        self.assertEqual(self.greek.flash_sale_end, self.upcoming.end)
+        self.assertEqual(next_flash_sale_boundary(self.upcoming.start), self.upcoming.end)
+
+    def test_admin_edit_and_delete_withdraw_dropped_products(self):
+        self._run()
+        admin_user = User.objects.create_superuser("admin", "admin@example.com", "secret123")
+        self.client.force_login(admin_user)
+        start, end = timezone.localtime(self.running.start), timezone.localtime(self.running.end)
+        caesar_item, greek_item = (
+            FlashSaleItem.objects.get(campaign=self.running, product=product) for product in (self.caesar, self.greek)
+        )
+        data = {
+            "name": self.running.name,
+            "start_0": start.strftime("%Y-%m-%d"), "start_1": start.strftime("%H:%M:%S.%f"),
+            "end_0": end.strftime("%Y-%m-%d"), "end_1": end.strftime("%H:%M:%S.%f"),
+            "items-TOTAL_FORMS": 2, "items-INITIAL_FORMS": 2, "items-MIN_NUM_FORMS": 0, "items-MAX_NUM_FORMS": 1000,
+        }
+        for index, item in enumerate((caesar_item, greek_item)):
+            data.update({
+                f"items-{index}-id": item.pk, f"items-{index}-campaign": self.running.pk,
+                f"items-{index}-product": item.product_id, f"items-{index}-price": item.price,
+                f"items-{index}-quota": item.quota,
+            })
+        data["items-1-DELETE"] = "on"
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("admin:catalog_flashsalecampaign_change", args=[self.running.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(set(get_active_flash_sales()), {self.caesar.pk})
+        self.greek.refresh_from_db()
+        self.assertIsNone(self.greek.flash_sale_price)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("admin:catalog_flashsalecampaign_delete", args=[self.running.pk]), {"post": "yes"}
+            )
+        self.assertFalse(FlashSaleCampaign.objects.filter(pk=self.running.pk).exists())
+        self.assertEqual(get_active_flash_sales(), {})
+
+    def test_buy_now_holds_quota_until_order_or_expiry(self):
+        self._run()
+        FlashSaleItem.objects.filter(product=self.greek).update(quota=1)
+        buyer = User.objects.create_user(username="pembeli", password="secret123")
+        rival = User.objects.create_user(username="saingan", password="secret123")
+        url = reverse("core:flash_sale_buy_now", args=[self.greek.slug])
+        ajax = {"HTTP_X_REQUESTED_WITH": "XMLHttpRequest"}
+
+        self.client.force_login(rival)
+        self.assertEqual(self.client.post(url, **ajax).status_code, 200)
+        self.assertEqual(self.client.post(url, **ajax).status_code, 200)
+        item = FlashSaleItem.objects.get(campaign=self.running, product=self.greek)
+        self.assertEqual((item.sold, item.claims.count()), (1, 1))
+
+        self.client.force_login(buyer)
+        response = self.client.post(url, **ajax)
+        self.assertEqual(response.status_code, 409)
+
+        # The rival's hold lapses, so the next claimer gets the unit back.
+        FlashSaleClaim.objects.filter(user=rival).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.client.post(url, **ajax).status_code, 200)
+        item.refresh_from_db()
+        self.assertEqual(item.sold, 1)
+        self.assertEqual(list(item.claims.values_list("user__username", flat=True)), ["pembeli"])
+
+        order = Order.objects.create(
+            user=buyer, order_number="ORD-FLASH", full_name="Pembeli", email="p@example.com", phone="0800",
+            address="-", city="Makassar", postal_code="90000", subtotal=Decimal(30000), total=Decimal(30000),
+        )
+        self.assertEqual(attach_flash_sale_claims(order, buyer, [self.greek.pk]), {self.greek.pk: 1})
+        FlashSaleClaim.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(release_expired_flash_sale_claims(), 0)
+
+        release_order_flash_sale_claims([order.pk])
+        item.refresh_from_db()
+        self.assertEqual((item.sold, item.claims.count()), (0, 0))
+
+
+    def test_cart_page_looks_up_holds_once(self):
+        self._run()
+        buyer = User.objects.create_user(username="pembeli", password="secret123")
+        cart = Cart.objects.create(user=buyer)
+        for product in (self.caesar, self.greek):
+            CartItem.objects.create(cart=cart, product=product)
+        self.client.force_login(buyer)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("core:cart"))
+        self.assertEqual(sum("catalog_flashsaleclaim" in query["sql"] for query in queries), 1)
+        self.assertEqual(response.context["cart"].get_selected_total(), self.caesar.price + self.greek.price)
+
+    def test_flash_price_only_covers_held_units(self):
+        self._run()
+        buyer = User.objects.create_user(username="pembeli", password="secret123")
+        cart = Cart.objects.create(user=buyer)
+        item = CartItem.objects.create(cart=cart, product=self.greek, quantity=2)
+        self.assertEqual(item.get_unit_price(), self.greek.price)
+
+        self.client.force_login(buyer)
+        self.client.post(reverse("core:flash_sale_buy_now", args=[self.greek.slug]))
+        item.refresh_from_db()
+        self.assertEqual((item.quantity, item.get_unit_price()), (1, Decimal(30000)))
+
+        order = Order.objects.create(
+            user=buyer, order_number="ORD-FLASH", full_name="Pembeli", email="p@example.com", phone="0800",
+            address="-", city="Makassar", postal_code="90000", subtotal=Decimal(30000), total=Decimal(30000),
+        )
+        FlashSaleClaim.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(item.get_unit_price(), self.greek.price)
+        self.assertEqual(attach_flash_sale_claims(order, buyer, [self.greek.pk]), {})
+
+
+class FlashSaleClaimConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Salad")
+        product = Product.objects.create(category=category, name="Caesar", description="-", price=Decimal(30000))
+        now = timezone.now()
+        campaign = FlashSaleCampaign.objects.create(
+            name="Flash", start=now, end=now + timedelta(hours=1), status=FlashSaleCampaign.STATUS_ACTIVE
+        )
+        self.item = FlashSaleItem.objects.create(campaign=campaign, product=product, price=Decimal(15000), quota=10)
+
+    def test_concurrent_claims_never_exceed_quota(self):
+        users = [User.objects.create_user(username=f"pembeli{index}") for index in range(30)]
+        barrier = threading.Barrier(len(users))
+        outcomes = []
+
+        def worker(user):
+            try:
+                barrier.wait()
+                while True:
+                    try:
+                        claim_flash_sale_item(self.item.pk, user)
+                        outcomes.append("claimed")
+                        return
+                    except FlashSaleSoldOut:
+                        outcomes.append("sold_out")
+                        return
+                    except OperationalError:
+                        # SQLite's shared-cache test database reports "table is locked".
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.item.refresh_from_db()
+        self.assertEqual(outcomes.count("claimed"), 10)
+        self.assertEqual(outcomes.count("sold_out"), 20)
+        self.assertEqual((self.item.sold, self.item.claims.count()), (10, 10))
+
+    def test_benchmark_command_reports_no_oversell(self):
+        out = io.StringIO()
+        call_command("benchmark_flash_sale_claims", "--claims", "40", "--workers", "8", "--quota", "15", stdout=out)
+        self.assertIn("terjual 15/15", out.getvalue())
+        self.assertIn("Tidak ada oversell", out.getvalue())
+        self.assertFalse(FlashSaleItem.objects.exclude(pk=self.item.pk).exists())
+
+
+def _checkout_cart(user, price=Decimal(100000)):
+    """Give ``user`` a cart whose selected items add up to ``price``."""
+    category = Category.objects.create(name="Kupon")
+    product = Product.objects.create(category=category, name="Paket", description="Paket", price=price, stock=5)
+    CartItem.objects.create(cart=Cart.objects.create(user=user), product=product)
+
+
+class DiscountCodeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="pembeli", password="secret123")
+        self.discount = DiscountCode.objects.create(
+            code=" hemat10 ", discount_type=DiscountCode.TYPE_PERCENT, percent=Decimal(10), usage_limit=1,
+        )
+
+    def _order(self, number):
+        return Order.objects.create(
+            user=self.user, order_number=number, full_name="Pembeli", email="p@example.com", phone="0800",
+            address="-", city="Makassar", postal_code="90000", subtotal=Decimal(100000), total=Decimal(100000),
+        )
+
+    def test_lookup_is_normalized_and_cached(self):
+        self.assertEqual(self.discount.code, "HEMAT10")
+        self.assertEqual(get_discount_code("Hemat10"), self.discount)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_discount_code("HEMAT10 ").pk, self.discount.pk)
+            self.assertIsNone(get_discount_code(""))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DiscountCode.objects.filter(pk=self.discount.pk).first().save()
+        with self.assertNumQueries(1):
+            get_discount_code("hemat10")
+
+    def test_apply_discount_view_uses_engine(self):
+        _checkout_cart(self.user)
+        self.client.force_login(self.user)
+        session = self.client.session
+        session["checkout"] = {"shipping_cost": "10000", "shipping_method": "REG"}
+        session.save()
+        ajax = {"HTTP_X_REQUESTED_WITH": "XMLHttpRequest"}
+
+        response = self.client.post(reverse("catalog:apply_discount"), {"code": "hemat10"}, **ajax)
+        self.assertEqual(response.json()["code"], "HEMAT10")
+        self.assertEqual(self.client.session["discount"], "HEMAT10")
+
+        DiscountCode.objects.filter(pk=self.discount.pk).update(times_used=1)
+        cache.clear()
+        response = self.client.post(reverse("catalog:apply_discount"), {"code": "hemat10"}, **ajax)
+        self.assertEqual((response.status_code, response.json()["error"]), (400, "Kuota kupon sudah habis."))
+
+    def test_redemptions_respect_global_and_per_user_caps(self):
+        first = self._order("ORD-1")
+        redeem_discount(self.discount, user=self.user, order=first, amount=Decimal(10000))
+        with self.assertRaises(DiscountError):
+            redeem_discount(self.discount, user=self.user, order=self._order("ORD-2"), amount=Decimal(10000))
+        self.discount.refresh_from_db()
+        self.assertEqual(self.discount.times_used, 1)
+
+        release_discount_redemptions([first.pk])
+        self.discount.refresh_from_db()
+        self.assertEqual((self.discount.times_used, self.discount.redemptions.count()), (0, 0))
+
+        DiscountCode.objects.filter(pk=self.discount.pk).update(usage_limit=0, per_user_limit=1)
+        self.discount.refresh_from_db()
+        redeem_discount(self.discount, user=self.user, order=first, amount=Decimal(10000))
+        with self.assertRaisesMessage(DiscountError, "batas pemakaian untuk akun Anda"):
+            evaluate_discount(self.discount, Decimal(100000), Decimal(0), "REG", self.user)
+
+    def test_migration_suffix_keeps_codes_within_max_length(self):
+        from django.apps import apps
+
+        normalize_codes = import_module("catalog.migrations.0014_discount_usage_limits").normalize_codes
+        long_code = "P" * 50
+        DiscountCode.objects.create(code=long_code, discount_type=DiscountCode.TYPE_PERCENT, percent=Decimal(5))
+        lower = DiscountCode.objects.create(code="X", discount_type=DiscountCode.TYPE_PERCENT, percent=Decimal(5))
+        DiscountCode.objects.filter(pk=lower.pk).update(code=long_code.lower())
+
+        normalize_codes(apps, None)
+
+        lower.refresh_from_db()
+        self.assertEqual(len(lower.code), 50)
+        self.assertTrue(lower.code.endswith(f"-{lower.pk}"))
+
+
+class BestDiscountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="pembeli", password="secret123")
+        now = timezone.now()
+        percent = DiscountCode.TYPE_PERCENT
+        flat = DiscountCode.TYPE_FLAT
+        DiscountCode.objects.create(code="FLAT5", discount_type=flat, flat_amount=Decimal(5000))
+        DiscountCode.objects.create(code="PERSEN20", percent=Decimal(20), max_discount=Decimal(15000))
+        DiscountCode.objects.create(code="PERSEN10", discount_type=percent, percent=Decimal(10))
+        DiscountCode.objects.create(
+            code="EXPRESS", percent=Decimal(50), allowed_shipping=DiscountCode.SHIPPING_EXPRESS
+        )
+        DiscountCode.objects.create(code="SULTAN", percent=Decimal(50), min_spend=Decimal(500000))
+        DiscountCode.objects.create(code="BASI", percent=Decimal(50), valid_to=now - timedelta(days=1))
+        DiscountCode.objects.create(code="HABIS", percent=Decimal(50), usage_limit=3, times_used=3)
+        sekali = DiscountCode.objects.create(code="SEKALI", percent=Decimal(50), per_user_limit=1)
+        order = Order.objects.create(
+            user=self.user, order_number="ORD-1", full_name="Pembeli", email="p@example.com", phone="0800",
+            address="-", city="Makassar", postal_code="90000", subtotal=Decimal(100000), total=Decimal(100000),
+        )
+        redeem_discount(sekali, user=self.user, order=order, amount=Decimal(50000))
+
+    def test_ranks_applicable_codes_in_one_query(self):
+        with self.assertNumQueries(1):
+            ranked = find_best_discounts(Decimal(100000), Decimal(10000), "REG", self.user)
+        self.assertEqual(
+            [(discount.code, amount) for discount, amount in ranked],
+            [("PERSEN20", Decimal(15000)), ("PERSEN10", Decimal(11000)), ("FLAT5", Decimal(5000))],
+        )
+        self.assertEqual(find_best_discounts(Decimal(100000), Decimal(10000), "EXP", self.user)[0][0].code, "EXPRESS")
+        self.assertEqual(find_best_discounts(Decimal(100000), Decimal(0), "", self.user), [])
+
+    def test_endpoint_returns_best_and_alternatives(self):
+        _checkout_cart(self.user)
+        self.client.force_login(self.user)
+        session = self.client.session
+        session["checkout"] = {"shipping_cost": "10000", "shipping_method": "REG"}
+        session.save()
+
+        data = self.client.get(reverse("catalog:best_discount"), HTTP_X_REQUESTED_WITH="XMLHttpRequest").json()
+        self.assertEqual(data["best"]["code"], "PERSEN20")
+        self.assertEqual(data["best"]["total_display"], "Rp 95.000")
+        self.assertEqual([offer["code"] for offer in data["alternatives"]], ["PERSEN10", "FLAT5"])
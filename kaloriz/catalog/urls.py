@@ -13,4 +13,5 @@ urlpatterns = [
     path('contact/', views.contact, name='contact'),
     path('discount/apply/', views.apply_discount, name='apply_discount'),
     path('discount/cancel/', views.cancel_discount, name='cancel_discount'),
+    path('discount/best/', views.best_discount, name='best_discount'),
 ]
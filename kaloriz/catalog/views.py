@@ -8,20 +8,31 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.mail import send_mail
-from django.db.models import Q
+from django.db.models import F, Q
 from django.http import JsonResponse
 from django.utils import timezone
 from django.utils.formats import number_format
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 
-from core.models import Cart, Order
+from core.models import Cart
+from core.services.checkout import get_checkout_quote, refresh_checkout_quote
+from core.services.associations import get_frequently_bought_together
+from core.services.rollups import annotate_units_sold, get_successful_orders_count
+from core.services.session_state import clear_session_discount_code, set_session_discount_code
 from shipping.models import District
 
-from .models import Product, Category, Testimonial, DiscountCode, ContactMessage
+from .discounts import DiscountError, evaluate_discount, find_best_discounts, get_discount_code
+from .flash_sales import get_active_flash_sales
+from .models import Product, Category, Testimonial, ContactMessage
+from .similarity import get_similar_products
+from .stats import get_trending_products, record_product_view
 
 
 logger = logging.getLogger(__name__)
 
+# How many runner-up codes best_discount returns next to the best one.
+BEST_DISCOUNT_ALTERNATIVES = 3
+
 
 def _get_watchlisted_product_ids(request):
     if request.user.is_authenticated:
@@ -33,19 +44,15 @@ def _get_watchlisted_product_ids(request):
 
 def home(request):
     """Homepage with featured products"""
-    now = timezone.now()
     featured_products = Product.objects.filter(
         available=True,
         is_featured=True,
     )[:8]
+    active_flash_sales = get_active_flash_sales()
     flash_sale_products = Product.objects.filter(
+        pk__in=list(active_flash_sales),
         available=True,
-        is_flash_sale=True,
-        flash_sale_price__isnull=False,
-        flash_sale_start__lte=now,
-    ).filter(
-        Q(flash_sale_end__gte=now) | Q(flash_sale_end__isnull=True, flash_sale_duration_hours__gt=0)
-    )[:8]
+    )[:8] if active_flash_sales else []
     available_products_count = Product.objects.filter(
         stock__gt=0,
         available=True,
@@ -57,6 +64,7 @@ def home(request):
 
     context = {
         'featured_products': featured_products,
+        'trending_products': get_trending_products(limit=8),
         'flash_sale_products': flash_sale_products,
         'available_products_count': available_products_count,
         'happy_customers_count': happy_customers_count,
@@ -100,6 +108,8 @@ def product_list(request):
     sort_by = request.GET.get('sort', '-created_at')
     if sort_by in ['price', '-price', 'name', '-name', '-created_at']:
         products = products.order_by(sort_by)
+    elif sort_by == 'bestselling':
+        products = annotate_units_sold(products).order_by(F('units_sold').desc(nulls_last=True), '-created_at')
 
     context = {
         'products': products,
@@ -117,10 +127,15 @@ def product_list(request):
 def product_detail(request, slug):
     """Product detail page"""
     product = get_object_or_404(Product, slug=slug, available=True)
-    related_products = Product.objects.filter(
-        category=product.category,
-        available=True
-    ).exclude(id=product.id)[:4]
+    record_product_view(product.id)
+    related_products = get_similar_products(product, limit=4)
+    if not related_products:
+        # Index not built yet (fresh install): fall back to the same category.
+        related_products = Product.objects.filter(
+            category=product.category,
+            available=True
+        ).exclude(id=product.id)[:4]
+    bought_together = get_frequently_bought_together([product.id], limit=4)
 
     # Get approved testimonials for this product
     testimonials = Testimonial.objects.filter(
@@ -133,6 +148,7 @@ def product_detail(request, slug):
     context = {
         'product': product,
         'related_products': related_products,
+        'bought_together': bought_together,
         'testimonials': testimonials,
         'watchlisted_product_ids': watchlisted_ids,
         'is_product_watchlisted': product.id in watchlisted_ids,
@@ -193,7 +209,7 @@ def about(request):
     happy_customers_count = Testimonial.objects.filter(
         rating__isnull=False,
     ).count()
-    successful_orders_count = Order.objects.exclude(status='cancelled').count()
+    successful_orders_count = get_successful_orders_count()
     district_coverage_count = District.objects.count()
 
     return render(
@@ -285,6 +301,19 @@ def _format_rupiah(value):
     return f"Rp {number_format(amount, decimal_pos=0, force_grouping=True)}"
 
 
+def _get_checkout_quote(request):
+    """Return ``(cart, quote)`` for the user's active cart, or ``(None, None)``."""
+    cart = (
+        Cart.objects.filter(user=request.user)
+        .order_by('-updated_at', '-id')
+        .only('pk', 'version')
+        .first()
+    )
+    if cart is None:
+        return None, None
+    return cart, get_checkout_quote(request, cart)
+
+
 @require_POST
 @login_required
 def apply_discount(request):
@@ -295,39 +324,15 @@ def apply_discount(request):
     if not code:
         return JsonResponse({'success': False, 'error': 'Kode diskon harus diisi.'}, status=400)
 
-    checkout_data = request.session.get('checkout', {})
-    raw_subtotal = checkout_data.get('subtotal')
-    raw_shipping = checkout_data.get('shipping_cost')
-
-    try:
-        subtotal = Decimal(raw_subtotal or 0)
-    except (InvalidOperation, TypeError, ValueError):
-        subtotal = Decimal('0')
-
-    try:
-        shipping_cost = Decimal(raw_shipping or 0)
-    except (InvalidOperation, TypeError, ValueError):
-        shipping_cost = Decimal('0')
-
-    if subtotal == 0:
-        cart = (
-            Cart.objects.filter(user=request.user)
-            .order_by('-updated_at', '-id')
-            .prefetch_related('items__product')
-            .first()
-        )
-        if cart:
-            subtotal = Decimal(cart.get_selected_total() or 0)
-            checkout_data['subtotal'] = str(subtotal)
-            request.session['checkout'] = checkout_data
-            request.session.modified = True
+    cart, quote = _get_checkout_quote(request)
+    if quote is None:
+        return JsonResponse({'success': False, 'error': 'Keranjang tidak ditemukan.'}, status=400)
+    grand_total = quote.total_before_discount
 
-    try:
-        discount = DiscountCode.objects.get(code__iexact=code)
-    except DiscountCode.DoesNotExist:
-        request.session.pop('discount', None)
-        request.session.modified = True
-        total = max(Decimal('0'), subtotal + shipping_cost)
+    discount = get_discount_code(code)
+    if discount is None:
+        clear_session_discount_code(request)
+        total = max(Decimal('0'), grand_total)
         return JsonResponse({
             'success': False,
             'error': 'Kode diskon tidak ditemukan.',
@@ -336,70 +341,68 @@ def apply_discount(request):
             'discount_active': False,
         }, status=404)
 
-    shipping_method = checkout_data.get('shipping_method')
-    grand_total = subtotal + shipping_cost
-
-    if not discount.is_valid():
-        request.session.pop('discount', None)
-        request.session.modified = True
-        total = max(Decimal('0'), grand_total)
-        return JsonResponse({
-            'success': False,
-            'error': 'Kupon tidak aktif.',
-            'discount_display': _format_rupiah(0),
-            'total_display': _format_rupiah(total),
-            'discount_active': False,
-        }, status=400)
-
-    if not discount.is_shipping_allowed(shipping_method):
-        request.session.pop('discount', None)
-        request.session.modified = True
+    try:
+        evaluate_discount(discount, quote.subtotal, quote.shipping_cost, quote.shipping_method, request.user)
+    except DiscountError as exc:
+        clear_session_discount_code(request)
         total = max(Decimal('0'), grand_total)
         return JsonResponse({
             'success': False,
-            'error': 'Kupon tidak berlaku untuk kurir ini.',
+            'error': str(exc),
             'discount_display': _format_rupiah(0),
             'total_display': _format_rupiah(total),
             'discount_active': False,
         }, status=400)
 
-    min_spend = discount.get_min_spend()
-    if grand_total < min_spend:
-        request.session.pop('discount', None)
-        request.session.modified = True
-        total = max(Decimal('0'), grand_total)
-        return JsonResponse({
-            'success': False,
-            'error': f'Minimal belanja { _format_rupiah(min_spend) }',
-            'discount_display': _format_rupiah(0),
-            'total_display': _format_rupiah(total),
-            'discount_active': False,
-        }, status=400)
+    # The coupon is a quote input: store it and re-price the checkout once.
+    set_session_discount_code(request, discount.code)
+    quote = refresh_checkout_quote(request, cart)
 
-    discount_amount = discount.calculate_discount(grand_total)
-    if discount_amount > grand_total:
-        discount_amount = grand_total
+    return JsonResponse({
+        'success': True,
+        'code': quote.discount_code,
+        'discount_display': _format_rupiah(quote.discount_amount),
+        'discount_type_label': quote.discount_type_label,
+        'total_display': _format_rupiah(quote.total),
+        'subtotal_display': _format_rupiah(quote.subtotal),
+        'shipping_cost_display': _format_rupiah(quote.shipping_cost),
+        'message': 'Kupon berhasil diterapkan.',
+        'discount_active': True,
+    })
 
-    request.session['discount'] = {
-        'code': discount.code,
-        'amount': str(discount_amount),
-        'type': discount.discount_type,
-        'type_label': discount.get_type_label(),
-    }
-    request.session.modified = True
 
-    total = max(Decimal('0'), grand_total - discount_amount)
+@require_GET
+@login_required
+def best_discount(request):
+    """Return the best applicable discount code and a few alternatives."""
+    if request.headers.get('X-Requested-With') != 'XMLHttpRequest':
+        return JsonResponse({'success': False, 'error': 'Permintaan tidak valid.'}, status=400)
 
+    cart, quote = _get_checkout_quote(request)
+    if quote is None:
+        return JsonResponse({'success': False, 'error': 'Keranjang tidak ditemukan.'}, status=400)
+    grand_total = quote.total_before_discount
+    offers = [
+        {
+            'code': discount.code,
+            'amount': str(amount),
+            'discount_display': _format_rupiah(amount),
+            'discount_type_label': discount.get_type_label(),
+            'total_display': _format_rupiah(max(Decimal('0'), grand_total - amount)),
+        }
+        for discount, amount in find_best_discounts(
+            quote.subtotal,
+            quote.shipping_cost,
+            quote.shipping_method,
+            request.user,
+            limit=BEST_DISCOUNT_ALTERNATIVES + 1,
+        )
+    ]
     return JsonResponse({
         'success': True,
-        'code': discount.code,
-        'discount_display': _format_rupiah(discount_amount),
-        'discount_type_label': discount.get_type_label(),
-        'total_display': _format_rupiah(total),
-        'subtotal_display': _format_rupiah(subtotal),
-        'shipping_cost_display': _format_rupiah(shipping_cost),
-        'message': 'Kupon berhasil diterapkan.',
-        'discount_active': True,
+        'best': offers[0] if offers else None,
+        'alternatives': offers[1:],
+        'message': '' if offers else 'Belum ada kupon yang berlaku untuk pesanan ini.',
     })
 
 
@@ -409,37 +412,14 @@ def cancel_discount(request):
     if request.headers.get('X-Requested-With') != 'XMLHttpRequest':
         return JsonResponse({'success': False, 'error': 'Permintaan tidak valid.'}, status=400)
 
-    checkout_data = request.session.get('checkout', {})
-    raw_subtotal = checkout_data.get('subtotal')
-    raw_shipping = checkout_data.get('shipping_cost')
-
-    try:
-        subtotal = Decimal(raw_subtotal or 0)
-    except (InvalidOperation, TypeError, ValueError):
-        subtotal = Decimal('0')
-
-    try:
-        shipping_cost = Decimal(raw_shipping or 0)
-    except (InvalidOperation, TypeError, ValueError):
-        shipping_cost = Decimal('0')
-
-    if subtotal == 0:
-        cart = (
-            Cart.objects.filter(user=request.user)
-            .order_by('-updated_at', '-id')
-            .prefetch_related('items__product')
-            .first()
-        )
-        if cart:
-            subtotal = Decimal(cart.get_selected_total() or 0)
-            checkout_data['subtotal'] = str(subtotal)
-            request.session['checkout'] = checkout_data
-            request.session.modified = True
+    cart, quote = _get_checkout_quote(request)
+    if quote is None:
+        return JsonResponse({'success': False, 'error': 'Keranjang tidak ditemukan.'}, status=400)
 
-    request.session.pop('discount', None)
-    request.session.modified = True
+    clear_session_discount_code(request)
 
-    total = max(Decimal('0'), subtotal + shipping_cost)
+    subtotal, shipping_cost = quote.subtotal, quote.shipping_cost
+    total = max(Decimal('0'), quote.total_before_discount)
 
     return JsonResponse({
         'success': True,
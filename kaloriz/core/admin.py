@@ -1,8 +1,14 @@
 from django import forms
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.http import HttpResponseRedirect
+from django.utils import timezone
 from .models import (
     Cart,
     CartItem,
+    DailyCategorySales,
+    DailyDistrictSales,
+    DailyProductSales,
+    DailySalesSummary,
     Order,
     OrderItem,
     PaymentMethod,
@@ -11,10 +17,14 @@ from .models import (
     EmailVerification,
     Notification,
 )
+from .exports import ORDER_EXPORT, export_actions
+from .services.orders import TRANSITION_APPLIED, transition_order_status
 
 admin.site.site_header = "Kaloriz Admin"
 admin.site.site_title = "Kaloriz Admin"
 admin.site.index_title = "Dashboard"
+# KPI cards (cached, see core.services.dashboard) above Jazzmin's model list.
+admin.site.index_template = "admin/kaloriz_index.html"
 
 
 @admin.register(PaymentMethod)
@@ -88,6 +98,8 @@ class OrderItemInline(admin.TabularInline):
 
 class OrderAdminForm(forms.ModelForm):
     shipping_provider = forms.ChoiceField(required=False, label="Kurir Pengiriman")
+    # Version the page was rendered with, posted back to guard the status change.
+    loaded_version = forms.IntegerField(required=False, widget=forms.HiddenInput)
 
     class Meta:
         model = Order
@@ -95,6 +107,7 @@ class OrderAdminForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.fields['loaded_version'].initial = self.instance.version
         service_label = (self.instance.selected_service_name or '').strip().lower()
         if not service_label:
             courier_code = (self.instance.selected_courier or '').strip().lower()
@@ -113,6 +126,15 @@ class OrderAdminForm(forms.ModelForm):
 
         self.fields['shipping_provider'].choices = [('', '---------')] + choices
 
+    def clean_status(self):
+        status = self.cleaned_data['status']
+        current = self.instance.status
+        if self.instance.pk and status != current and not self.instance.can_transition_to(status):
+            raise forms.ValidationError(
+                f"Status tidak dapat diubah dari {self.instance.get_status_display()} ke {status}."
+            )
+        return status
+
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
@@ -120,13 +142,16 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ['order_number', 'user', 'full_name', 'status', 'total', 'created_at']
     list_filter = ['status', 'created_at']
     search_fields = ['order_number', 'user__username', 'full_name', 'email', 'phone']
-    readonly_fields = ['order_number', 'created_at', 'updated_at', 'selected_courier', 'selected_service_name']
+    readonly_fields = [
+        'order_number', 'version', 'created_at', 'updated_at', 'selected_courier', 'selected_service_name'
+    ]
     inlines = [OrderItemInline]
     date_hierarchy = 'created_at'
+    actions = export_actions(ORDER_EXPORT)
 
     fieldsets = (
         ('Informasi Pesanan', {
-            'fields': ('order_number', 'user', 'status')
+            'fields': ('order_number', 'user', 'status', 'version', 'loaded_version')
         }),
         ('Informasi Pengiriman', {
             'fields': (
@@ -154,6 +179,51 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     )
 
+    def save_model(self, request, obj, form, change):
+        if not change:
+            super().save_model(request, obj, form, change)
+            return
+
+        # The whole edit is one UPDATE guarded by the version the page was
+        # loaded with (through the status transition when the status changes),
+        # so an edit made from a stale page is rejected as a whole instead of
+        # being written next to a payment or cancellation applied meanwhile.
+        new_status = obj.status
+        obj.status = form.initial.get('status', obj.status)
+        loaded_version = form.cleaned_data.get('loaded_version')
+        if loaded_version is not None:
+            obj.version = loaded_version
+        model_fields = {field.name for field in obj._meta.concrete_fields}
+        fields = {
+            name: getattr(obj, name) for name in form.changed_data if name in model_fields and name != 'status'
+        }
+
+        if new_status != obj.status:
+            saved = transition_order_status(obj, new_status, **fields) == TRANSITION_APPLIED
+        else:
+            saved = bool(
+                Order.objects.filter(pk=obj.pk, status=obj.status, version=obj.version).update(
+                    updated_at=timezone.now(), **fields
+                )
+            )
+        if not saved:
+            obj._save_conflict = True
+            messages.error(
+                request,
+                f"Perubahan pesanan {obj.order_number} tidak disimpan karena pesanan sudah diperbarui oleh proses "
+                "lain. Muat ulang halaman lalu coba lagi.",
+            )
+
+    def save_related(self, request, form, formsets, change):
+        if not getattr(form.instance, '_save_conflict', False):
+            super().save_related(request, form, formsets, change)
+
+    def response_change(self, request, obj):
+        if getattr(obj, '_save_conflict', False):
+            # Back to the form, showing the current order, without the success message.
+            return HttpResponseRedirect(request.path)
+        return super().response_change(request, obj)
+
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
@@ -188,3 +258,40 @@ class NotificationAdmin(admin.ModelAdmin):
     search_fields = ['title', 'message', 'user__username', 'user__email']
     readonly_fields = ['created_at']
     date_hierarchy = 'created_at'
+
+
+class SalesRollupAdmin(admin.ModelAdmin):
+    """Read-only view of rollups written by ``manage.py refresh_sales_rollups``."""
+
+    date_hierarchy = 'date'
+    list_filter = ['date']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailySalesSummary)
+class DailySalesSummaryAdmin(SalesRollupAdmin):
+    list_display = ['date', 'orders', 'units', 'revenue', 'cancelled_orders']
+
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(SalesRollupAdmin):
+    list_display = ['date', 'product', 'orders', 'units', 'revenue', 'cancelled_orders']
+    list_select_related = ['product']
+    search_fields = ['product__name']
+
+
+@admin.register(DailyCategorySales)
+class DailyCategorySalesAdmin(SalesRollupAdmin):
+    list_display = ['date', 'category', 'orders', 'units', 'revenue', 'cancelled_orders']
+    list_select_related = ['category']
+
+
+@admin.register(DailyDistrictSales)
+class DailyDistrictSalesAdmin(SalesRollupAdmin):
+    list_display = ['date', 'district', 'orders', 'units', 'revenue', 'cancelled_orders']
+    list_select_related = ['district']
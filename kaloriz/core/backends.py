@@ -0,0 +1,73 @@
+"""Authentication backend that accepts a username or an email address.
+
+Emails are matched case-insensitively with ``LOWER(email) = %s``, which the
+``core_auth_user_email_lower`` expression index (migration 0019) answers
+directly. ``auth_user.email`` is not unique. When several accounts share an
+email, the one whose password matches wins, instead of the lookup failing.
+"""
+
+from __future__ import annotations
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+# Most accounts whose password is checked for one login attempt.
+MAX_CANDIDATES = 5
+
+
+def users_with_email(email: str):
+    """Return users whose email matches ``email`` ignoring case, via the index."""
+
+    return get_user_model().objects.alias(email_lower=Lower("email")).filter(
+        email_lower=(email or "").strip().lower()
+    )
+
+
+def login_identity(username_or_email: str) -> str:
+    """Return the identity login attempts for ``username_or_email`` are counted under.
+
+    A username, in any case, is replaced by its account's email, so an account
+    has one attempt budget whether it is addressed by username or by email.
+    """
+
+    value = (username_or_email or "").strip()
+    if "@" not in value:
+        UserModel = get_user_model()
+        email = (
+            UserModel.objects.filter(**{f"{UserModel.USERNAME_FIELD}__iexact": value})
+            .order_by("pk")
+            .values_list("email", flat=True)
+            .first()
+        )
+        if email:
+            value = email
+    return value.lower()
+
+
+class EmailOrUsernameBackend(ModelBackend):
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if not username or password is None:
+            return None
+
+        username = username.strip()
+        candidates = list(
+            UserModel.objects.alias(email_lower=Lower("email"))
+            .filter(Q(**{UserModel.USERNAME_FIELD: username}) | Q(email_lower=username.lower()))
+            .order_by("-last_login", "pk")[:MAX_CANDIDATES]
+        )
+        if not candidates:
+            # Run the hasher anyway so response time does not reveal unknown accounts.
+            UserModel().set_password(password)
+            return None
+
+        # An exact username match wins over accounts that only share the email.
+        candidates.sort(key=lambda user: user.get_username() != username)
+        for user in candidates:
+            if user.check_password(password) and self.user_can_authenticate(user):
+                return user
+        return None
@@ -0,0 +1,235 @@
+"""Streaming CSV/XLSX exports for orders, shipments, contact messages and products.
+
+Rows are read with ``.iterator(chunk_size=...)`` over an ``only()``
+projection and written one at a time, so memory stays flat regardless of how
+many records are exported. CSV goes straight out through a
+:class:`~django.http.StreamingHttpResponse`; XLSX is written by openpyxl's
+write-only workbook into a temporary file that is then streamed.
+
+The same specs back the admin actions and ``manage.py export_records``.
+"""
+
+from __future__ import annotations
+
+import csv
+import tempfile
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from catalog.models import ContactMessage, Product
+from core.models import Order
+from shipping.models import Shipment
+
+DEFAULT_CHUNK_SIZE = 2000
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Spreadsheet apps evaluate cells starting with these characters as formulas.
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    filename: str
+    model: type
+    columns: tuple[tuple[str, Callable], ...]
+    select_related: tuple[str, ...] = ()
+    only: tuple[str, ...] = ()
+
+    @property
+    def headers(self) -> list[str]:
+        return [header for header, _ in self.columns]
+
+    def prepare(self, queryset=None):
+        queryset = self.model.objects.all() if queryset is None else queryset
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.only:
+            queryset = queryset.only(*self.only)
+        return queryset.order_by("pk")
+
+
+def _local(value):
+    if value is None:
+        return None
+    return timezone.localtime(value).replace(tzinfo=None, microsecond=0)
+
+
+def _related(instance, name, field):
+    # A missing reverse one-to-one (order without shipment) raises an
+    # AttributeError subclass, which getattr turns into ``None``.
+    related = getattr(instance, name, None)
+    return getattr(related, field, "") if related is not None else ""
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+ORDER_EXPORT = ExportSpec(
+    filename="pesanan",
+    model=Order,
+    columns=(
+        ("Nomor Pesanan", lambda order: order.order_number),
+        ("Tanggal", lambda order: _local(order.created_at)),
+        ("Status", lambda order: order.get_status_display()),
+        ("Pengguna", lambda order: order.user.username),
+        ("Email Pengguna", lambda order: order.user.email),
+        ("Nama Lengkap", lambda order: order.full_name),
+        ("Telepon", lambda order: order.phone),
+        ("Kota", lambda order: order.city),
+        ("Metode Pembayaran", lambda order: order.payment_method_display or order.payment_method),
+        ("Subtotal", lambda order: order.subtotal),
+        ("Ongkir", lambda order: order.shipping_cost),
+        ("Total", lambda order: order.total),
+        ("Kecamatan", lambda order: _related(order, "shipment", "district_name")),
+        ("Nomor Resi", lambda order: order.tracking_number or _related(order, "shipment", "tracking_number")),
+    ),
+    select_related=("user", "shipment"),
+    only=(
+        "order_number", "created_at", "status", "full_name", "phone", "city", "payment_method",
+        "payment_method_display", "subtotal", "shipping_cost", "total", "tracking_number",
+        "user__username", "user__email", "shipment__district_name", "shipment__tracking_number",
+    ),
+)
+
+SHIPMENT_EXPORT = ExportSpec(
+    filename="pengiriman",
+    model=Shipment,
+    columns=(
+        ("Nomor Pesanan", lambda shipment: shipment.order.order_number),
+        ("Status Pesanan", lambda shipment: shipment.order.get_status_display()),
+        ("Tanggal", lambda shipment: _local(shipment.created_at)),
+        ("Nama Penerima", lambda shipment: shipment.full_name),
+        ("Telepon", lambda shipment: shipment.phone),
+        ("Alamat", lambda shipment: shipment.street),
+        ("Kecamatan", lambda shipment: shipment.district_name),
+        ("Kode Pos", lambda shipment: shipment.postal_code),
+        ("Layanan", lambda shipment: shipment.get_service_display()),
+        ("Biaya", lambda shipment: shipment.cost),
+        ("Estimasi", lambda shipment: shipment.eta),
+        ("Nomor Resi", lambda shipment: shipment.tracking_number),
+    ),
+    select_related=("order",),
+    only=(
+        "created_at", "full_name", "phone", "street", "district_name", "postal_code", "service", "cost", "eta",
+        "tracking_number", "order__order_number", "order__status",
+    ),
+)
+
+CONTACT_MESSAGE_EXPORT = ExportSpec(
+    filename="pesan-kontak",
+    model=ContactMessage,
+    columns=(
+        ("Dikirim Pada", lambda message: _local(message.created_at)),
+        ("Nama", lambda message: message.name),
+        ("Email", lambda message: message.email),
+        ("Telepon", lambda message: message.phone),
+        ("Subjek", lambda message: message.subject),
+        ("Pesan", lambda message: message.message),
+    ),
+)
+
+# Headers are model field names so the file can be fed back to import_products.
+PRODUCT_EXPORT = ExportSpec(
+    filename="produk",
+    model=Product,
+    columns=(
+        ("slug", lambda product: product.slug),
+        ("name", lambda product: product.name),
+        ("category", lambda product: product.category.name),
+        ("description", lambda product: product.description),
+        ("price", lambda product: product.price),
+        ("discount_price", lambda product: product.discount_price),
+        ("stock", lambda product: product.stock),
+        ("available", lambda product: product.available),
+        ("calories", lambda product: product.calories),
+        ("protein", lambda product: product.protein),
+        ("fat", lambda product: product.fat),
+        ("carbohydrates", lambda product: product.carbohydrates),
+        ("vitamins", lambda product: product.vitamins),
+        ("fiber", lambda product: product.fiber),
+        ("weight_gram", lambda product: product.weight_gram),
+        ("is_featured", lambda product: product.is_featured),
+    ),
+    select_related=("category",),
+    only=(
+        "slug", "name", "description", "price", "discount_price", "stock", "available", "calories", "protein",
+        "fat", "carbohydrates", "vitamins", "fiber", "weight_gram", "is_featured", "category__name",
+    ),
+)
+
+EXPORTS = {
+    "orders": ORDER_EXPORT,
+    "products": PRODUCT_EXPORT,
+    "shipments": SHIPMENT_EXPORT,
+    "contact_messages": CONTACT_MESSAGE_EXPORT,
+}
+
+
+def iter_rows(spec: ExportSpec, queryset=None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[list]:
+    for instance in spec.prepare(queryset).iterator(chunk_size=chunk_size):
+        yield [_cell(accessor(instance)) for _, accessor in spec.columns]
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the line for ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(spec: ExportSpec, queryset=None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    # BOM so Excel opens the UTF-8 file with the right encoding.
+    yield "\ufeff" + writer.writerow(spec.headers)
+    for row in iter_rows(spec, queryset, chunk_size):
+        yield writer.writerow(row)
+
+
+def write_xlsx(spec: ExportSpec, handle, queryset=None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=spec.filename[:31])
+    sheet.append(spec.headers)
+    for row in iter_rows(spec, queryset, chunk_size):
+        sheet.append(row)
+    workbook.save(handle)
+
+
+def _filename(spec: ExportSpec, extension: str) -> str:
+    return f"{spec.filename}-{timezone.localtime():%Y%m%d-%H%M%S}.{extension}"
+
+
+def export_response(spec: ExportSpec, queryset=None, file_format: str = "csv", chunk_size: int = DEFAULT_CHUNK_SIZE):
+    if file_format == "xlsx":
+        handle = tempfile.TemporaryFile()
+        write_xlsx(spec, handle, queryset, chunk_size)
+        handle.seek(0)
+        return FileResponse(
+            handle, as_attachment=True, filename=_filename(spec, "xlsx"), content_type=XLSX_CONTENT_TYPE
+        )
+
+    response = StreamingHttpResponse(iter_csv(spec, queryset, chunk_size), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{_filename(spec, "csv")}"'
+    return response
+
+
+def export_actions(spec: ExportSpec) -> list:
+    """Return ``[export_csv, export_xlsx]`` admin actions for ``spec``."""
+
+    def export_csv(modeladmin, request, queryset):
+        return export_response(spec, queryset, "csv")
+
+    def export_xlsx(modeladmin, request, queryset):
+        return export_response(spec, queryset, "xlsx")
+
+    export_csv.short_description = "Ekspor terpilih ke CSV"
+    export_xlsx.short_description = "Ekspor terpilih ke XLSX"
+    return [export_csv, export_xlsx]
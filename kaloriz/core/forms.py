@@ -2,6 +2,7 @@ from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 from django.core.exceptions import ValidationError
+from .backends import users_with_email
 from .models import UserProfile
 from catalog.models import Testimonial
 
@@ -59,7 +60,7 @@ class CustomUserRegistrationForm(UserCreationForm):
     def clean_email(self):
         """Validate that email is unique"""
         email = self.cleaned_data.get('email')
-        if User.objects.filter(email=email).exists():
+        if users_with_email(email).exists():
             raise ValidationError('Email ini sudah terdaftar.')
         return email
 
@@ -0,0 +1,41 @@
+"""
+Management command untuk memperbarui rekomendasi "Sering Dibeli Bersamaan".
+
+Usage:
+    python manage.py build_product_associations
+    python manage.py build_product_associations --half-life-days 90
+    python manage.py build_product_associations --full --chunk-size 5000
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.services.associations import build_product_associations
+
+
+class Command(BaseCommand):
+    help = 'Hitung bobot produk yang sering dibeli bersamaan dari pesanan baru sejak eksekusi terakhir'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Jumlah pesanan per batch')
+        parser.add_argument(
+            '--half-life-days',
+            type=float,
+            default=None,
+            help='Waktu paruh bobot pesanan dalam hari (kosongkan untuk tanpa peluruhan)',
+        )
+        parser.add_argument('--min-weight', type=float, default=0.01, help='Hapus pasangan dengan bobot di bawah nilai ini')
+        parser.add_argument('--full', action='store_true', help='Bangun ulang dari seluruh riwayat pesanan')
+
+    def handle(self, *args, **options):
+        stats = build_product_associations(
+            chunk_size=options['chunk_size'],
+            half_life_days=options['half_life_days'],
+            min_weight=options['min_weight'],
+            full=options['full'],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Asosiasi produk diperbarui: {stats['orders']} pesanan, {stats['pairs']} pasangan, "
+                f"{stats['pruned']} dipangkas dalam {stats['elapsed']:.2f}s"
+            )
+        )
@@ -0,0 +1,54 @@
+"""
+Management command untuk mengekspor pesanan, pengiriman, pesan kontak, atau produk ke CSV/XLSX.
+
+Data dibaca per batch sehingga pemakaian memori tetap konstan berapa pun jumlah datanya.
+
+Usage:
+    python manage.py export_records orders --output pesanan.csv
+    python manage.py export_records shipments --format xlsx --output pengiriman.xlsx
+    python manage.py export_records contact_messages --since 2025-01-01 > pesan.csv
+    python manage.py export_records products --output produk.csv
+"""
+
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.exports import DEFAULT_CHUNK_SIZE, EXPORTS, iter_csv, write_xlsx
+
+
+class Command(BaseCommand):
+    help = 'Ekspor pesanan, pengiriman, pesan kontak, atau produk ke CSV/XLSX secara streaming'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS), help='Jenis data yang diekspor')
+        parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv', help='Format file (default: csv)')
+        parser.add_argument('--output', help='Path file tujuan (CSV default ke stdout)')
+        parser.add_argument('--since', help='Hanya data yang dibuat sejak tanggal ini (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Jumlah baris per batch query')
+
+    def handle(self, *args, **options):
+        spec = EXPORTS[options['kind']]
+        queryset = spec.model.objects.all()
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Format --since harus YYYY-MM-DD')
+            queryset = queryset.filter(created_at__gte=timezone.make_aware(datetime.combine(since, time.min)))
+
+        if options['format'] == 'xlsx':
+            if not options['output']:
+                raise CommandError('Ekspor XLSX membutuhkan --output')
+            with open(options['output'], 'wb') as handle:
+                write_xlsx(spec, handle, queryset, options['chunk_size'])
+        elif options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as handle:
+                handle.writelines(iter_csv(spec, queryset, options['chunk_size']))
+        else:
+            for line in iter_csv(spec, queryset, options['chunk_size']):
+                self.stdout.write(line, ending='')
+            return
+
+        self.stderr.write(self.style.SUCCESS(f"Ekspor {options['kind']} tersimpan di {options['output']}"))
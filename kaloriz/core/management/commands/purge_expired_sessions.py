@@ -0,0 +1,28 @@
+"""
+Management command untuk menghapus sesi yang sudah kedaluwarsa secara bertahap.
+
+Sesi dihapus per batch (default 1000 baris per DELETE) agar tabel ``django_session``
+tidak terkunci lama saat login dan checkout sedang berjalan. Jalankan berkala
+(mis. setiap malam lewat cron).
+
+Usage:
+    python manage.py purge_expired_sessions
+    python manage.py purge_expired_sessions --batch-size 500
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.services.session_state import DEFAULT_PURGE_BATCH_SIZE, purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = 'Hapus sesi yang sudah kedaluwarsa secara bertahap (per batch)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_PURGE_BATCH_SIZE, help='Jumlah sesi yang dihapus per query DELETE'
+        )
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_sessions(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{deleted} sesi kedaluwarsa dihapus"))
@@ -0,0 +1,20 @@
+"""
+Management command untuk menghapus kunci idempotensi pembuatan pesanan yang sudah kedaluwarsa.
+
+Jalankan berkala (mis. setiap jam lewat cron) agar tabel kunci tetap kecil.
+
+Usage:
+    python manage.py purge_idempotency_keys
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.services.idempotency import purge_expired_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = 'Hapus kunci idempotensi pembuatan pesanan yang sudah kedaluwarsa'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_idempotency_keys()
+        self.stdout.write(self.style.SUCCESS(f"{deleted} kunci idempotensi kedaluwarsa dihapus"))
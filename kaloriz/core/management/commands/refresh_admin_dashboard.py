@@ -0,0 +1,35 @@
+"""
+Management command untuk memperbarui rekap penjualan dan cache KPI dashboard admin.
+
+Jalankan berkala (mis. setiap menit lewat cron) agar dashboard admin selalu dibaca dari cache.
+Cache KPI hanya diisi bila CACHE_URL diatur; LocMemCache milik proses cron tidak terbaca oleh
+proses web, sehingga tanpa CACHE_URL langkah itu dilewati.
+
+Usage:
+    python manage.py refresh_admin_dashboard
+    python manage.py refresh_admin_dashboard --skip-rollups
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.services.dashboard import cache_is_shared, get_dashboard_kpis
+from core.services.rollups import refresh_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Perbarui rekap penjualan harian lalu hitung ulang cache KPI dashboard admin'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-rollups', action='store_true', help='Hanya perbarui cache KPI')
+
+    def handle(self, *args, **options):
+        if not options['skip_rollups']:
+            refresh_sales_rollups()
+        if not cache_is_shared():
+            self.stdout.write(self.style.WARNING(
+                'Cache KPI tidak diperbarui: tanpa CACHE_URL setiap proses memakai cache sendiri. '
+                'Dashboard akan dihitung ulang oleh proses web saat cache-nya kedaluwarsa.'
+            ))
+            return
+        kpis = get_dashboard_kpis(refresh=True)
+        self.stdout.write(self.style.SUCCESS(f"KPI dashboard diperbarui pada {kpis['generated_at']:%Y-%m-%d %H:%M:%S}"))
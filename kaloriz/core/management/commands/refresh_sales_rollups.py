@@ -0,0 +1,29 @@
+"""
+Management command untuk memperbarui rekap penjualan harian (produk, kategori, kecamatan).
+
+Hanya hari yang pesanannya berubah sejak eksekusi terakhir yang dihitung ulang.
+
+Usage:
+    python manage.py refresh_sales_rollups
+    python manage.py refresh_sales_rollups --full
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.services.rollups import DAYS_PER_BATCH, refresh_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Perbarui rekap penjualan harian dari pesanan yang berubah sejak eksekusi terakhir'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Hitung ulang seluruh riwayat pesanan')
+        parser.add_argument('--days-per-batch', type=int, default=DAYS_PER_BATCH, help='Jumlah hari per transaksi')
+
+    def handle(self, *args, **options):
+        stats = refresh_sales_rollups(full=options['full'], days_per_batch=options['days_per_batch'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rekap penjualan diperbarui: {stats['days']} hari, {stats['rows']} baris dalam {stats['elapsed']:.2f}s"
+            )
+        )
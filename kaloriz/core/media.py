@@ -0,0 +1,151 @@
+"""Serve ``MEDIA_URL`` files without tying up a worker on the byte transfer.
+
+With ``MEDIA_ACCEL_BACKEND = "nginx"`` the view only answers with an
+``X-Accel-Redirect`` to an internal location; ``"sendfile"`` emits
+``X-Sendfile`` for Apache/lighttpd. Without a front server the file goes out
+through :class:`~django.http.FileResponse`, which WSGI servers hand to
+``os.sendfile`` via ``wsgi.file_wrapper``.
+
+Image derivatives are linked with a content hash (``?v=<hash>``); requests
+carrying the current hash get an immutable one-year ``Cache-Control``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mimetypes
+import os
+import posixpath
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from core.services.images import IMAGE_FORMATS, IMAGE_WIDTHS, derivative_name, placeholder_name
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+_HASH_CACHE_PREFIX = "media:hash:"
+_RENDITIONS_CACHE_PREFIX = "media:renditions:"
+_HASH_LENGTH = 12
+
+
+def _media_path(name: str) -> str:
+    try:
+        return safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404("File media tidak ditemukan.")
+
+
+def _file_signature(stat_result: os.stat_result) -> str:
+    return f"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"
+
+
+def media_content_hash(name: str) -> str:
+    """Return a short content hash for ``name``, cached per mtime and size."""
+
+    try:
+        stat_result = os.stat(_media_path(name))
+    except (Http404, OSError):
+        return ""
+
+    cache_key = f"{_HASH_CACHE_PREFIX}{name}:{_file_signature(stat_result)}"
+    digest = cache.get(cache_key)
+    if digest is None:
+        hasher = hashlib.sha256()
+        with open(_media_path(name), "rb") as handle:
+            for chunk in iter(lambda: handle.read(64 * 1024), b""):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()[:_HASH_LENGTH]
+        cache.set(cache_key, digest, None)
+    return digest
+
+
+def hashed_media_url(name: str) -> str:
+    """Return the storage URL for ``name`` with its content hash appended."""
+
+    url = default_storage.url(name)
+    digest = media_content_hash(name)
+    return f"{url}?v={digest}" if digest else url
+
+
+def image_rendition_urls(original_name: str) -> dict[str, str] | None:
+    """Return hashed URLs of every rendition of ``original_name``.
+
+    Keys are ``"<rendition>.<extension>"`` plus ``"placeholder"``; ``None``
+    means the derivatives do not exist yet. The placeholder is written last
+    by :func:`~core.services.images.generate_image_derivatives`, so its
+    ``stat`` identifies the current set: one ``stat`` and one cache read per
+    image instead of one of each per URL.
+    """
+
+    if not original_name:
+        return None
+    placeholder = placeholder_name(original_name)
+    try:
+        stat_result = os.stat(_media_path(placeholder))
+    except (Http404, OSError):
+        return None
+
+    cache_key = f"{_RENDITIONS_CACHE_PREFIX}{original_name}:{_file_signature(stat_result)}"
+    urls = cache.get(cache_key)
+    if urls is None:
+        urls = {
+            f"{rendition}.{extension}": hashed_media_url(derivative_name(original_name, rendition, extension))
+            for rendition in IMAGE_WIDTHS
+            for extension in IMAGE_FORMATS
+        }
+        urls["placeholder"] = hashed_media_url(placeholder)
+        cache.set(cache_key, urls, None)
+    return urls
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a file from ``MEDIA_ROOT`` with caching headers."""
+
+    name = posixpath.normpath(path).lstrip("/")
+    full_path = _media_path(name)
+    try:
+        stat_result = os.stat(full_path)
+    except OSError:
+        raise Http404("File media tidak ditemukan.")
+    if not os.path.isfile(full_path):
+        raise Http404("File media tidak ditemukan.")
+
+    etag = f'"{_file_signature(stat_result)}"'
+    last_modified = int(stat_result.st_mtime)
+    requested_hash = request.GET.get("v")
+    if requested_hash and requested_hash == media_content_hash(name):
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        cache_control = f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)}"
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        not_modified["ETag"] = etag
+        not_modified["Cache-Control"] = cache_control
+        return not_modified
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    backend = getattr(settings, "MEDIA_ACCEL_BACKEND", "")
+    if backend == "nginx":
+        prefix = getattr(settings, "MEDIA_ACCEL_PREFIX", "/protected-media/").rstrip("/")
+        response = HttpResponse(content_type=content_type or "application/octet-stream")
+        response["X-Accel-Redirect"] = f"{prefix}/{quote(name)}"
+    elif backend == "sendfile":
+        response = HttpResponse(content_type=content_type or "application/octet-stream")
+        response["X-Sendfile"] = full_path
+    else:
+        response = FileResponse(open(full_path, "rb"))
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = cache_control
+    return response
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_notification"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="version",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Naik setiap kali status berubah (optimistic concurrency)",
+                verbose_name="Versi",
+            ),
+        ),
+    ]
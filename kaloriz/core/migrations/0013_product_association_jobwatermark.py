@@ -0,0 +1,98 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0010_product_similarity"),
+        ("core", "0012_order_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        max_length=100, unique=True, verbose_name="Nama Job"
+                    ),
+                ),
+                (
+                    "last_id",
+                    models.BigIntegerField(default=0, verbose_name="ID Terakhir"),
+                ),
+                (
+                    "last_run_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Terakhir Dijalankan"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Watermark Job",
+                "verbose_name_plural": "Watermark Job",
+            },
+        ),
+        migrations.CreateModel(
+            name="ProductAssociation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("weight", models.FloatField(default=0, verbose_name="Bobot")),
+                (
+                    "associated",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="bought_with",
+                        to="catalog.product",
+                        verbose_name="Dibeli Bersama",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="associations",
+                        to="catalog.product",
+                        verbose_name="Produk",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Asosiasi Produk",
+                "verbose_name_plural": "Asosiasi Produk",
+                "indexes": [
+                    models.Index(
+                        fields=["product", "-weight"],
+                        name="core_produc_product_e09877_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("product", "associated"),
+                        name="unique_product_association",
+                    )
+                ],
+            },
+        ),
+    ]
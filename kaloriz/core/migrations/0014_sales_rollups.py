@@ -0,0 +1,260 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0011_product_stats"),
+        ("core", "0013_product_association_jobwatermark"),
+        ("shipping", "0002_address_is_deleted"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyCategorySales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Tanggal")),
+                (
+                    "orders",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Pesanan Dibayar"
+                    ),
+                ),
+                (
+                    "units",
+                    models.PositiveIntegerField(default=0, verbose_name="Unit Terjual"),
+                ),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Pendapatan",
+                    ),
+                ),
+                (
+                    "cancelled_orders",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Pesanan Dibatalkan"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Penjualan Harian Kategori",
+                "verbose_name_plural": "Penjualan Harian Kategori",
+                "ordering": ["-date"],
+                "abstract": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyDistrictSales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Tanggal")),
+                (
+                    "orders",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Pesanan Dibayar"
+                    ),
+                ),
+                (
+                    "units",
+                    models.PositiveIntegerField(default=0, verbose_name="Unit Terjual"),
+                ),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Pendapatan",
+                    ),
+                ),
+                (
+                    "cancelled_orders",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Pesanan Dibatalkan"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Penjualan Harian Kecamatan",
+                "verbose_name_plural": "Penjualan Harian Kecamatan",
+                "ordering": ["-date"],
+                "abstract": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyProductSales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Tanggal")),
+                (
+                    "orders",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Pesanan Dibayar"
+                    ),
+                ),
+                (
+                    "units",
+                    models.PositiveIntegerField(default=0, verbose_name="Unit Terjual"),
+                ),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Pendapatan",
+                    ),
+                ),
+                (
+                    "cancelled_orders",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Pesanan Dibatalkan"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Penjualan Harian Produk",
+                "verbose_name_plural": "Penjualan Harian Produk",
+                "ordering": ["-date"],
+                "abstract": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="DailySalesSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Tanggal")),
+                (
+                    "orders",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Pesanan Dibayar"
+                    ),
+                ),
+                (
+                    "units",
+                    models.PositiveIntegerField(default=0, verbose_name="Unit Terjual"),
+                ),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Pendapatan",
+                    ),
+                ),
+                (
+                    "cancelled_orders",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Pesanan Dibatalkan"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Rekap Penjualan Harian",
+                "verbose_name_plural": "Rekap Penjualan Harian",
+                "ordering": ["-date"],
+                "abstract": False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["updated_at"], name="core_order_updated_at_idx"),
+        ),
+        migrations.AddField(
+            model_name="dailycategorysales",
+            name="category",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="daily_sales",
+                to="catalog.category",
+                verbose_name="Kategori",
+            ),
+        ),
+        migrations.AddField(
+            model_name="dailydistrictsales",
+            name="district",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="daily_sales",
+                to="shipping.district",
+                verbose_name="Kecamatan",
+            ),
+        ),
+        migrations.AddField(
+            model_name="dailyproductsales",
+            name="product",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="daily_sales",
+                to="catalog.product",
+                verbose_name="Produk",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailysalessummary",
+            constraint=models.UniqueConstraint(
+                fields=("date",), name="unique_daily_sales_summary"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailycategorysales",
+            constraint=models.UniqueConstraint(
+                fields=("date", "category"), name="unique_daily_category_sales"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailydistrictsales",
+            constraint=models.UniqueConstraint(
+                fields=("date", "district"), name="unique_daily_district_sales"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailyproductsales",
+            constraint=models.UniqueConstraint(
+                fields=("date", "product"), name="unique_daily_product_sales"
+            ),
+        ),
+    ]
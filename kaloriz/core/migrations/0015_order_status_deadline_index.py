@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0014_sales_rollups"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["status", "payment_deadline"],
+                name="core_order_status_deadline_idx",
+            ),
+        ),
+    ]
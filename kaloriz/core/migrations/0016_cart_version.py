@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_order_status_deadline_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="version",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Naik setiap kali isi keranjang berubah (menandai ringkasan checkout kedaluwarsa)",
+                verbose_name="Versi",
+            ),
+        ),
+    ]
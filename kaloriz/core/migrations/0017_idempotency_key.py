@@ -0,0 +1,61 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0016_cart_version"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IdempotencyKey",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("scope", models.CharField(max_length=50, verbose_name="Endpoint")),
+                ("key", models.CharField(max_length=64, verbose_name="Kunci")),
+                (
+                    "response",
+                    models.JSONField(
+                        blank=True, null=True, verbose_name="Respons Tersimpan"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "expires_at",
+                    models.DateTimeField(db_index=True, verbose_name="Kedaluwarsa"),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="idempotency_keys",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Pengguna",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Kunci Idempotensi",
+                "verbose_name_plural": "Kunci Idempotensi",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "scope", "key"), name="unique_idempotency_key"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0017_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderNumberBlock",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Blok Nomor Pesanan",
+                "verbose_name_plural": "Blok Nomor Pesanan",
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:57
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Index ``LOWER(email)`` on ``auth_user`` for email logins (see core.backends)."""
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("core", "0018_order_number_block"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="CREATE INDEX core_auth_user_email_lower ON auth_user (LOWER(email));",
+            reverse_sql="DROP INDEX core_auth_user_email_lower;",
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0019_auth_user_email_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="idempotencykey",
+            name="fingerprint",
+            field=models.CharField(
+                blank=True,
+                help_text="SHA-256 isi permintaan pertama",
+                max_length=64,
+                verbose_name="Sidik Permintaan",
+            ),
+        ),
+    ]
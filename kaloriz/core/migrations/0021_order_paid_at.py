@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0020_idempotency_key_fingerprint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="paid_at",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                help_text="Waktu pesanan berpindah ke status dibayar",
+                null=True,
+                verbose_name="Dibayar Pada",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["paid_at"], name="core_order_paid_at_idx"),
+        ),
+    ]
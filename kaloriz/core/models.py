@@ -7,7 +7,7 @@ import random
 from datetime import timedelta
 from django.utils import timezone
 from django.utils.text import slugify
-from django.db.models import Sum
+from django.db.models import F, Sum
 
 
 class PaymentMethod(models.Model):
@@ -74,6 +74,12 @@ class PaymentMethod(models.Model):
 
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='carts', verbose_name="Pengguna")
+    version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Versi",
+        help_text="Naik setiap kali isi keranjang berubah (menandai ringkasan checkout kedaluwarsa)",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -84,14 +90,37 @@ class Cart(models.Model):
     def __str__(self):
         return f"Keranjang - {self.user.username}"
 
+    @classmethod
+    def bump_version(cls, cart_id):
+        """Mark the cart as changed without touching ``updated_at``."""
+        cls.objects.filter(pk=cart_id).update(version=F('version') + 1)
+
+    def price_items(self, items):
+        """Look up the user's flash sale holds for ``items`` in one query.
+
+        ``CartItem.get_unit_price`` then uses them instead of querying per
+        item. Returns ``items`` as a list.
+        """
+        from catalog.flash_sales import held_flash_sale_units
+
+        items = list(items)
+        unpriced = [item for item in items if not hasattr(item, '_held_units')]
+        if unpriced:
+            held = held_flash_sale_units(self.user_id, [item.product for item in unpriced])
+            for item in unpriced:
+                hold = held.get(item.product_id)
+                item._held_units = hold.units if hold else 0
+        return items
+
     def get_total(self):
         """Calculate total price of all items in cart"""
-        return sum(item.get_subtotal() for item in self.items.all())
+        return sum(item.get_subtotal() for item in self.price_items(self.items.all()))
 
     def get_selected_total(self):
         """Calculate total price of selected items only"""
+        # Filtered here so prefetched (and already priced) items are reused.
         return sum(
-            item.get_subtotal() for item in self.items.filter(is_selected=True)
+            item.get_subtotal() for item in self.price_items(self.items.all()) if item.is_selected
         )
 
     def get_total_items(self):
@@ -123,9 +152,20 @@ class CartItem(models.Model):
     def __str__(self):
         return f"{self.quantity}x {self.product.name}"
 
+    def get_unit_price(self):
+        """Return the unit price, giving flash prices only to held quota units"""
+        from catalog.flash_sales import flash_sale_unit_price, held_flash_sale_units
+
+        held_units = getattr(self, '_held_units', None)
+        if held_units is None:
+            # Not priced through Cart.price_items: look up this item's hold alone.
+            held = held_flash_sale_units(self.cart.user_id, [self.product]).get(self.product_id)
+            held_units = held.units if held else 0
+        return flash_sale_unit_price(self.product, self.quantity, held_units)
+
     def get_subtotal(self):
         """Calculate subtotal for this item"""
-        return self.product.get_display_price() * self.quantity
+        return self.get_unit_price() * self.quantity
 
 
 class Order(models.Model):
@@ -137,6 +177,8 @@ class Order(models.Model):
         ('delivered', 'Selesai'),
         ('cancelled', 'Dibatalkan'),
     ]
+    # Statuses that count as a completed sale for stats and recommendations.
+    PAID_STATUSES = ('paid', 'processing', 'shipped', 'delivered')
 
     REGULAR_COURIERS = [
         ('JNE', 'JNE'),
@@ -246,6 +288,19 @@ class Order(models.Model):
         verbose_name="Midtrans Order ID",
         help_text="ID unik yang digunakan untuk transaksi Midtrans",
     )
+    paid_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Dibayar Pada",
+        help_text="Waktu pesanan berpindah ke status dibayar",
+    )
+    version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Versi",
+        help_text="Naik setiap kali status berubah (optimistic concurrency)",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -253,10 +308,29 @@ class Order(models.Model):
         verbose_name = "Pesanan"
         verbose_name_plural = "Pesanan"
         ordering = ['-created_at']
+        indexes = [
+            # Incremental jobs (sales rollups) scan orders changed since a watermark.
+            models.Index(fields=['updated_at'], name='core_order_updated_at_idx'),
+            # Admin dashboard backlog and the payment timeout job filter by status first.
+            models.Index(fields=['status', 'payment_deadline'], name='core_order_status_deadline_idx'),
+            # The association job re-scans orders paid after its previous run.
+            models.Index(fields=['paid_at'], name='core_order_paid_at_idx'),
+        ]
+
+    # Allowed status moves; anything else is rejected by transition_order_status.
+    STATUS_TRANSITIONS = {
+        'pending': {'paid', 'cancelled'},
+        'paid': {'processing'},
+        'processing': {'shipped'},
+        'shipped': {'delivered'},
+    }
 
     PAYMENT_TIMEOUT_HOURS = 1
     MIDTRANS_ORDER_ID_PREFIX = "KALORIZ"
-    MIDTRANS_RETRY_SEPARATOR = "::retry::"
+    # Midtrans only accepts letters, digits and ``-_~.`` in order ids.
+    MIDTRANS_RETRY_SEPARATOR = "~retry~"
+    # Retry ids issued before the separator changed.
+    MIDTRANS_LEGACY_RETRY_SEPARATORS = ("::retry::",)
 
     def __str__(self):
         return f"Pesanan #{self.order_number}"
@@ -267,6 +341,9 @@ class Order(models.Model):
             self.payment_deadline = reference_time + timedelta(hours=self.PAYMENT_TIMEOUT_HOURS)
         super().save(*args, **kwargs)
 
+    def can_transition_to(self, status: str) -> bool:
+        return status in self.STATUS_TRANSITIONS.get(self.status, ())
+
     def get_status_display_class(self):
         """Return CSS class for status badge"""
         status_classes = {
@@ -307,17 +384,22 @@ class Order(models.Model):
         self.save(update_fields=["midtrans_order_id"])
         return midtrans_order_id
 
+    @classmethod
+    def split_midtrans_order_id(cls, midtrans_order_id: str) -> tuple[str, int]:
+        """Return ``(base_id, retry)`` for a Midtrans order id."""
+
+        for separator in (cls.MIDTRANS_RETRY_SEPARATOR, *cls.MIDTRANS_LEGACY_RETRY_SEPARATORS):
+            if separator and separator in midtrans_order_id:
+                base, suffix = midtrans_order_id.split(separator, 1)
+                try:
+                    return base, int(suffix)
+                except (TypeError, ValueError):
+                    return base, 0
+        return midtrans_order_id, 0
+
     def _extract_midtrans_retry_state(self) -> tuple[str, int]:
-        separator = self.MIDTRANS_RETRY_SEPARATOR or ""
-        current_id = self.midtrans_order_id or ""
-        if separator and separator in current_id:
-            base, suffix = current_id.split(separator, 1)
-            try:
-                retry = int(suffix)
-            except (TypeError, ValueError):
-                retry = 0
-            return base or self._build_midtrans_order_id_value(), retry
-        return current_id or self._build_midtrans_order_id_value(), 0
+        base, retry = self.split_midtrans_order_id(self.midtrans_order_id or "")
+        return base or self._build_midtrans_order_id_value(), retry
 
     def _build_midtrans_retry_candidate(self, base_id: str, retry: int) -> str:
         separator = self.MIDTRANS_RETRY_SEPARATOR or ""
@@ -338,18 +420,10 @@ class Order(models.Model):
     def regenerate_midtrans_order_id(self) -> str:
         """Generate a new Midtrans order_id for retry scenarios."""
 
+        # The base is this order's own number (or ``KALORIZ-<pk>``), so a
+        # higher retry count cannot belong to another order.
         base_id, current_retry = self._extract_midtrans_retry_state()
-        next_retry = current_retry + 1
-        candidate = self._build_midtrans_retry_candidate(base_id, next_retry)
-
-        order_model = self.__class__
-        while (
-            order_model.objects.exclude(pk=self.pk)
-            .filter(midtrans_order_id=candidate)
-            .exists()
-        ):
-            next_retry += 1
-            candidate = self._build_midtrans_retry_candidate(base_id, next_retry)
+        candidate = self._build_midtrans_retry_candidate(base_id, current_retry + 1)
 
         self.midtrans_order_id = candidate
         self.midtrans_token = ""
@@ -506,3 +580,164 @@ class Notification(models.Model):
 
     def __str__(self):
         return f"{self.title} - {self.user.username}"
+
+    @classmethod
+    def for_order_status(cls, order):
+        """Build an unsaved status-change notification for the given order."""
+        return cls(
+            user_id=order.user_id,
+            title="Status Pesanan Diperbarui",
+            message=f"Status pesanan {order.order_number} berubah menjadi {order.get_status_display()}",
+        )
+
+
+class ProductAssociation(models.Model):
+    """Sparse, time-decayed co-purchase weights between two products."""
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='associations', verbose_name="Produk"
+    )
+    associated = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='bought_with', verbose_name="Dibeli Bersama"
+    )
+    weight = models.FloatField(default=0, verbose_name="Bobot")
+
+    class Meta:
+        verbose_name = "Asosiasi Produk"
+        verbose_name_plural = "Asosiasi Produk"
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'associated'], name='unique_product_association'),
+        ]
+        indexes = [
+            models.Index(fields=['product', '-weight']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.associated_id} ({self.weight:.2f})"
+
+
+class JobWatermark(models.Model):
+    """Progress marker for incremental batch jobs (last processed id and run time)."""
+
+    name = models.CharField(max_length=100, unique=True, verbose_name="Nama Job")
+    last_id = models.BigIntegerField(default=0, verbose_name="ID Terakhir")
+    last_run_at = models.DateTimeField(null=True, blank=True, verbose_name="Terakhir Dijalankan")
+
+    class Meta:
+        verbose_name = "Watermark Job"
+        verbose_name_plural = "Watermark Job"
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
+
+
+class SalesRollup(models.Model):
+    """Per-day sales figures maintained by ``manage.py refresh_sales_rollups``."""
+
+    date = models.DateField(verbose_name="Tanggal")
+    orders = models.PositiveIntegerField(default=0, verbose_name="Pesanan Dibayar")
+    units = models.PositiveIntegerField(default=0, verbose_name="Unit Terjual")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Pendapatan")
+    cancelled_orders = models.PositiveIntegerField(default=0, verbose_name="Pesanan Dibatalkan")
+
+    class Meta:
+        abstract = True
+        ordering = ['-date']
+
+
+class DailySalesSummary(SalesRollup):
+    class Meta(SalesRollup.Meta):
+        verbose_name = "Rekap Penjualan Harian"
+        verbose_name_plural = "Rekap Penjualan Harian"
+        constraints = [
+            models.UniqueConstraint(fields=['date'], name='unique_daily_sales_summary'),
+        ]
+
+    def __str__(self):
+        return f"{self.date}: {self.orders} pesanan"
+
+
+class DailyProductSales(SalesRollup):
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='daily_sales', verbose_name="Produk"
+    )
+
+    class Meta(SalesRollup.Meta):
+        verbose_name = "Penjualan Harian Produk"
+        verbose_name_plural = "Penjualan Harian Produk"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='unique_daily_product_sales'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.product_id}: {self.units} unit"
+
+
+class DailyCategorySales(SalesRollup):
+    category = models.ForeignKey(
+        'catalog.Category', on_delete=models.CASCADE, related_name='daily_sales', verbose_name="Kategori"
+    )
+
+    class Meta(SalesRollup.Meta):
+        verbose_name = "Penjualan Harian Kategori"
+        verbose_name_plural = "Penjualan Harian Kategori"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='unique_daily_category_sales'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.category_id}: {self.units} unit"
+
+
+class DailyDistrictSales(SalesRollup):
+    district = models.ForeignKey(
+        'shipping.District', on_delete=models.CASCADE, related_name='daily_sales', verbose_name="Kecamatan"
+    )
+
+    class Meta(SalesRollup.Meta):
+        verbose_name = "Penjualan Harian Kecamatan"
+        verbose_name_plural = "Penjualan Harian Kecamatan"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'district'], name='unique_daily_district_sales'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.district_id}: {self.orders} pesanan"
+
+
+class IdempotencyKey(models.Model):
+    """Client-supplied key that makes an order placing request safe to repeat."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys', verbose_name="Pengguna")
+    scope = models.CharField(max_length=50, verbose_name="Endpoint")
+    key = models.CharField(max_length=64, verbose_name="Kunci")
+    fingerprint = models.CharField(
+        max_length=64, blank=True, verbose_name="Sidik Permintaan", help_text="SHA-256 isi permintaan pertama"
+    )
+    response = models.JSONField(null=True, blank=True, verbose_name="Respons Tersimpan")
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Kedaluwarsa")
+
+    class Meta:
+        verbose_name = "Kunci Idempotensi"
+        verbose_name_plural = "Kunci Idempotensi"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key}"
+
+
+class OrderNumberBlock(models.Model):
+    """One reserved range of order numbers; see ``core.services.order_numbers``."""
+
+    id = models.BigAutoField(primary_key=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Blok Nomor Pesanan"
+        verbose_name_plural = "Blok Nomor Pesanan"
+
+    def __str__(self):
+        return f"Blok {self.pk}"
@@ -0,0 +1,198 @@
+"""Frequently-bought-together associations mined from order history.
+
+Orders are streamed in id-ordered chunks; each chunk becomes a sparse COO
+list of ``(product, associated, weight)`` triples that NumPy reduces with
+``np.unique`` + ``np.bincount``, so memory grows with the number of distinct
+product pairs rather than with the number of orders. Weights optionally decay
+exponentially with order age. Runs are incremental: a :class:`JobWatermark`
+remembers the last settled order id folded in, and stored weights are decayed to the
+new run time before the new orders are added. Orders below the watermark that
+were still unpaid when it passed them are picked up by ``paid_at`` once paid.
+"""
+
+from __future__ import annotations
+
+import time
+from datetime import timedelta
+from typing import Iterable
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Max, Min, Q, Sum
+from django.utils import timezone
+
+from catalog.models import Product
+from core.models import JobWatermark, Order, OrderItem, ProductAssociation
+
+ASSOCIATION_JOB = "product_associations"
+
+_EMPTY_PAIRS = np.empty((0, 2), dtype=np.int64)
+_EMPTY_WEIGHTS = np.empty(0, dtype=np.float64)
+
+
+def _decay(age_seconds, half_life_seconds: float | None):
+    if not half_life_seconds:
+        return np.ones_like(age_seconds, dtype=np.float64)
+    return np.power(0.5, np.asarray(age_seconds, dtype=np.float64) / half_life_seconds)
+
+
+def _reduce(pairs: np.ndarray, weights: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Sum duplicate ``(product, associated)`` pairs."""
+
+    if not len(pairs):
+        return _EMPTY_PAIRS, _EMPTY_WEIGHTS
+    unique_pairs, inverse = np.unique(pairs, axis=0, return_inverse=True)
+    return unique_pairs, np.bincount(inverse.ravel(), weights=weights)
+
+
+def _chunk_pairs(order_weights: dict[int, float], items: list[tuple[int, int]]):
+    """Expand one chunk of ``(order_id, product_id)`` rows into weighted pairs."""
+
+    if not items:
+        return _EMPTY_PAIRS, _EMPTY_WEIGHTS
+
+    rows = np.array(items, dtype=np.int64)
+    boundaries = np.flatnonzero(np.diff(rows[:, 0])) + 1
+    pair_blocks, weight_blocks = [], []
+    for group in np.split(rows, boundaries):
+        products = np.unique(group[:, 1])
+        if len(products) < 2:
+            continue
+        left, right = np.meshgrid(products, products, indexing="ij")
+        mask = left != right
+        pair_blocks.append(np.column_stack((left[mask], right[mask])))
+        weight_blocks.append(np.full(int(mask.sum()), order_weights[int(group[0, 0])]))
+
+    if not pair_blocks:
+        return _EMPTY_PAIRS, _EMPTY_WEIGHTS
+    return _reduce(np.concatenate(pair_blocks), np.concatenate(weight_blocks))
+
+
+def _order_chunks(orders, chunk_size: int):
+    """Yield ``(order_id, created_at)`` lists from ``orders`` in id order."""
+
+    cursor = 0
+    while True:
+        chunk = list(orders.filter(id__gt=cursor).order_by("id").values_list("id", "created_at")[:chunk_size])
+        if not chunk:
+            return
+        cursor = chunk[-1][0]
+        yield chunk
+
+
+def build_product_associations(
+    *,
+    chunk_size: int = 1000,
+    half_life_days: float | None = None,
+    min_weight: float = 0.01,
+    full: bool = False,
+) -> dict:
+    """Fold orders placed since the last run into :class:`ProductAssociation`."""
+
+    started = time.monotonic()
+    now = timezone.now()
+    half_life_seconds = half_life_days * 86400 if half_life_days else None
+    watermark, _ = JobWatermark.objects.get_or_create(name=ASSOCIATION_JOB)
+    if full:
+        watermark.last_id, watermark.last_run_at = 0, None
+
+    # Orders younger than the payment window may still be paid or cancelled,
+    # and so may older pending orders whose deadline has not passed yet. The
+    # watermark stops just before the first of those. Pending orders past
+    # their deadline are abandoned checkouts (cancelled lazily) and do not
+    # hold it back; if one is paid late it is re-scanned below by ``paid_at``.
+    settled_before = now - timedelta(hours=Order.PAYMENT_TIMEOUT_HOURS)
+    candidates = Order.objects.filter(id__gt=watermark.last_id, created_at__lte=settled_before)
+    first_unsettled = (
+        Order.objects.filter(id__gt=watermark.last_id, status="pending")
+        .filter(Q(payment_deadline__gt=now) | Q(payment_deadline__isnull=True, created_at__gt=settled_before))
+        .aggregate(first=Min("id"))
+    )
+    if first_unsettled["first"] is not None:
+        candidates = candidates.filter(id__lt=first_unsettled["first"])
+    upper_id = candidates.aggregate(top=Max("id"))["top"] or watermark.last_id
+
+    # Orders paid after ``now`` are left for the next run's re-scan.
+    paid = Order.objects.filter(status__in=Order.PAID_STATUSES).filter(Q(paid_at__isnull=True) | Q(paid_at__lte=now))
+    scans = [paid.filter(id__gt=watermark.last_id, id__lte=upper_id)]
+    if watermark.last_run_at:
+        scans.append(paid.filter(id__lte=watermark.last_id, paid_at__gt=watermark.last_run_at))
+
+    pairs, weights = _EMPTY_PAIRS, _EMPTY_WEIGHTS
+    orders_seen = 0
+    for scan in scans:
+        for chunk in _order_chunks(scan, chunk_size):
+            orders_seen += len(chunk)
+            ages = [(now - created_at).total_seconds() for _, created_at in chunk]
+            order_weights = dict(zip((order_id for order_id, _ in chunk), _decay(ages, half_life_seconds).tolist()))
+            items = list(
+                OrderItem.objects.filter(order_id__in=order_weights, product__isnull=False)
+                .order_by("order_id")
+                .values_list("order_id", "product_id")
+            )
+            chunk_pairs, chunk_weights = _chunk_pairs(order_weights, items)
+            pairs, weights = _reduce(np.concatenate((pairs, chunk_pairs)), np.concatenate((weights, chunk_weights)))
+
+    with transaction.atomic():
+        if full:
+            ProductAssociation.objects.all().delete()
+        elif half_life_seconds and watermark.last_run_at:
+            factor = float(_decay((now - watermark.last_run_at).total_seconds(), half_life_seconds))
+            ProductAssociation.objects.update(weight=F("weight") * factor)
+
+        _merge_pairs(pairs, weights)
+        pruned, _ = ProductAssociation.objects.filter(weight__lt=min_weight).delete()
+
+        watermark.last_id = upper_id
+        watermark.last_run_at = now
+        watermark.save(update_fields=["last_id", "last_run_at"])
+
+    return {
+        "orders": orders_seen,
+        "pairs": len(pairs),
+        "pruned": pruned,
+        "elapsed": time.monotonic() - started,
+    }
+
+
+def _merge_pairs(pairs: np.ndarray, weights: np.ndarray) -> None:
+    if not len(pairs):
+        return
+
+    existing_products = set(Product.objects.filter(pk__in=np.unique(pairs).tolist()).values_list("pk", flat=True))
+    existing = {
+        (product_id, associated_id): weight
+        for product_id, associated_id, weight in ProductAssociation.objects.filter(
+            product_id__in=np.unique(pairs[:, 0]).tolist()
+        ).values_list("product_id", "associated_id", "weight")
+    }
+    associations = [
+        ProductAssociation(
+            product_id=product_id,
+            associated_id=associated_id,
+            weight=existing.get((product_id, associated_id), 0.0) + weight,
+        )
+        for (product_id, associated_id), weight in zip(pairs.tolist(), weights.tolist())
+        if product_id in existing_products and associated_id in existing_products
+    ]
+    ProductAssociation.objects.bulk_create(
+        associations,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["product", "associated"],
+        update_fields=["weight"],
+    )
+
+
+def get_frequently_bought_together(product_ids: Iterable[int], limit: int = 4):
+    """Return products most often bought with ``product_ids`` in one query."""
+
+    product_ids = list(product_ids)
+    if not product_ids:
+        return []
+    return list(
+        Product.objects.filter(available=True, bought_with__product_id__in=product_ids)
+        .exclude(pk__in=product_ids)
+        .annotate(association_weight=Sum("bought_with__weight"))
+        .order_by("-association_weight", "pk")[:limit]
+    )
@@ -0,0 +1,255 @@
+"""Checkout quote: the priced summary shared by every checkout step.
+
+Subtotal, shipping cost, discount and total are computed once by
+:func:`refresh_checkout_quote` whenever one of their inputs changes and kept
+in the session under ``checkout_quote``. A :class:`CheckoutQuote` records
+what it was computed from: the cart's ``version`` (bumped on every cart item
+write), the catalog price version, the address, courier, shipping cost and
+coupon code. It also records when it stops being valid (the next flash sale
+start or end of a quoted product, the hold behind a quoted flash price, the
+coupon's expiry, or ``CHECKOUT_QUOTE_TTL``).
+
+:func:`get_checkout_quote` compares those with a few integers and strings and
+returns the stored quote, so the review page and the gateway payload builders
+no longer reload cart prices and the discount row on every request. Only a
+stale quote is recomputed.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.utils import timezone
+
+from catalog.discounts import DiscountError, evaluate_discount, get_discount_code
+from catalog.flash_sales import flash_sale_unit_price, held_flash_sale_units
+from catalog.models import DiscountCode
+from catalog.promotions import get_price_version
+from core.models import CartItem
+from core.services.session_state import get_checkout, get_session_discount_code, set_session_discount_code
+
+QUOTE_SESSION_KEY = "checkout_quote"
+# Bump when the stored layout changes; older quotes are then recomputed.
+QUOTE_FORMAT = 1
+
+
+def _to_decimal(value) -> Decimal:
+    try:
+        return Decimal(value or 0)
+    except (InvalidOperation, TypeError, ValueError):
+        return Decimal("0")
+
+
+@dataclass(frozen=True)
+class QuoteLine:
+    item_id: int
+    product_id: int
+    quantity: int
+    unit_price: Decimal
+
+
+@dataclass(frozen=True)
+class CheckoutQuote:
+    cart_id: int
+    cart_version: int
+    price_version: int
+    address_id: int | None
+    shipping_method: str
+    shipping_cost: Decimal
+    eta: str
+    discount_code: str
+    discount_type: str
+    discount_type_label: str
+    lines: tuple[QuoteLine, ...]
+    subtotal: Decimal
+    discount_amount: Decimal
+    total: Decimal
+    expires_at: datetime
+
+    @property
+    def unit_prices(self) -> dict[int, Decimal]:
+        """Return ``{cart_item_id: unit_price}`` as quoted."""
+        return {line.item_id: line.unit_price for line in self.lines}
+
+    @property
+    def total_before_discount(self) -> Decimal:
+        return self.subtotal + self.shipping_cost
+
+    def is_current(self, cart, checkout_data: dict, discount_code: str, now: datetime | None = None) -> bool:
+        """Return whether this quote still matches the cart, prices and session."""
+
+        return (
+            self.cart_id == cart.pk
+            and self.cart_version == cart.version
+            and (now or timezone.now()) < self.expires_at
+            and self.address_id == checkout_data.get("address_id")
+            and self.shipping_method == str(checkout_data.get("shipping_method") or "").upper()
+            and self.shipping_cost == _to_decimal(checkout_data.get("shipping_cost"))
+            and self.discount_code == DiscountCode.normalize_code(discount_code)
+            and self.price_version == get_price_version()
+        )
+
+    def to_session(self) -> list:
+        """Return a compact JSON-serialisable form (a positional list)."""
+
+        return [
+            QUOTE_FORMAT,
+            self.cart_id,
+            self.cart_version,
+            self.price_version,
+            self.address_id,
+            self.shipping_method,
+            str(self.shipping_cost),
+            self.eta,
+            self.discount_code,
+            self.discount_type,
+            self.discount_type_label,
+            [[line.item_id, line.product_id, line.quantity, str(line.unit_price)] for line in self.lines],
+            str(self.subtotal),
+            str(self.discount_amount),
+            str(self.total),
+            int(self.expires_at.timestamp()),
+        ]
+
+    @classmethod
+    def from_session(cls, data) -> CheckoutQuote | None:
+        if not isinstance(data, list) or not data or data[0] != QUOTE_FORMAT:
+            return None
+        try:
+            (
+                _,
+                cart_id,
+                cart_version,
+                price_version,
+                address_id,
+                shipping_method,
+                shipping_cost,
+                eta,
+                discount_code,
+                discount_type,
+                discount_type_label,
+                lines,
+                subtotal,
+                discount_amount,
+                total,
+                expires_at,
+            ) = data
+            return cls(
+                cart_id=cart_id,
+                cart_version=cart_version,
+                price_version=price_version,
+                address_id=address_id,
+                shipping_method=shipping_method,
+                shipping_cost=Decimal(shipping_cost),
+                eta=eta,
+                discount_code=discount_code,
+                discount_type=discount_type,
+                discount_type_label=discount_type_label,
+                lines=tuple(
+                    QuoteLine(item_id, product_id, quantity, Decimal(price))
+                    for item_id, product_id, quantity, price in lines
+                ),
+                subtotal=Decimal(subtotal),
+                discount_amount=Decimal(discount_amount),
+                total=Decimal(total),
+                expires_at=datetime.fromtimestamp(expires_at, tz=dt_timezone.utc),
+            )
+        except (TypeError, ValueError, InvalidOperation):
+            return None
+
+
+def _price_changes_at(product, now: datetime) -> datetime | None:
+    """Return when ``product``'s display price next changes by the clock alone."""
+
+    flash_sale = product.active_flash_sale
+    if flash_sale is not None:
+        return flash_sale.end
+    if product.is_flash_sale and product.flash_sale_start and product.flash_sale_start > now:
+        return product.flash_sale_start
+    return None
+
+
+def build_checkout_quote(cart, checkout_data: dict, discount_code: str = "", user=None) -> CheckoutQuote:
+    """Price the cart's selected items for the current checkout choices."""
+
+    now = timezone.now()
+    cart_version = cart.version
+    price_version = get_price_version()
+    expires_at = now + timedelta(seconds=getattr(settings, "CHECKOUT_QUOTE_TTL", 300))
+
+    lines = []
+    items = list(CartItem.objects.filter(cart_id=cart.pk, is_selected=True).select_related("product").order_by("pk"))
+    held = held_flash_sale_units(cart.user_id, [item.product for item in items], now)
+    for item in items:
+        hold = held.get(item.product_id)
+        unit_price = flash_sale_unit_price(item.product, item.quantity, hold.units if hold else 0)
+        lines.append(QuoteLine(item.pk, item.product_id, item.quantity, unit_price))
+        changes_at = _price_changes_at(item.product, now)
+        if hold is not None and unit_price == item.product.get_display_price():
+            changes_at = min(filter(None, (changes_at, hold.expires_at)))
+        if changes_at is not None:
+            expires_at = min(expires_at, changes_at)
+
+    subtotal = sum((line.unit_price * line.quantity for line in lines), Decimal("0"))
+    shipping_method = str(checkout_data.get("shipping_method") or "").upper()
+    shipping_cost = _to_decimal(checkout_data.get("shipping_cost"))
+
+    discount = get_discount_code(discount_code)
+    discount_amount = Decimal("0")
+    if discount is not None:
+        try:
+            discount_amount = evaluate_discount(discount, subtotal, shipping_cost, shipping_method, user)
+        except DiscountError:
+            discount = None
+        else:
+            if discount.valid_to is not None:
+                expires_at = min(expires_at, discount.valid_to)
+
+    return CheckoutQuote(
+        cart_id=cart.pk,
+        cart_version=cart_version,
+        price_version=price_version,
+        address_id=checkout_data.get("address_id"),
+        shipping_method=shipping_method,
+        shipping_cost=shipping_cost,
+        eta=checkout_data.get("eta") or "",
+        discount_code=discount.code if discount else "",
+        discount_type=discount.discount_type if discount else "",
+        discount_type_label=discount.get_type_label() if discount else "",
+        lines=tuple(lines),
+        subtotal=subtotal,
+        discount_amount=discount_amount,
+        total=max(Decimal("0"), subtotal + shipping_cost - discount_amount),
+        # Stored with one-second resolution.
+        expires_at=expires_at.replace(microsecond=0),
+    )
+
+
+def refresh_checkout_quote(request, cart) -> CheckoutQuote:
+    """Recompute the quote, store it and keep the session's coupon in sync."""
+
+    quote = build_checkout_quote(cart, get_checkout(request), get_session_discount_code(request), request.user)
+
+    # Clears the coupon once it no longer applies to this checkout.
+    set_session_discount_code(request, quote.discount_code)
+    request.session[QUOTE_SESSION_KEY] = quote.to_session()
+    request.session.modified = True
+    return quote
+
+
+def get_checkout_quote(request, cart) -> CheckoutQuote:
+    """Return the stored quote, recomputing it only if any input changed."""
+
+    quote = CheckoutQuote.from_session(request.session.get(QUOTE_SESSION_KEY))
+    if quote is not None:
+        if quote.is_current(cart, get_checkout(request), get_session_discount_code(request)):
+            return quote
+    return refresh_checkout_quote(request, cart)
+
+
+def clear_checkout_quote(request) -> None:
+    request.session.pop(QUOTE_SESSION_KEY, None)
+    request.session.modified = True
@@ -0,0 +1,87 @@
+"""KPI snapshot shown on the admin index page.
+
+Revenue, order and district figures come from the daily sales rollups; the
+live queries (open orders by status, pending-payment backlog, low stock) only
+touch indexed ``status`` ranges and the product table. The snapshot is cached
+for ``ADMIN_DASHBOARD_CACHE_TTL`` seconds.
+
+``manage.py refresh_admin_dashboard`` re-primes it so staff page loads are
+cache reads, which needs a cache shared by every process (``CACHE_URL``).
+With the per-process ``LocMemCache`` the command would only prime its own
+memory, so it skips that step and each web worker rebuilds the snapshot on
+its first request after the TTL.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Min, Q, Sum
+from django.utils import timezone
+
+from catalog.models import Product
+from core.models import DailyDistrictSales, JobWatermark, Order
+from core.services.rollups import ROLLUP_JOB, get_sales_totals
+
+DASHBOARD_CACHE_KEY = "admin:dashboard:kpis"
+OPEN_STATUSES = ("pending", "paid", "processing", "shipped")
+# Backends whose entries live only in the process that wrote them.
+LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def cache_is_shared() -> bool:
+    """Whether a snapshot cached by one process is visible to the others."""
+
+    return settings.CACHES["default"]["BACKEND"] not in LOCAL_CACHE_BACKENDS
+
+
+def build_dashboard_kpis() -> dict:
+    now = timezone.now()
+    today = timezone.localdate()
+    week_start = today - timedelta(days=today.weekday())
+    labels = dict(Order.STATUS_CHOICES)
+
+    open_counts = dict(
+        Order.objects.filter(status__in=OPEN_STATUSES).values_list("status").annotate(total=Count("id")).order_by()
+    )
+    backlog = Order.objects.filter(status="pending").aggregate(
+        count=Count("id"),
+        amount=Sum("total"),
+        overdue=Count("id", filter=Q(payment_deadline__lt=now)),
+        oldest=Min("created_at"),
+    )
+    low_stock = list(
+        Product.objects.filter(available=True, stock__lte=getattr(settings, "LOW_STOCK_THRESHOLD", 5))
+        .order_by("stock", "name")
+        .values("id", "name", "stock")[:10]
+    )
+    top_districts = list(
+        DailyDistrictSales.objects.filter(date__gte=week_start)
+        .values("district__name")
+        .annotate(orders=Sum("orders"), revenue=Sum("revenue"))
+        .order_by("-revenue")[:5]
+    )
+
+    return {
+        "today": get_sales_totals(since=today),
+        "week": get_sales_totals(since=week_start),
+        "open_orders": [(labels[status], open_counts.get(status, 0)) for status in OPEN_STATUSES],
+        "backlog": {**backlog, "amount": backlog["amount"] or 0},
+        "low_stock": low_stock,
+        "top_districts": top_districts,
+        "rollups_updated_at": JobWatermark.objects.filter(name=ROLLUP_JOB).values_list("last_run_at", flat=True).first(),
+        "generated_at": now,
+    }
+
+
+def get_dashboard_kpis(*, refresh: bool = False) -> dict:
+    kpis = None if refresh else cache.get(DASHBOARD_CACHE_KEY)
+    if kpis is None:
+        kpis = build_dashboard_kpis()
+        cache.set(DASHBOARD_CACHE_KEY, kpis, getattr(settings, "ADMIN_DASHBOARD_CACHE_TTL", 60))
+    return kpis
@@ -0,0 +1,183 @@
+"""Idempotency keys for the endpoints that place orders.
+
+The checkout page sends an ``Idempotency-Key`` header (or an
+``idempotency_key`` form field) that stays the same across double clicks and
+retried fetches. :func:`idempotent` claims the key by committing an
+:class:`~core.models.IdempotencyKey` row with no response in its own short
+transaction, runs the view outside it, and then stores the response on the
+row. Payment gateway calls made by the view therefore do not hold a database
+write lock.
+
+- A repeat of a finished request hits the unique constraint and gets the
+  stored response back, so the view, and ``create_order_from_checkout``,
+  does not run again.
+- A key reused with a different request body is rejected with 422 instead
+  of replaying a response meant for another request; the key row stores a
+  fingerprint of the body it was first used with.
+- A concurrent duplicate polls the claimed row until the first request
+  stores its response, and then replays it. It gives up with 409 after
+  ``IDEMPOTENCY_WAIT_SECONDS``.
+- Failed requests release the key, so the client can retry with the same
+  key. Error statuses, exceptions and responses passed through
+  :func:`mark_failed` (error redirects) count as failures.
+- A claim left behind by a crashed worker expires after
+  ``IDEMPOTENCY_CLAIM_SECONDS``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from core.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_FIELD = "idempotency_key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+KEY_PATTERN = re.compile(r"[A-Za-z0-9_-]{8,64}")
+# Form fields that legitimately differ between retries of one request.
+_UNFINGERPRINTED_FIELDS = {"csrfmiddlewaretoken", IDEMPOTENCY_FIELD}
+
+
+POLL_INTERVAL = 0.1
+_FAILED_ATTRIBUTE = "idempotency_failed"
+
+
+def get_idempotency_key(request) -> str:
+    return (request.headers.get(IDEMPOTENCY_HEADER) or request.POST.get(IDEMPOTENCY_FIELD) or "").strip()
+
+
+def request_fingerprint(request) -> str:
+    """Return a digest of the request body, ignoring field order and CSRF tokens."""
+
+    if request.content_type in ("application/x-www-form-urlencoded", "multipart/form-data"):
+        fields = sorted(
+            (name, sorted(values)) for name, values in request.POST.lists() if name not in _UNFINGERPRINTED_FIELDS
+        )
+        canonical = json.dumps(fields, separators=(",", ":")).encode("utf-8")
+    else:
+        canonical = request.body
+        try:
+            canonical = json.dumps(json.loads(canonical), sort_keys=True, separators=(",", ":")).encode("utf-8")
+        except ValueError:
+            pass
+    return hashlib.sha256(canonical).hexdigest()
+
+
+def _snapshot(response) -> dict:
+    return {
+        "status": response.status_code,
+        "content_type": response.get("Content-Type", ""),
+        "location": response.get("Location", ""),
+        "body": response.content.decode(response.charset),
+    }
+
+
+def _replay(snapshot: dict) -> HttpResponse:
+    response = HttpResponse(
+        snapshot["body"], status=snapshot["status"], content_type=snapshot["content_type"] or None
+    )
+    if snapshot["location"]:
+        response["Location"] = snapshot["location"]
+    response[REPLAYED_HEADER] = "true"
+    return response
+
+
+def mark_failed(response):
+    """Flag ``response`` as a failure so :func:`idempotent` releases the key.
+
+    For error paths that do not use an error status, such as a redirect back
+    to the cart with an error message.
+    """
+
+    setattr(response, _FAILED_ATTRIBUTE, True)
+    return response
+
+
+def _failed(response) -> bool:
+    return response.status_code >= 400 or response.streaming or getattr(response, _FAILED_ATTRIBUTE, False)
+
+
+def purge_expired_idempotency_keys(now=None) -> int:
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
+
+
+def _claim(request, scope: str, key: str, fingerprint: str):
+    """Commit a response-less key row, or return ``None`` if the key is taken."""
+
+    now = timezone.now()
+    existing = IdempotencyKey.objects.filter(user=request.user, scope=scope, key=key)
+    claim_seconds = getattr(settings, "IDEMPOTENCY_CLAIM_SECONDS", 120)
+    try:
+        with transaction.atomic():
+            existing.filter(expires_at__lte=now).delete()
+            return IdempotencyKey.objects.create(
+                user=request.user,
+                scope=scope,
+                key=key,
+                fingerprint=fingerprint,
+                expires_at=now + timedelta(seconds=claim_seconds),
+            )
+    except IntegrityError:
+        return None
+
+
+def idempotent(scope: str):
+    """Make a view replay its first successful response for a repeated key.
+
+    Requests without a key run the view as before.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = get_idempotency_key(request)
+            if not key:
+                return view(request, *args, **kwargs)
+            if not KEY_PATTERN.fullmatch(key):
+                return JsonResponse({"message": "Kunci idempotensi tidak valid."}, status=400)
+
+            fingerprint = request_fingerprint(request)
+            existing = IdempotencyKey.objects.filter(user=request.user, scope=scope, key=key)
+            give_up_at = time.monotonic() + getattr(settings, "IDEMPOTENCY_WAIT_SECONDS", 10)
+            while (record := _claim(request, scope, key, fingerprint)) is None:
+                # ``held`` is None if the holder released the key meanwhile; the next claim takes it.
+                held = existing.first()
+                if held is not None and held.fingerprint and held.fingerprint != fingerprint:
+                    return JsonResponse(
+                        {"message": "Kunci idempotensi sudah dipakai untuk permintaan yang berbeda."}, status=422
+                    )
+                if held is not None and held.response is not None:
+                    return _replay(held.response)
+                if time.monotonic() >= give_up_at:
+                    return JsonResponse({"message": "Permintaan yang sama sedang diproses."}, status=409)
+                time.sleep(POLL_INTERVAL)
+
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                record.delete()
+                raise
+            if _failed(response):
+                record.delete()
+                return response
+
+            ttl = timedelta(minutes=getattr(settings, "IDEMPOTENCY_KEY_TTL_MINUTES", 60))
+            record.response = _snapshot(response)
+            record.expires_at = timezone.now() + ttl
+            record.save(update_fields=["response", "expires_at"])
+            return response
+
+        return wrapper
+
+    return decorator
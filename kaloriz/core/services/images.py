@@ -0,0 +1,130 @@
+"""Resized WebP/JPEG derivatives for uploaded images.
+
+Every upload gets fixed-width ``thumb``/``card``/``detail`` renditions in both
+WebP and JPEG plus a tiny blurred placeholder, stored under
+``derivatives/<original path>/``. Re-encoding drops EXIF metadata (GPS
+coordinates from phone photos included), and the original is rewritten without
+it as well. Paths are derived from the original name, so templates can build
+``srcset`` values without extra queries.
+"""
+
+from __future__ import annotations
+
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Iterable
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageFilter, ImageOps, UnidentifiedImageError
+
+DERIVATIVE_ROOT = "derivatives"
+
+# Rendition name -> target width in pixels.
+IMAGE_WIDTHS = {
+    "thumb": 160,
+    "card": 480,
+    "detail": 960,
+}
+IMAGE_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+PLACEHOLDER_WIDTH = 24
+
+
+def derivative_name(original_name: str, rendition: str, extension: str) -> str:
+    stem, _ = posixpath.splitext(original_name)
+    return posixpath.join(DERIVATIVE_ROOT, stem, f"{rendition}.{extension}")
+
+
+def placeholder_name(original_name: str) -> str:
+    return derivative_name(original_name, "placeholder", "jpg")
+
+
+def has_image_derivatives(original_name: str, storage=default_storage) -> bool:
+    return bool(original_name) and storage.exists(placeholder_name(original_name))
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    """Return an RGB copy, compositing transparency onto white for JPEG."""
+
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _encode(image: Image.Image, image_format: str, options: dict) -> ContentFile:
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def _replace(storage, name: str, content: ContentFile) -> None:
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, content)
+
+
+def _strip_original_exif(original_name: str, image: Image.Image, image_format: str, storage) -> None:
+    options = {"quality": 90} if image_format in ("JPEG", "WEBP") else {}
+    source = image if image_format == "PNG" else _flatten(image)
+    _replace(storage, original_name, _encode(source, image_format, options))
+
+
+def generate_image_derivatives(original_name: str, *, storage=default_storage, force: bool = False) -> bool:
+    """Create all renditions for ``original_name``; return ``False`` if skipped."""
+
+    if not original_name or not storage.exists(original_name):
+        return False
+    if not force and has_image_derivatives(original_name, storage):
+        return False
+
+    try:
+        with storage.open(original_name, "rb") as handle:
+            source = Image.open(handle)
+            source.load()
+    except (UnidentifiedImageError, OSError):
+        return False
+
+    oriented = ImageOps.exif_transpose(source)
+    if source.getexif() and source.format in ("JPEG", "PNG", "WEBP"):
+        _strip_original_exif(original_name, oriented, source.format, storage)
+
+    rgb = _flatten(oriented)
+    for rendition, width in IMAGE_WIDTHS.items():
+        target_width = min(width, rgb.width)
+        target_height = max(1, round(rgb.height * target_width / rgb.width))
+        resized = rgb.resize((target_width, target_height), Image.Resampling.LANCZOS)
+        for extension, (encoder, options) in IMAGE_FORMATS.items():
+            _replace(storage, derivative_name(original_name, rendition, extension), _encode(resized, encoder, options))
+
+    placeholder_height = max(1, round(rgb.height * PLACEHOLDER_WIDTH / rgb.width))
+    placeholder = rgb.resize((PLACEHOLDER_WIDTH, placeholder_height), Image.Resampling.BILINEAR)
+    placeholder = placeholder.filter(ImageFilter.GaussianBlur(2))
+    _replace(storage, placeholder_name(original_name), _encode(placeholder, "JPEG", {"quality": 40}))
+    return True
+
+
+def _generate_in_worker(original_name: str, force: bool) -> tuple[str, bool]:
+    return original_name, generate_image_derivatives(original_name, force=force)
+
+
+def backfill_image_derivatives(names: Iterable[str], *, workers: int | None = None, force: bool = False):
+    """Generate derivatives for many originals in a process pool.
+
+    Yields ``(name, generated)`` pairs as workers finish.
+    """
+
+    unique_names = sorted({name for name in names if name})
+    if workers == 1:
+        for name in unique_names:
+            yield name, generate_image_derivatives(name, force=force)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_generate_in_worker, unique_names, [force] * len(unique_names), chunksize=4)
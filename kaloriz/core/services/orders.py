@@ -6,13 +6,25 @@ from decimal import Decimal
 from typing import Iterable, Mapping
 
 from django.db import transaction
-from django.db.models import F
+from django.db.models import F, Sum
 from django.utils import timezone
 from datetime import timedelta
 
-from core.models import Order, OrderItem
+from catalog.discounts import redeem_discount, release_discount_redemptions
+from catalog.flash_sales import (
+    FlashSaleHoldExpired,
+    attach_flash_sale_claims,
+    flash_sale_unit_price,
+    release_order_flash_sale_claims,
+)
+from catalog.models import Product
+from core.models import Notification, Order, OrderItem
 from shipping.models import Shipment
 
+TRANSITION_APPLIED = "applied"
+TRANSITION_CONFLICT = "conflict"
+TRANSITION_INVALID = "invalid"
+
 
 def create_order_from_checkout(
     *,
@@ -38,8 +50,17 @@ def create_order_from_checkout(
     shipping_service_name: str = "",
     payment_method_slug: str | None = None,
     payment_method_display: str = "",
+    discount=None,
+    discount_amount: Decimal = Decimal("0"),
+    unit_prices: Mapping[int, Decimal] | None = None,
 ) -> Order:
-    """Create an order snapshot from the current checkout selection."""
+    """Create an order snapshot from the current checkout selection.
+
+    ``unit_prices`` maps cart item ids to the prices the checkout quote showed;
+    items missing from it are priced now. Raises :class:`FlashSaleHoldExpired`
+    (rolling the order back) if a quoted flash price is no longer covered by
+    the user's held units.
+    """
 
     courier_service = (courier_service or "").upper()
 
@@ -80,6 +101,9 @@ def create_order_from_checkout(
         eta=eta or "",
     )
 
+    # Held flash sale units are now sold with this order and no longer expire.
+    held = attach_flash_sale_claims(order, user, [item.product_id for item in selected_items])
+
     for item in selected_items:
         quantity = int(selected_quantities.get(item.pk, getattr(item, "quantity", 0)) or 0)
         if quantity <= 0:
@@ -89,7 +113,15 @@ def create_order_from_checkout(
         if product is None:
             continue
 
-        unit_price = product.get_display_price()
+        current_price = flash_sale_unit_price(product, quantity, held.get(product.pk, 0))
+        unit_price = (unit_prices or {}).get(item.pk)
+        if unit_price is None:
+            unit_price = current_price
+        elif unit_price < current_price and current_price != product.get_display_price():
+            # The quote had the flash price, but the hold behind it has lapsed.
+            raise FlashSaleHoldExpired(
+                f"Waktu tahan harga flash sale {product.name} sudah habis. Silakan periksa kembali keranjang Anda."
+            )
 
         OrderItem.objects.create(
             order=order,
@@ -103,6 +135,10 @@ def create_order_from_checkout(
         product.stock = F("stock") - quantity
         product.save(update_fields=["stock"])
 
+    if discount is not None:
+        # Raises DiscountError (rolling the order back) if the code's cap was hit meanwhile.
+        redeem_discount(discount, user=user, order=order, amount=discount_amount)
+
     cart.items.filter(is_selected=True).delete()
 
     return order
@@ -119,6 +155,64 @@ def restore_order_stock(order: Order) -> None:
 
         product.stock = F("stock") + item.quantity
         product.save(update_fields=["stock"])
+    release_order_flash_sale_claims([order.pk])
+    release_discount_redemptions([order.pk])
+
+
+def restore_stock_for_orders(order_ids: Iterable[int]) -> None:
+    """Return reserved stock for many cancelled orders with one update per product."""
+
+    order_ids = list(order_ids)
+    quantities = (
+        OrderItem.objects.filter(order_id__in=order_ids, product__isnull=False)
+        .values("product_id")
+        .annotate(total_quantity=Sum("quantity"))
+    )
+    for row in quantities:
+        Product.objects.filter(pk=row["product_id"]).update(stock=F("stock") + row["total_quantity"])
+    release_order_flash_sale_claims(order_ids)
+    release_discount_redemptions(order_ids)
+
+
+def compare_and_set_order_status(order: Order, status: str, **fields) -> str:
+    """Move ``order`` to ``status`` if nobody changed it since it was loaded.
+
+    Issues a single ``UPDATE ... WHERE status=? AND version=?``; a writer that
+    lost the race gets ``TRANSITION_CONFLICT`` instead of waiting on a lock.
+    ``fields`` are written in the same statement. The instance is updated in
+    place on success.
+    """
+
+    if not order.can_transition_to(status):
+        return TRANSITION_INVALID
+
+    now = timezone.now()
+    if status == "paid":
+        fields.setdefault("paid_at", now)
+    updated = Order.objects.filter(pk=order.pk, status=order.status, version=order.version).update(
+        status=status,
+        version=F("version") + 1,
+        updated_at=now,
+        **fields,
+    )
+    if not updated:
+        return TRANSITION_CONFLICT
+
+    order.status = status
+    order.version += 1
+    order.updated_at = now
+    for name, value in fields.items():
+        setattr(order, name, value)
+    return TRANSITION_APPLIED
+
+
+def transition_order_status(order: Order, status: str, **fields) -> str:
+    """Apply a status transition and notify the customer when it succeeds."""
+
+    outcome = compare_and_set_order_status(order, status, **fields)
+    if outcome == TRANSITION_APPLIED:
+        Notification.for_order_status(order).save()
+    return outcome
 
 
 def cancel_order_due_to_timeout(order: Order) -> bool:
@@ -132,14 +226,16 @@ def cancel_order_due_to_timeout(order: Order) -> bool:
         return False
 
     with transaction.atomic():
+        # A payment that landed after the order was loaded wins; stock is only
+        # returned by the writer that actually cancelled the order.
+        outcome = transition_order_status(
+            order,
+            "cancelled",
+            payment_deadline=order.payment_deadline or deadline,
+            midtrans_token="",
+        )
+        if outcome != TRANSITION_APPLIED:
+            return False
         restore_order_stock(order)
-        order.status = "cancelled"
-        if order.payment_deadline is None:
-            order.payment_deadline = deadline
-        update_fields = ["status", "payment_deadline"]
-        if order.midtrans_token:
-            order.midtrans_token = ""
-            update_fields.append("midtrans_token")
-        order.save(update_fields=update_fields)
 
     return True
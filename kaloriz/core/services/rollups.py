@@ -0,0 +1,145 @@
+"""Daily sales rollups per store, product, category and district.
+
+``manage.py refresh_sales_rollups`` looks up orders whose ``updated_at`` moved
+since the previous run (tracked in a :class:`JobWatermark`) and recomputes the
+rollup rows of every day those orders were placed on. A day is always rebuilt
+as a whole from ``OrderItem``, so reprocessing is idempotent and status
+changes (paid → cancelled) never need to be reversed by hand. Deleted orders
+leave no ``updated_at`` trail; ``--full`` rebuilds everything.
+
+Storefront and admin code reads the rollup tables through the helpers below
+instead of aggregating ``Order``/``OrderItem`` per request.
+"""
+
+from __future__ import annotations
+
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from catalog.models import Product
+from core.models import (
+    DailyCategorySales,
+    DailyDistrictSales,
+    DailyProductSales,
+    DailySalesSummary,
+    JobWatermark,
+    Order,
+    OrderItem,
+)
+
+ROLLUP_JOB = "sales_rollups"
+# Transactions can commit a little after the ``updated_at`` they wrote; the
+# overlap re-reads that window so such orders are not skipped.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+DAYS_PER_BATCH = 31
+
+# (model, OrderItem lookup for the dimension, rollup field)
+ROLLUPS = (
+    (DailySalesSummary, None, None),
+    (DailyProductSales, "product", "product_id"),
+    (DailyCategorySales, "product__category", "category_id"),
+    (DailyDistrictSales, "order__shipping_address__district", "district_id"),
+)
+
+
+def _rollup_rows(model, lookup: str | None, field: str | None, days: list) -> list:
+    paid = Q(order__status__in=Order.PAID_STATUSES)
+    queryset = OrderItem.objects.filter(order__created_at__date__in=days).annotate(
+        day=TruncDate("order__created_at")
+    )
+    keys = ["day"]
+    if lookup:
+        queryset = queryset.filter(**{f"{lookup}__isnull": False})
+        keys.append(lookup)
+
+    rows = queryset.values(*keys).order_by().annotate(
+        orders=Count("order", filter=paid, distinct=True),
+        units=Sum("quantity", filter=paid),
+        revenue=Sum("subtotal", filter=paid),
+        cancelled_orders=Count("order", filter=Q(order__status="cancelled"), distinct=True),
+    )
+    entries = []
+    for row in rows:
+        if not row["orders"] and not row["cancelled_orders"]:
+            continue
+        values = {
+            "date": row["day"],
+            "orders": row["orders"],
+            "units": row["units"] or 0,
+            "revenue": row["revenue"] or 0,
+            "cancelled_orders": row["cancelled_orders"],
+        }
+        if lookup:
+            values[field] = row[lookup]
+        entries.append(model(**values))
+    return entries
+
+
+def refresh_sales_rollups(*, full: bool = False, days_per_batch: int = DAYS_PER_BATCH) -> dict:
+    """Recompute rollups for days touched since the last run."""
+
+    started = time.monotonic()
+    now = timezone.now()
+    watermark, _ = JobWatermark.objects.get_or_create(name=ROLLUP_JOB)
+
+    orders = Order.objects.all()
+    if not full and watermark.last_run_at:
+        orders = orders.filter(updated_at__gte=watermark.last_run_at - WATERMARK_OVERLAP)
+    days = list(
+        orders.annotate(day=TruncDate("created_at")).order_by("day").values_list("day", flat=True).distinct()
+    )
+
+    if full:
+        with transaction.atomic():
+            for model, _, _ in ROLLUPS:
+                model.objects.all().delete()
+
+    written = 0
+    for offset in range(0, len(days), days_per_batch):
+        batch = days[offset:offset + days_per_batch]
+        with transaction.atomic():
+            for model, lookup, field in ROLLUPS:
+                model.objects.filter(date__in=batch).delete()
+                entries = _rollup_rows(model, lookup, field, batch)
+                model.objects.bulk_create(entries, batch_size=500)
+                written += len(entries)
+
+    watermark.last_run_at = now
+    watermark.save(update_fields=["last_run_at"])
+    return {"days": len(days), "rows": written, "elapsed": time.monotonic() - started}
+
+
+def get_successful_orders_count() -> int:
+    return DailySalesSummary.objects.aggregate(total=Sum("orders"))["total"] or 0
+
+
+def get_sales_totals(since=None) -> dict:
+    """Return summed ``orders``/``units``/``revenue``/``cancelled_orders``."""
+
+    rows = DailySalesSummary.objects.all()
+    if since is not None:
+        rows = rows.filter(date__gte=since)
+    totals = rows.aggregate(
+        orders=Sum("orders"), units=Sum("units"), revenue=Sum("revenue"), cancelled_orders=Sum("cancelled_orders")
+    )
+    return {key: value or 0 for key, value in totals.items()}
+
+
+def annotate_units_sold(products, days: int = 30):
+    """Annotate ``units_sold`` over the last ``days`` days from the rollups."""
+
+    since = timezone.localdate() - timedelta(days=days)
+    return products.annotate(units_sold=Sum("daily_sales__units", filter=Q(daily_sales__date__gte=since)))
+
+
+def get_best_selling_products(days: int = 30, limit: int = 8):
+    return list(
+        annotate_units_sold(Product.objects.filter(available=True), days=days)
+        .filter(units_sold__gt=0)
+        .order_by("-units_sold", "pk")[:limit]
+    )
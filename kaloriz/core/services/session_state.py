@@ -0,0 +1,165 @@
+"""What may be stored in a session, and how.
+
+Every request with a session reads its row (or cache entry) and every change
+rewrites the whole blob, so the session only holds small, known values:
+
+- :data:`SESSION_SCHEMA` lists the keys the app may set, each with a size
+  limit in bytes of compact JSON. :class:`core.sessions.SessionStore` drops
+  unknown or oversized keys before saving and logs a warning. Keys that
+  start with an underscore belong to Django (auth, messages, password reset)
+  and are left alone.
+- Checkout state is a positional list rather than a dict, the coupon is only
+  its code (amounts live in the checkout quote), and the chatbot keeps just
+  the order ids it offered. The getters still accept the older dict shapes,
+  so sessions created before the change keep working.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CHECKOUT_KEY = "checkout"
+DISCOUNT_KEY = "discount"
+CHATBOT_KEY = "chatbot_orders"
+MIDTRANS_RESULT_KEY = "midtrans_last_result"
+
+SESSION_SCHEMA = {
+    CHECKOUT_KEY: 256,
+    # ``core.services.checkout.QUOTE_SESSION_KEY``; about 40 bytes per cart line.
+    "checkout_quote": 4096,
+    DISCOUNT_KEY: 64,
+    CHATBOT_KEY: 64,
+    MIDTRANS_RESULT_KEY: 160,
+    "midtrans_order_id": 64,
+    "doku_order_id": 64,
+    "doku_last_order": 64,
+    "pending_verification_user_id": 16,
+    "verification_id": 16,
+}
+
+CHECKOUT_FORMAT = 1
+CHECKOUT_FIELDS = ("address_id", "shipping_method", "shipping_cost", "eta", "payment_method", "user_id")
+CHATBOT_MAX_ORDERS = 3
+DEFAULT_PURGE_BATCH_SIZE = 1000
+
+
+def encoded_size(value) -> int:
+    return len(json.dumps(value, separators=(",", ":"), default=str))
+
+
+def enforce_session_schema(data: dict) -> dict:
+    """Remove keys from ``data`` that are not in the schema or are too large."""
+
+    for key in list(data):
+        if key.startswith("_"):
+            continue
+        limit = SESSION_SCHEMA.get(key)
+        if limit is None:
+            logger.warning("Dropping unknown session key %r.", key)
+            del data[key]
+            continue
+        size = encoded_size(data[key])
+        if size > limit:
+            logger.warning("Dropping session key %r: %d bytes exceeds the %d byte limit.", key, size, limit)
+            del data[key]
+    return data
+
+
+def get_checkout(request) -> dict:
+    """Return the checkout selections as a dict holding only the fields set."""
+
+    data = request.session.get(CHECKOUT_KEY)
+    if isinstance(data, dict):
+        values = [data.get(field) for field in CHECKOUT_FIELDS]
+    elif isinstance(data, list) and data and data[0] == CHECKOUT_FORMAT:
+        values = data[1:]
+    else:
+        return {}
+    return {field: value for field, value in zip(CHECKOUT_FIELDS, values) if value is not None}
+
+
+def set_checkout(request, checkout_data: dict) -> None:
+    values = [checkout_data.get(field) for field in CHECKOUT_FIELDS]
+    while values and values[-1] is None:
+        values.pop()
+    if not values:
+        clear_checkout(request)
+        return
+    request.session[CHECKOUT_KEY] = [CHECKOUT_FORMAT, *values]
+    request.session.modified = True
+
+
+def clear_checkout(request) -> None:
+    request.session.pop(CHECKOUT_KEY, None)
+    request.session.modified = True
+
+
+def get_session_discount_code(request) -> str:
+    data = request.session.get(DISCOUNT_KEY)
+    if isinstance(data, dict):
+        data = data.get("code")
+    return data if isinstance(data, str) else ""
+
+
+def set_session_discount_code(request, code: str) -> None:
+    if not code:
+        clear_session_discount_code(request)
+        return
+    request.session[DISCOUNT_KEY] = code
+    request.session.modified = True
+
+
+def clear_session_discount_code(request) -> None:
+    request.session.pop(DISCOUNT_KEY, None)
+    request.session.modified = True
+
+
+def get_chatbot_orders(request) -> list[int]:
+    """Return the order ids the chatbot offered, or ``[]`` if it is not waiting for a choice."""
+
+    data = request.session.get(CHATBOT_KEY)
+    if not isinstance(data, list):
+        return []
+    return [order_id for order_id in data if isinstance(order_id, int)]
+
+
+def set_chatbot_orders(request, order_ids) -> None:
+    request.session[CHATBOT_KEY] = list(order_ids)[:CHATBOT_MAX_ORDERS]
+    request.session.modified = True
+
+
+def clear_chatbot_orders(request) -> None:
+    request.session.pop(CHATBOT_KEY, None)
+
+
+def set_midtrans_result(request, order_id: str, status: str) -> None:
+    """Keep the order id and status of the last Snap result, not the whole payload."""
+
+    request.session[MIDTRANS_RESULT_KEY] = [order_id or "", status or ""]
+    request.session.modified = True
+
+
+def purge_expired_sessions(batch_size: int = DEFAULT_PURGE_BATCH_SIZE, now=None) -> int:
+    """Delete expired sessions ``batch_size`` rows at a time; return how many were deleted.
+
+    Each batch is its own short ``DELETE``, so logins and checkouts writing
+    sessions are not held up behind one large delete.
+    """
+
+    batch_size = max(1, batch_size)
+    expired = Session.objects.filter(expire_date__lt=now or timezone.now())
+    deleted = 0
+    while True:
+        keys = list(expired.values_list("pk", flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        count, _ = Session.objects.filter(pk__in=keys).delete()
+        deleted += count
+        if len(keys) < batch_size:
+            return deleted
@@ -0,0 +1,130 @@
+"""Cache-backed rate limiting for login and email verification.
+
+Limits use a sliding-window counter. Each identity (client IP, account,
+email) has one counter per fixed window, raised with an atomic
+``cache.incr``. A hit is allowed while::
+
+    previous_window_count * (1 - elapsed_fraction) + current_window_count <= limit
+
+That smooths the burst a plain fixed window lets through at its edges. It
+needs no read-modify-write, so concurrent requests cannot lose counts, and
+nothing is written to the database.
+
+:func:`hit` counts an attempt; :func:`peek` only asks whether one more would
+pass; :func:`refund` takes a counted attempt back. Login counts every attempt
+per IP. Per account it counts the attempt up front, so a parallel burst cannot
+slip past the limit, and refunds it when the password is right, so signing in
+successfully never locks the owner out.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+
+CACHE_KEY = "throttle:{scope}:{identity}:{window}"
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    scope: str
+    setting: str
+    default: int
+    window: int
+
+    @property
+    def limit(self) -> int:
+        return getattr(settings, self.setting, self.default)
+
+
+LOGIN_PER_IP = RateLimit("login-ip", "LOGIN_RATE_LIMIT_PER_IP", 20, 300)
+LOGIN_PER_ACCOUNT = RateLimit("login", "LOGIN_RATE_LIMIT_PER_ACCOUNT", 5, 300)
+OTP_VERIFY_PER_USER = RateLimit("otp-verify", "OTP_VERIFY_RATE_LIMIT", 5, 600)
+OTP_RESEND_PER_USER = RateLimit("otp-resend", "OTP_RESEND_RATE_LIMIT", 3, 600)
+OTP_PER_IP = RateLimit("otp-ip", "OTP_RATE_LIMIT_PER_IP", 20, 600)
+
+
+def get_client_ip(request) -> str:
+    if getattr(settings, "USE_X_FORWARDED_FOR", False):
+        forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def _identity(value) -> str:
+    # Emails and IPv6 addresses are not safe memcached keys as they are.
+    return hashlib.sha256(str(value).strip().lower().encode()).hexdigest()[:32]
+
+
+def hit(rate: RateLimit, identity, now: float | None = None) -> int:
+    """Count one attempt; return seconds to wait if over the limit, else 0."""
+
+    if identity in (None, ""):
+        return 0
+    now = time.time() if now is None else now
+    window = int(now // rate.window)
+    key = CACHE_KEY.format(scope=rate.scope, identity=_identity(identity), window=window)
+
+    cache.add(key, 0, rate.window * 2)
+    try:
+        current = cache.incr(key)
+    except ValueError:
+        # Evicted between ``add`` and ``incr``.
+        cache.set(key, 1, rate.window * 2)
+        current = 1
+    previous = cache.get(CACHE_KEY.format(scope=rate.scope, identity=_identity(identity), window=window - 1), 0)
+    return _wait(rate, current, previous, now)
+
+
+def peek(rate: RateLimit, identity, now: float | None = None) -> int:
+    """Return seconds to wait before one more attempt would pass, without counting it."""
+
+    if identity in (None, ""):
+        return 0
+    now = time.time() if now is None else now
+    window = int(now // rate.window)
+    current, previous = (
+        cache.get(CACHE_KEY.format(scope=rate.scope, identity=_identity(identity), window=w), 0)
+        for w in (window, window - 1)
+    )
+    return _wait(rate, current + 1, previous, now)
+
+
+def refund(rate: RateLimit, identity, now: float) -> None:
+    """Take back one attempt :func:`hit` counted at ``now``."""
+
+    if identity in (None, ""):
+        return
+    key = CACHE_KEY.format(scope=rate.scope, identity=_identity(identity), window=int(now // rate.window))
+    try:
+        if cache.decr(key) < 0:
+            # Evicted and re-added since the hit.
+            cache.set(key, 0, rate.window * 2)
+    except ValueError:
+        pass
+
+
+def _wait(rate: RateLimit, current: int, previous: int, now: float) -> int:
+    elapsed = (now % rate.window) / rate.window
+    if previous * (1 - elapsed) + current <= rate.limit:
+        return 0
+    if current > rate.limit:
+        return max(1, math.ceil(rate.window - now % rate.window))
+    # Over only because of the previous window; wait until enough of it slides out.
+    needed = 1 - (rate.limit - current) / previous
+    return max(1, math.ceil((needed - elapsed) * rate.window))
+
+
+def check(*limits: tuple[RateLimit, object]) -> int:
+    """Count an attempt against every ``(rate, identity)`` pair.
+
+    Returns the longest wait in seconds, or 0 if all of them allow it.
+    """
+
+    return max((hit(rate, identity) for rate, identity in limits), default=0)
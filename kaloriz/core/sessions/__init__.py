@@ -0,0 +1,32 @@
+"""Session engines: Django's session stores plus the session schema.
+
+``core.sessions`` is the cache-backed database store. Reads are served from
+the cache and fall back to ``django_session``. It is only safe when every
+worker shares the cache (``CACHE_URL``), otherwise a worker can serve a
+session another worker has since changed. ``core.sessions.db`` reads and
+writes the database only and is used when no shared cache is configured.
+
+Both stores save only after
+:func:`~core.services.session_state.enforce_session_schema` has dropped
+anything that should not be in the session.
+"""
+
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBSessionStore
+
+from core.services.session_state import enforce_session_schema, purge_expired_sessions
+
+
+class SessionSchemaMixin:
+    def create_model_instance(self, data):
+        # ``data`` is the store's own session dict, so the cached copy saved
+        # afterwards is trimmed the same way as the database row.
+        return super().create_model_instance(enforce_session_schema(data))
+
+    @classmethod
+    def clear_expired(cls):
+        # ``manage.py clearsessions`` deletes in batches too.
+        purge_expired_sessions()
+
+
+class SessionStore(SessionSchemaMixin, CachedDBSessionStore):
+    pass
@@ -0,0 +1,9 @@
+"""Database-only session engine with the session schema (see :mod:`core.sessions`)."""
+
+from django.contrib.sessions.backends.db import SessionStore as DBSessionStore
+
+from core.sessions import SessionSchemaMixin
+
+
+class SessionStore(SessionSchemaMixin, DBSessionStore):
+    pass
@@ -1,13 +1,16 @@
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import post_delete, pre_save, post_save
 from django.dispatch import receiver
 
-from .models import Notification, Order
+from catalog.models import Product, Testimonial
+
+from .models import Cart, CartItem, Notification, Order, UserProfile
+from .services.images import generate_image_derivatives
 
 
 @receiver(pre_save, sender=Order)
-def store_previous_order_status(sender, instance, **kwargs):
+def store_previous_order_status(sender, instance, update_fields=None, **kwargs):
     """Store the previous order status before saving so we can detect changes."""
-    if not instance.pk:
+    if not instance.pk or (update_fields is not None and "status" not in update_fields):
         instance._previous_status = None
         return
 
@@ -27,8 +30,44 @@ def create_notification_on_status_change(sender, instance, created, **kwargs):
         return
 
     if previous_status and previous_status != instance.status:
-        Notification.objects.create(
-            user=instance.user,
-            title="Status Pesanan Diperbarui",
-            message=f"Status pesanan {instance.order_number} berubah menjadi {instance.get_status_display()}",
-        )
+        Notification.for_order_status(instance).save()
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def bump_cart_version(sender, instance, **kwargs):
+    """Invalidate the checkout quote stored for this cart."""
+    Cart.bump_version(instance.cart_id)
+
+
+# Image field per model whose uploads get resized renditions.
+IMAGE_DERIVATIVE_FIELDS = {Product: "image", Testimonial: "photo", UserProfile: "photo"}
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=Testimonial)
+@receiver(pre_save, sender=UserProfile)
+def note_new_image_upload(sender, instance, **kwargs):
+    field_file = getattr(instance, IMAGE_DERIVATIVE_FIELDS[sender])
+    # FileField.pre_save() stores new uploads after this signal, so they are still uncommitted here.
+    instance._image_uploaded = bool(field_file) and not field_file._committed
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Testimonial)
+@receiver(post_save, sender=UserProfile)
+def create_image_derivatives(sender, instance, created, update_fields=None, **kwargs):
+    """Build resized image renditions right after an upload.
+
+    Other saves (stock, price, profile edits) skip it, so they cost no storage
+    lookups and an unreadable image is not retried on every save.
+    """
+    field_name = IMAGE_DERIVATIVE_FIELDS[sender]
+    if update_fields is not None:
+        changed = field_name in update_fields
+    else:
+        changed = created or getattr(instance, "_image_uploaded", False)
+
+    field_file = getattr(instance, field_name)
+    if changed and field_file and field_file.name:
+        generate_image_derivatives(field_file.name)
@@ -0,0 +1,11 @@
+from django import template
+
+from core.services.dashboard import get_dashboard_kpis
+
+register = template.Library()
+
+
+@register.simple_tag
+def dashboard_kpis():
+    """Return the cached KPI snapshot for the admin index page."""
+    return get_dashboard_kpis()
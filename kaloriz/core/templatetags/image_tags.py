@@ -0,0 +1,60 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from core.media import image_rendition_urls
+from core.services.images import IMAGE_WIDTHS
+
+register = template.Library()
+
+
+def _build_srcset(urls, extension):
+    return ", ".join(
+        f"{urls[f'{rendition}.{extension}']} {width}w" for rendition, width in IMAGE_WIDTHS.items()
+    )
+
+
+@register.filter
+def srcset(field_file, extension="webp"):
+    """Build a ``srcset`` value listing every rendition of an uploaded image."""
+    urls = image_rendition_urls(field_file.name) if field_file else None
+    if not urls:
+        return ""
+    return _build_srcset(urls, extension)
+
+
+@register.simple_tag
+def responsive_image(field_file, alt="", css_class="", rendition="card", sizes="", style="", lazy=True):
+    """Render a lazy ``<picture>`` with WebP/JPEG renditions and a blurred placeholder.
+
+    Falls back to the original upload until derivatives have been generated.
+    """
+    if not field_file:
+        return ""
+
+    attrs = {
+        "alt": alt,
+        "class": css_class or None,
+        "loading": "lazy" if lazy else None,
+        "decoding": "async",
+        "style": style or None,
+    }
+    urls = image_rendition_urls(field_file.name)
+    if not urls:
+        return format_html('<img src="{}"{}>', field_file.url, flatatt(attrs))
+
+    sizes = sizes or f"{IMAGE_WIDTHS[rendition]}px"
+    attrs.update(
+        {
+            "srcset": _build_srcset(urls, "jpg"),
+            "sizes": sizes,
+            "style": f"background: url({urls['placeholder']}) center / cover no-repeat; {style}".strip(),
+        }
+    )
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}"><img src="{}"{}></picture>',
+        _build_srcset(urls, "webp"),
+        sizes,
+        urls[f"{rendition}.jpg"],
+        flatatt(attrs),
+    )
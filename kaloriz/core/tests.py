@@ -1,3 +1,1003 @@
-from django.test import TestCase
+import copy
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection, transaction
+from django.http import JsonResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+from PIL import Image
+
+from catalog.flash_sales import FlashSaleHoldExpired, claim_flash_sale_unit, run_flash_sale_scheduler
+from catalog.models import (
+    Category,
+    ContactMessage,
+    DiscountCode,
+    FlashSaleCampaign,
+    FlashSaleClaim,
+    FlashSaleItem,
+    Product,
+)
+from catalog.promotions import bump_price_version
+from core.admin import OrderAdmin
+from core.models import (
+    Cart,
+    CartItem,
+    DailyCategorySales,
+    EmailVerification,
+    IdempotencyKey,
+    DailyDistrictSales,
+    DailyProductSales,
+    JobWatermark,
+    Notification,
+    Order,
+    OrderItem,
+    OrderNumberBlock,
+    ProductAssociation,
+)
+from core.services.associations import (
+    ASSOCIATION_JOB,
+    build_product_associations,
+    get_frequently_bought_together,
+)
+from core.services.checkout import QUOTE_SESSION_KEY, CheckoutQuote, get_checkout_quote
+from core.services import throttling
+from core.services.idempotency import (
+    REPLAYED_HEADER,
+    idempotent,
+    purge_expired_idempotency_keys,
+    request_fingerprint,
+)
+from core.services import order_numbers
+from core.services.order_numbers import next_order_number
+from core.services.orders import (
+    TRANSITION_APPLIED,
+    TRANSITION_CONFLICT,
+    TRANSITION_INVALID,
+    cancel_order_due_to_timeout,
+    create_order_from_checkout,
+    transition_order_status,
+)
+from core.exports import ORDER_EXPORT, iter_csv
+from core.media import IMMUTABLE_CACHE_CONTROL, hashed_media_url
+from core.services.images import derivative_name, placeholder_name
+from core.services.dashboard import DASHBOARD_CACHE_KEY
+from core.services.rollups import ROLLUP_JOB, get_best_selling_products, get_sales_totals, refresh_sales_rollups
+from core.services.session_state import encoded_size, get_checkout, purge_expired_sessions, set_checkout
+from core.sessions import SessionStore as CachedDBSessionStore
+from core.sessions.db import SessionStore as DBSessionStore
+from shipping.models import Address, District, Shipment
+
+
+# Bounded: a real deadlock fails the test instead of hanging the suite.
+LOCK_RETRY_ATTEMPTS = 300
+
+
+def _retry_while_locked(func):
+    """Call ``func``, retrying SQLite shared-cache "table is locked" errors.
+
+    The shared-cache test database reports a lock instead of waiting for it;
+    other backends serialize the writers themselves.
+    """
+
+    for attempt in range(LOCK_RETRY_ATTEMPTS):
+        try:
+            return func()
+        except OperationalError:
+            if attempt == LOCK_RETRY_ATTEMPTS - 1:
+                raise
+            time.sleep(0.01)
+
+
+class OrderTestMixin:
+    def _create_order(self, order_number="INV-1", status="pending"):
+        self.user = User.objects.create_user(username="budi", email="budi@example.com", password="secret123")
+        category = Category.objects.create(name="Makanan")
+        self.product = Product.objects.create(
+            category=category,
+            name="Salad Ayam",
+            description="Salad",
+            price=Decimal("30000.00"),
+            stock=3,
+        )
+        order = Order.objects.create(
+            user=self.user,
+            order_number=order_number,
+            status=status,
+            full_name="Budi",
+            email="budi@example.com",
+            phone="08123456789",
+            address="Jl. Contoh",
+            city="Makassar",
+            postal_code="90111",
+            subtotal=Decimal("60000.00"),
+            total=Decimal("60000.00"),
+        )
+        OrderItem.objects.create(
+            order=order,
+            product=self.product,
+            product_name=self.product.name,
+            product_price=self.product.price,
+            quantity=2,
+            subtotal=self.product.price * 2,
+        )
+        return order
+
+
+class OrderTransitionTests(OrderTestMixin, TestCase):
+    def setUp(self):
+        self.order = self._create_order()
+
+    def test_fulfilment_transitions_bump_version(self):
+        for status in ("paid", "processing", "shipped", "delivered"):
+            self.assertEqual(transition_order_status(self.order, status), TRANSITION_APPLIED)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "delivered")
+        self.assertEqual(self.order.version, 4)
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 4)
+
+    def test_admin_status_change_checks_the_version_the_page_loaded(self):
+        admin_user = User.objects.create_superuser("admin", "admin@example.com", "secret123")
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse("admin:core_order_change", args=[self.order.pk]))
+        self.assertContains(response, 'name="loaded_version" value="0"')
+
+        # Paid by the gateway after the page was rendered.
+        transition_order_status(Order.objects.get(pk=self.order.pk), "paid")
+
+        def save(status, loaded_version):
+            order = Order.objects.get(pk=self.order.pk)
+            initial_status, order.status, order.tracking_number = order.status, status, "RESI-1"
+            changed = ["tracking_number"] + (["status"] if status != initial_status else [])
+            form = SimpleNamespace(
+                initial={"status": initial_status}, cleaned_data={"loaded_version": loaded_version}, changed_data=changed
+            )
+            request = RequestFactory().post("/")
+            request._messages = CookieStorage(request)
+            OrderAdmin(Order, admin.site).save_model(request, order, form, change=True)
+            return Order.objects.get(pk=self.order.pk), len(request._messages)
+
+        # Neither the status nor the other fields of a stale edit are written.
+        order, errors = save("cancelled", loaded_version=0)
+        self.assertEqual((order.status, order.version, order.tracking_number, errors), ("paid", 1, "", 1))
+        order, errors = save("paid", loaded_version=0)
+        self.assertEqual((order.tracking_number, errors), ("", 1))
+
+        order, errors = save("processing", loaded_version=1)
+        self.assertEqual((order.status, order.version, order.tracking_number, errors), ("processing", 2, "RESI-1", 0))
+
+    def test_transition_outside_table_is_rejected(self):
+        self.assertEqual(transition_order_status(self.order, "shipped"), TRANSITION_INVALID)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "pending")
+
+    def test_stale_writer_gets_conflict(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        self.assertEqual(transition_order_status(self.order, "paid"), TRANSITION_APPLIED)
+
+        self.assertEqual(transition_order_status(stale, "cancelled"), TRANSITION_CONFLICT)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "paid")
+
+    def test_late_timeout_cancel_does_not_overwrite_payment(self):
+        Order.objects.filter(pk=self.order.pk).update(payment_deadline=timezone.now() - timedelta(minutes=1))
+        stale = Order.objects.get(pk=self.order.pk)
+        transition_order_status(self.order, "paid")
+
+        self.assertFalse(cancel_order_due_to_timeout(stale))
+        self.order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual(self.order.status, "paid")
+        self.assertEqual(self.product.stock, 3)
+
+
+class OrderNumberTests(TestCase):
+    def setUp(self):
+        order_numbers._allocator = order_numbers._BlockAllocator()
+
+    @override_settings(ORDER_NUMBER_BLOCK_SIZE=3)
+    def test_numbers_come_from_blocks_without_probing(self):
+        # On SQLite the rest of a block is kept once its reservation commits.
+        with self.captureOnCommitCallbacks(execute=True):
+            numbers = [next_order_number()]
+        with self.assertNumQueries(0):
+            numbers += [next_order_number() for _ in range(2)]
+        with self.captureOnCommitCallbacks(execute=True):
+            numbers.append(next_order_number("ORD"))
+
+        self.assertEqual(len(set(numbers)), 4)
+        self.assertEqual(OrderNumberBlock.objects.count(), 2)
+        self.assertRegex(numbers[0], r"^INV-\d{6}-\d{6}-0$")
+        self.assertTrue(numbers[3].startswith("ORD-"))
+        self.assertLessEqual(len(next_order_number("X" * 30)), Order._meta.get_field("midtrans_order_id").max_length)
+
+    def test_uncommitted_block_is_not_reused(self):
+        first = next_order_number()
+        self.assertNotEqual(next_order_number(), first)
+        self.assertEqual(OrderNumberBlock.objects.count(), 2)
+
+    def test_midtrans_retry_ids_use_allowed_characters(self):
+        order = OrderTestMixin._create_order(self, order_number=next_order_number())
+        order.midtrans_order_id = order.order_number
+        order.save(update_fields=["midtrans_order_id"])
+
+        with self.assertNumQueries(1):
+            retried = order.regenerate_midtrans_order_id()
+        self.assertRegex(retried, r"^[A-Za-z0-9_~.-]+$")
+        self.assertEqual(Order.split_midtrans_order_id(retried), (order.order_number, 1))
+        self.assertEqual(Order.split_midtrans_order_id("INV-1::retry::2"), ("INV-1", 2))
+
+
+class OrderTransitionConcurrencyTests(OrderTestMixin, TransactionTestCase):
+    def test_only_one_concurrent_writer_wins(self):
+        order = self._create_order()
+        targets = ["paid", "cancelled"] * 4
+        loaded = [Order.objects.get(pk=order.pk) for _ in targets]
+        barrier = threading.Barrier(len(targets))
+        outcomes = []
+
+        def transition(instance, status):
+            with transaction.atomic():
+                return transition_order_status(copy.copy(instance), status)
+
+        def worker(instance, status):
+            try:
+                barrier.wait()
+                outcomes.append(_retry_while_locked(lambda: transition(instance, status)))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=args) for args in zip(loaded, targets)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        order.refresh_from_db()
+        self.assertEqual(outcomes.count(TRANSITION_APPLIED), 1)
+        self.assertEqual(outcomes.count(TRANSITION_CONFLICT), len(targets) - 1)
+        self.assertIn(order.status, {"paid", "cancelled"})
+        self.assertEqual(order.version, 1)
+
+
+class CheckoutQuoteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="budi", password="secret123")
+        category = Category.objects.create(name="Makanan")
+        self.product = Product.objects.create(
+            category=category, name="Salad Ayam", description="Salad", price=Decimal(30000), stock=5
+        )
+        self.cart = Cart.objects.create(user=self.user)
+        self.item = CartItem.objects.create(cart=self.cart, product=self.product, quantity=2)
+        self.request = RequestFactory().get("/")
+        self.request.user = self.user
+        self.request.session = SessionStore()
+        self.request.session["checkout"] = {"address_id": 1, "shipping_method": "REG", "shipping_cost": "10000"}
+
+    def _quote(self):
+        self.cart.refresh_from_db()
+        return get_checkout_quote(self.request, self.cart)
+
+    def test_quote_is_reused_until_an_input_changes(self):
+        quote = self._quote()
+        self.assertEqual((quote.subtotal, quote.total), (Decimal(60000), Decimal(70000)))
+        self.assertEqual(CheckoutQuote.from_session(self.request.session[QUOTE_SESSION_KEY]), quote)
+
+        self.cart.refresh_from_db()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_checkout_quote(self.request, self.cart), quote)
+
+        self.item.quantity = 3
+        self.item.save()
+        self.assertEqual(self._quote().subtotal, Decimal(90000))
+
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal(20000))
+        self.assertEqual(self._quote().subtotal, Decimal(90000))
+        bump_price_version()
+        self.assertEqual(self._quote().subtotal, Decimal(60000))
+
+        self.request.session["checkout"]["shipping_cost"] = "15000"
+        self.assertEqual(self._quote().total, Decimal(75000))
+
+    def test_coupon_is_priced_and_dropped_once_it_stops_applying(self):
+        DiscountCode.objects.create(
+            code="HEMAT", discount_type=DiscountCode.TYPE_FLAT, flat_amount=Decimal(5000), min_spend=Decimal(60000)
+        )
+        self.request.session["discount"] = {"code": "hemat"}
+        quote = self._quote()
+        self.assertEqual((quote.discount_code, quote.total), ("HEMAT", Decimal(65000)))
+        self.assertEqual(self.request.session["discount"], "HEMAT")
+
+        self.item.delete()
+        quote = self._quote()
+        self.assertEqual((quote.discount_code, quote.total), ("", Decimal(10000)))
+        self.assertNotIn("discount", self.request.session)
+
+
+    @override_settings(FLASH_SALE_HOLD_MINUTES=1)
+    def test_flash_price_needs_a_held_unit_until_the_order(self):
+        now = timezone.now()
+        campaign = FlashSaleCampaign.objects.create(
+            name="Flash", start=now - timedelta(minutes=1), end=now + timedelta(hours=1)
+        )
+        FlashSaleItem.objects.create(campaign=campaign, product=self.product, price=Decimal(20000), quota=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            run_flash_sale_scheduler()
+        self.assertEqual(self._quote().subtotal, Decimal(60000))
+
+        self.item.quantity = 1
+        self.item.save()
+        claim = claim_flash_sale_unit(self.product, self.user)
+        quote = self._quote()
+        self.assertEqual(quote.subtotal, Decimal(20000))
+        # The quote lapses with the hold (stored to the second).
+        self.assertEqual(int(quote.expires_at.timestamp()), int(claim.expires_at.timestamp()))
+
+        FlashSaleClaim.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        with self.assertRaises(FlashSaleHoldExpired), transaction.atomic():
+            create_order_from_checkout(
+                user=self.user, cart=self.cart, selected_items=[self.item], selected_quantities={},
+                order_number="ORD-FLASH", subtotal=quote.subtotal, shipping_cost=quote.shipping_cost,
+                total=quote.total, shipping_full_name="Budi", shipping_email="budi@example.com",
+                shipping_phone="0800", shipping_address_text="-", shipping_city="Makassar",
+                shipping_postal_code="90000", courier_service="REG", district_name="-", eta="",
+                unit_prices=quote.unit_prices,
+            )
+        self.assertFalse(Order.objects.exists())
+
+
+class IdempotentOrderTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="rina", email="rina@example.com", password="secret123")
+        category = Category.objects.create(name="Minuman")
+        self.product = Product.objects.create(
+            category=category, name="Jus", description="Jus", price=Decimal(10000), stock=5
+        )
+        CartItem.objects.create(cart=Cart.objects.create(user=self.user), product=self.product)
+        district = District.objects.create(name="Panakkukang", reg_cost=Decimal(10000), exp_cost=Decimal(20000))
+        self.address = Address.objects.create(
+            user=self.user, full_name="Rina", phone="08123456789", district=district,
+            postal_code="90231", street_name="Jl. Pettarani",
+        )
+        self.client.force_login(self.user)
+
+    def _place(self, key):
+        return self.client.post(
+            reverse("core:place_order_from_address"),
+            {"address_id": self.address.pk, "courier_service": "REG", "idempotency_key": key},
+        )
+
+    def test_repeated_key_replays_the_first_order(self):
+        first = self._place("klik-bayar-1")
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertRedirects(first, first["Location"], fetch_redirect_response=False)
+
+        CartItem.objects.create(cart=Cart.objects.get(user=self.user), product=self.product)
+        again = self._place("klik-bayar-1")
+        self.assertEqual((again.status_code, again["Location"]), (302, first["Location"]))
+        self.assertEqual(again[REPLAYED_HEADER], "true")
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 4)
+
+        self._place("klik-bayar-2")
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(self._place("x").status_code, 400)
+
+    def test_key_reused_for_a_different_request_is_rejected(self):
+        self._place("klik-bayar-1")
+        response = self.client.post(
+            reverse("core:place_order_from_address"),
+            {"address_id": self.address.pk, "courier_service": "EXP", "idempotency_key": "klik-bayar-1"},
+        )
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_checkout_form_order_is_idempotent(self):
+        data = {
+            "district_id": self.address.district_id, "shipping_service": "REG", "full_name": "Rina",
+            "email": "rina@example.com", "phone": "08123456789", "street": "Jl. Pettarani",
+            "postal_code": "90231", "idempotency_key": "form-checkout-1",
+        }
+        first = self.client.post(reverse("core:place_order"), data)
+        CartItem.objects.create(cart=Cart.objects.get(user=self.user), product=self.product)
+        again = self.client.post(reverse("core:place_order"), data)
+        self.assertEqual((again["Location"], again[REPLAYED_HEADER]), (first["Location"], "true"))
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_error_responses_release_the_key_and_expired_keys_are_purged(self):
+        @idempotent("test")
+        def flaky(request):
+            return JsonResponse({"ok": False}, status=400)
+
+        request = RequestFactory().post("/", HTTP_IDEMPOTENCY_KEY="kunci-gagal")
+        request.user = self.user
+        self.assertEqual(flaky(request).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        IdempotencyKey.objects.create(user=self.user, scope="test", key="lama-sekali", expires_at=timezone.now())
+        self.assertEqual(purge_expired_idempotency_keys(), 1)
+
+    def test_error_redirect_releases_the_key(self):
+        CartItem.objects.filter(cart__user=self.user).update(is_selected=False)
+        response = self._place("klik-bayar-1")
+        self.assertRedirects(response, reverse("core:cart"), fetch_redirect_response=False)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        CartItem.objects.filter(cart__user=self.user).update(is_selected=True)
+        response = self._place("klik-bayar-1")
+        self.assertNotIn(REPLAYED_HEADER, response)
+        self.assertEqual(Order.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_key_still_in_progress_is_not_run_twice(self):
+        @idempotent("test")
+        def view(request):
+            return JsonResponse({"ok": True})
+
+        request = RequestFactory().post("/", HTTP_IDEMPOTENCY_KEY="sedang-jalan")
+        request.user = self.user
+        IdempotencyKey.objects.create(
+            user=self.user, scope="test", key="sedang-jalan", fingerprint=request_fingerprint(request),
+            expires_at=timezone.now() + timedelta(minutes=1),
+        )
+        self.assertEqual(view(request).status_code, 409)
+
+
+class IdempotentOrderConcurrencyTests(TransactionTestCase):
+    def test_concurrent_duplicate_waits_for_the_first_response(self):
+        user = User.objects.create_user(username="rina", password="secret123")
+        calls = []
+
+        @idempotent("test")
+        def slow(request):
+            calls.append(1)
+            time.sleep(0.3)
+            return JsonResponse({"order": len(calls)})
+
+        responses = []
+
+        def send():
+            request = RequestFactory().post("/", HTTP_IDEMPOTENCY_KEY="klik-ganda")
+            request.user = user
+            try:
+                responses.append(_retry_while_locked(lambda: slow(request)))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=send) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([response.content for response in responses], [b'{"order": 1}'] * 2)
+
+
+class EmailOrUsernameBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="budi", email="Budi@Example.com", password="secret123")
+
+    def test_username_or_email_in_one_indexed_query(self):
+        self.assertEqual(authenticate(username="budi", password="secret123"), self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(authenticate(username=" budi@example.COM ", password="secret123"), self.user)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('LOWER("auth_user"."email")', queries[0]["sql"])
+        self.assertIsNone(authenticate(username="budi@example.com", password="salah"))
+        self.assertIsNone(authenticate(username="siapa@example.com", password="secret123"))
+
+    def test_shared_email_picks_the_account_whose_password_matches(self):
+        other = User.objects.create_user(username="budi2", email="budi@example.com", password="lain456")
+        self.assertEqual(authenticate(username="budi@example.com", password="lain456"), other)
+        self.assertEqual(authenticate(username="budi@example.com", password="secret123"), self.user)
+
+        response = self.client.post(reverse("core:login"), {"username": "BUDI@example.com", "password": "lain456"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(int(self.client.session["_auth_user_id"]), other.pk)
+
+
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="budi", email="budi@example.com", password="secret123")
+
+    def test_sliding_window_counts_without_queries(self):
+        rate = throttling.RateLimit("test", "TEST_RATE_LIMIT", 3, 60)
+        start = 6000.0  # start of a window
+        with self.assertNumQueries(0):
+            self.assertEqual([throttling.hit(rate, "a", now=start + i) for i in range(4)], [0, 0, 0, 57])
+            # The previous window fades out: 4 * 0.75 + 1 > 3, then 4 * 0.25 + 2 <= 3.
+            self.assertGreater(throttling.hit(rate, "a", now=start + 75), 0)
+            self.assertEqual(throttling.hit(rate, "a", now=start + 105), 0)
+            self.assertEqual(throttling.hit(rate, "b", now=start + 3), 0)
+
+    def test_login_is_limited_per_account(self):
+        for _ in range(5):
+            response = self.client.post(reverse("core:login"), {"username": "Budi", "password": "salah"})
+            self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(reverse("core:login"), {"username": "budi", "password": "secret123"})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+        self.assertNotIn("_auth_user_id", self.client.session)
+
+    def test_username_and_email_share_one_account_budget(self):
+        for username in ["budi", "BUDI@example.com", "budi", "budi@example.com", "budi"]:
+            self.client.post(reverse("core:login"), {"username": username, "password": "salah"})
+
+        response = self.client.post(reverse("core:login"), {"username": "budi@example.com", "password": "salah"})
+        self.assertEqual(response.status_code, 429)
+
+    def test_attempt_is_counted_before_the_password_is_checked(self):
+        for _ in range(4):
+            self.client.post(reverse("core:login"), {"username": "budi", "password": "salah"})
+
+        def authenticate(request, **credentials):
+            # A parallel request arriving now already sees this attempt counted.
+            self.assertGreater(throttling.peek(throttling.LOGIN_PER_ACCOUNT, "budi@example.com"), 0)
+
+        with mock.patch("core.views.authenticate", side_effect=authenticate) as checked:
+            self.client.post(reverse("core:login"), {"username": "budi", "password": "salah"})
+        checked.assert_called_once()
+
+    def test_successful_logins_do_not_lock_the_account(self):
+        for _ in range(6):
+            response = self.client.post(reverse("core:login"), {"username": "budi", "password": "secret123"})
+            self.assertEqual(response.status_code, 302)
+            self.client.logout()
+        self.assertEqual(throttling.peek(throttling.LOGIN_PER_ACCOUNT, "budi@example.com"), 0)
+
+    def test_resend_code_stops_before_writing_or_mailing(self):
+        session = self.client.session
+        session["pending_verification_user_id"] = self.user.pk
+        session.save()
+
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse("core:resend_verification")).status_code, 302)
+        response = self.client.get(reverse("core:resend_verification"))
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(EmailVerification.objects.filter(user=self.user).count(), 3)
+
+
+class SessionStateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_checkout_is_stored_as_a_positional_list(self):
+        request = RequestFactory().get("/")
+        request.session = SessionStore()
+        legacy = {"address_id": 7, "shipping_method": "REG", "shipping_cost": "10000", "payment_method": "doku"}
+        request.session["checkout"] = legacy
+        self.assertEqual(get_checkout(request), legacy)
+
+        set_checkout(request, get_checkout(request))
+        self.assertEqual(request.session["checkout"], [1, 7, "REG", "10000", None, "doku"])
+        self.assertEqual(get_checkout(request), legacy)
+        self.assertLess(encoded_size(request.session["checkout"]), encoded_size(legacy))
+
+        set_checkout(request, {})
+        self.assertNotIn("checkout", request.session)
+
+    def test_store_drops_unknown_and_oversized_keys(self):
+        session = CachedDBSessionStore()
+        session.update({
+            "_auth_user_id": "1",
+            "discount": "HEMAT",
+            "doku_last_result": {"order": {"invoice_number": "INV-1"}},
+            "checkout_quote": ["x" * 5000],
+        })
+        with self.assertLogs("core.services.session_state", "WARNING") as logs:
+            session.save()
+
+        self.assertEqual(len(logs.records), 2)
+        expected = {"_auth_user_id": "1", "discount": "HEMAT"}
+        self.assertEqual(Session.objects.get(pk=session.session_key).get_decoded(), expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedDBSessionStore(session.session_key).load(), expected)
+
+    def test_database_store_applies_the_schema(self):
+        session = DBSessionStore()
+        session.update({"_auth_user_id": "1", "checkout_quote": ["x" * 5000]})
+        with self.assertLogs("core.services.session_state", "WARNING"):
+            session.save()
+        self.assertEqual(DBSessionStore(session.session_key).load(), {"_auth_user_id": "1"})
+
+    def test_expired_sessions_are_purged_in_batches(self):
+        now = timezone.now()
+        for index in range(5):
+            Session.objects.create(session_key=f"expired{index}", session_data="", expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key="live", session_data="", expire_date=now + timedelta(days=1))
+
+        # Three batches, each one SELECT of keys and one DELETE.
+        with self.assertNumQueries(6):
+            self.assertEqual(purge_expired_sessions(batch_size=2, now=now), 5)
+        self.assertEqual(list(Session.objects.values_list("pk", flat=True)), ["live"])
+
+        output = StringIO()
+        call_command("purge_expired_sessions", stdout=output)
+        self.assertIn("0 sesi", output.getvalue())
+
+
+class TemporaryMediaMixin:
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class ImageDerivativeTests(TemporaryMediaMixin, TestCase):
+    def _upload(self):
+        image = Image.new("RGB", (1200, 800), (200, 120, 40))
+        exif = Image.Exif()
+        exif[0x010F] = "PhoneMaker"
+        buffer = BytesIO()
+        image.save(buffer, format="JPEG", exif=exif.tobytes())
+        return SimpleUploadedFile("salad.jpg", buffer.getvalue(), content_type="image/jpeg")
+
+    def test_product_upload_creates_renditions_without_exif(self):
+        category = Category.objects.create(name="Makanan")
+        product = Product.objects.create(
+            category=category, name="Salad", description="Salad", price=Decimal("1000"), image=self._upload()
+        )
+        name = product.image.name
+
+        with default_storage.open(derivative_name(name, "card", "webp")) as handle:
+            card = Image.open(handle)
+            self.assertEqual(card.size, (480, 320))
+            self.assertFalse(card.getexif())
+        with default_storage.open(name) as handle:
+            self.assertFalse(Image.open(handle).getexif())
+        self.assertTrue(default_storage.exists(placeholder_name(name)))
+
+        html = Template("{% load image_tags %}{% responsive_image image alt='Salad' %}").render(
+            Context({"image": product.image})
+        )
+        self.assertIn('type="image/webp"', html)
+        self.assertRegex(html, r"card\.webp\?v=[0-9a-f]+ 480w")
+        self.assertIn(default_storage.url(derivative_name(name, "card", "jpg")), html)
+
+        # Later renders reuse the URL set cached for this image.
+        with mock.patch("core.media.hashed_media_url") as hashed:
+            again = Template("{% load image_tags %}{% responsive_image image alt='Salad' %}").render(
+                Context({"image": product.image})
+            )
+        hashed.assert_not_called()
+        self.assertEqual(again, html)
+
+
+    def test_only_image_saves_generate_renditions(self):
+        category = Category.objects.create(name="Makanan")
+        product = Product.objects.create(
+            category=category, name="Salad", description="Salad", price=Decimal("1000"), image=self._upload()
+        )
+        placeholder = placeholder_name(product.image.name)
+        default_storage.delete(placeholder)
+
+        product.stock = 4
+        product.save(update_fields=["stock"])
+        product.price = Decimal("2000")
+        product.save()
+        self.assertFalse(default_storage.exists(placeholder))
+
+        product.save(update_fields=["image"])
+        self.assertTrue(default_storage.exists(placeholder))
+
+
+class MediaServingTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.name = default_storage.save("derivatives/products/salad/card.webp", ContentFile(b"webp-bytes"))
+
+    def test_file_response_with_etag_revalidation(self):
+        response = self.client.get(f"/media/{self.name}")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"webp-bytes")
+        self.assertEqual(response["Cache-Control"], "public, max-age=3600")
+
+        revalidated = self.client.get(f"/media/{self.name}", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_hashed_url_is_immutable(self):
+        url = hashed_media_url(self.name)
+
+        self.assertRegex(url, r"\?v=[0-9a-f]{12}$")
+        self.assertEqual(self.client.get(url)["Cache-Control"], IMMUTABLE_CACHE_CONTROL)
+
+    @override_settings(MEDIA_ACCEL_BACKEND="nginx", MEDIA_ACCEL_PREFIX="/protected-media/")
+    def test_nginx_backend_delegates_transfer(self):
+        response = self.client.get(f"/media/{self.name}")
+
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.name}")
+        self.assertEqual(response.content, b"")
+
+    def test_path_traversal_is_rejected(self):
+        self.assertEqual(self.client.get("/media/../settings.py").status_code, 404)
+
+
+class SalesOrderMixin:
+    def _order(self, products, status="paid", days_ago=1, shipping_address=None):
+        order = Order.objects.create(
+            user=self.user,
+            order_number=f"INV-{Order.objects.count() + 1}",
+            status=status,
+            full_name="Sari",
+            email="sari@example.com",
+            phone="08123456789",
+            address="Jl. Contoh",
+            city="Makassar",
+            postal_code="90111",
+            shipping_address=shipping_address,
+            subtotal=Decimal("10000.00"),
+            total=Decimal("10000.00"),
+        )
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        for product in products:
+            OrderItem.objects.create(
+                order=order,
+                product=product,
+                product_name=product.name,
+                product_price=product.price,
+                quantity=1,
+                subtotal=product.price,
+            )
+        return order
+
+
+class ProductAssociationTests(SalesOrderMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="sari", email="sari@example.com", password="secret123")
+        category = Category.objects.create(name="Makanan")
+        self.salad, self.juice, self.granola, self.soup = (
+            Product.objects.create(category=category, name=name, description=name, price=Decimal("10000"))
+            for name in ("Salad", "Jus Hijau", "Granola", "Sup Labu")
+        )
+
+    def test_co_purchases_rank_recommendations(self):
+        self._order([self.salad, self.juice])
+        self._order([self.salad, self.juice, self.granola])
+        self._order([self.salad, self.soup], status="cancelled")
+        build_product_associations(chunk_size=1)
+
+        self.assertEqual(get_frequently_bought_together([self.salad.pk]), [self.juice, self.granola])
+        self.assertEqual(ProductAssociation.objects.get(product=self.salad, associated=self.juice).weight, 2)
+        with self.assertNumQueries(1):
+            get_frequently_bought_together([self.salad.pk, self.juice.pk])
+
+    def test_incremental_run_only_folds_new_orders(self):
+        self._order([self.salad, self.juice])
+        build_product_associations()
+        self._order([self.salad, self.granola])
+        self._order([self.salad, self.granola])
+        self._order([self.salad, self.soup], days_ago=0)
+
+        stats = build_product_associations()
+
+        self.assertEqual(stats["orders"], 2)
+        self.assertEqual(get_frequently_bought_together([self.salad.pk]), [self.granola, self.juice])
+        self.assertLess(JobWatermark.objects.get(name=ASSOCIATION_JOB).last_id, Order.objects.latest("pk").pk)
+
+    def test_pending_orders_are_folded_in_once_paid(self):
+        late = self._order([self.salad, self.granola], status="pending")
+        self._order([self.salad, self.juice])
+
+        self.assertEqual(build_product_associations()["orders"], 0)
+        self.assertLess(JobWatermark.objects.get(name=ASSOCIATION_JOB).last_id, late.pk)
+
+        Order.objects.filter(pk=late.pk).update(status="paid")
+        self.assertEqual(build_product_associations()["orders"], 2)
+        self.assertEqual(build_product_associations()["orders"], 0)
+        self.assertEqual(ProductAssociation.objects.get(product=self.salad, associated=self.granola).weight, 1)
+
+    def test_abandoned_checkout_does_not_hold_back_the_watermark(self):
+        abandoned = self._order([self.salad, self.soup], status="pending", days_ago=3)
+        Order.objects.filter(pk=abandoned.pk).update(payment_deadline=timezone.now() - timedelta(days=3))
+        self._order([self.salad, self.juice], days_ago=2)
+        latest = self._order([self.salad, self.granola])
+
+        self.assertEqual(build_product_associations()["orders"], 2)
+        self.assertEqual(JobWatermark.objects.get(name=ASSOCIATION_JOB).last_id, latest.pk)
+
+        # Paid after the watermark passed it: folded in by the re-scan, once.
+        abandoned.refresh_from_db()
+        self.assertEqual(transition_order_status(abandoned, "paid"), TRANSITION_APPLIED)
+        self.assertEqual(build_product_associations()["orders"], 1)
+        self.assertEqual(build_product_associations()["orders"], 0)
+        self.assertEqual(ProductAssociation.objects.get(product=self.salad, associated=self.soup).weight, 1)
+
+    def test_half_life_discounts_old_orders(self):
+        self._order([self.salad, self.juice], days_ago=60)
+        self._order([self.salad, self.granola], days_ago=2)
+        build_product_associations(half_life_days=30)
+
+        weight = ProductAssociation.objects.get(product=self.salad, associated=self.juice).weight
+        self.assertAlmostEqual(weight, 0.25, places=2)
+        self.assertEqual(get_frequently_bought_together([self.salad.pk], limit=1), [self.granola])
+
+
+class SalesRollupTests(SalesOrderMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="rina", email="rina@example.com", password="secret123")
+        self.category = Category.objects.create(name="Minuman")
+        self.juice = Product.objects.create(category=self.category, name="Jus", description="Jus", price=Decimal("10000"))
+        self.tea = Product.objects.create(category=self.category, name="Teh", description="Teh", price=Decimal("10000"))
+        self.district = District.objects.create(name="Panakkukang", reg_cost=Decimal("10000"), exp_cost=Decimal("20000"))
+        self.address = Address.objects.create(
+            user=self.user,
+            full_name="Rina",
+            phone="08123456789",
+            district=self.district,
+            postal_code="90231",
+            street_name="Jl. Pettarani",
+        )
+
+    def test_rollups_track_units_revenue_and_cancellations(self):
+        self._order([self.juice, self.tea], shipping_address=self.address)
+        self._order([self.juice])
+        self._order([self.tea], status="cancelled", shipping_address=self.address)
+        refresh_sales_rollups()
+
+        juice = DailyProductSales.objects.get(product=self.juice)
+        self.assertEqual((juice.orders, juice.units, juice.revenue), (2, 2, Decimal("20000")))
+        category = DailyCategorySales.objects.get(category=self.category)
+        self.assertEqual((category.orders, category.units, category.cancelled_orders), (2, 3, 1))
+        district = DailyDistrictSales.objects.get(district=self.district)
+        self.assertEqual((district.orders, district.cancelled_orders), (1, 1))
+        self.assertEqual(get_sales_totals()["revenue"], Decimal("30000"))
+        self.assertEqual(get_best_selling_products(), [self.juice, self.tea])
+
+    def test_incremental_run_rebuilds_only_changed_days(self):
+        self._order([self.juice], days_ago=3)
+        late = self._order([self.tea], status="pending", days_ago=1)
+        refresh_sales_rollups()
+        self.assertFalse(DailyProductSales.objects.filter(product=self.tea).exists())
+
+        # Rows for untouched days are not rewritten.
+        DailyProductSales.objects.filter(product=self.juice).update(units=99)
+        JobWatermark.objects.filter(name=ROLLUP_JOB).update(last_run_at=timezone.now() + timedelta(minutes=10))
+        transition_order_status(late, "paid")
+        Order.objects.filter(pk=late.pk).update(updated_at=timezone.now() + timedelta(minutes=20))
+
+        self.assertEqual(refresh_sales_rollups()["days"], 1)
+        self.assertEqual(DailyProductSales.objects.get(product=self.tea).units, 1)
+        self.assertEqual(DailyProductSales.objects.get(product=self.juice).units, 99)
+
+        refresh_sales_rollups(full=True)
+        self.assertEqual(DailyProductSales.objects.get(product=self.juice).units, 1)
+
+    def test_about_page_reads_rollups(self):
+        self._order([self.juice])
+        refresh_sales_rollups()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/about/")
+        self.assertEqual(response.context["successful_orders_count"], 1)
+        self.assertFalse([query for query in queries if '"core_order"' in query["sql"]])
+
+
+class AdminDashboardTests(SalesOrderMixin, TestCase):
+    def setUp(self):
+        cache.delete(DASHBOARD_CACHE_KEY)
+        self.user = User.objects.create_superuser(username="admin", email="admin@example.com", password="secret123")
+        category = Category.objects.create(name="Makanan")
+        self.salad = Product.objects.create(
+            category=category, name="Salad", description="Salad", price=Decimal("10000"), stock=2
+        )
+        self.client.force_login(self.user)
+
+    def test_index_shows_cached_kpis(self):
+        self._order([self.salad], days_ago=0)
+        self._order([self.salad], status="pending", days_ago=0)
+        refresh_sales_rollups()
+
+        response = self.client.get("/admin/")
+        self.assertContains(response, "Pendapatan Hari Ini (1 pesanan)")
+        self.assertContains(response, "Rp 10.000")
+        kpis = cache.get(DASHBOARD_CACHE_KEY)
+        self.assertEqual(kpis["backlog"]["count"], 1)
+        self.assertEqual(kpis["low_stock"][0]["name"], "Salad")
+
+        self._order([self.salad], days_ago=0)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/admin/")
+        self.assertFalse([query for query in queries if "core_order" in query["sql"]])
+        self.assertContains(response, "Pendapatan Hari Ini (1 pesanan)")
+
+    def test_command_primes_only_a_shared_cache(self):
+        output = StringIO()
+        call_command("refresh_admin_dashboard", "--skip-rollups", stdout=output)
+        self.assertIn("tanpa CACHE_URL", output.getvalue())
+        self.assertIsNone(cache.get(DASHBOARD_CACHE_KEY))
+
+        with mock.patch("core.management.commands.refresh_admin_dashboard.cache_is_shared", return_value=True):
+            call_command("refresh_admin_dashboard", "--skip-rollups", stdout=StringIO())
+        self.assertIsNotNone(cache.get(DASHBOARD_CACHE_KEY))
+
+
+class ExportTests(SalesOrderMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", email="admin@example.com", password="secret123")
+        category = Category.objects.create(name="Makanan")
+        self.salad = Product.objects.create(category=category, name="Salad", description="Salad", price=Decimal("10000"))
+        self.shipped = self._order([self.salad])
+        self.plain = self._order([self.salad], status="pending")
+        Shipment.objects.create(
+            order=self.shipped,
+            full_name="Sari",
+            phone="08123456789",
+            street="Jl. Contoh",
+            district_name="Rappocini",
+            postal_code="90222",
+            service="REG",
+            cost=Decimal("10000"),
+            eta="2-3 hari",
+            tracking_number="RESI123",
+        )
+        self.client.force_login(self.user)
+
+    def _action(self, url, action, ids):
+        return self.client.post(url, {"action": action, "_selected_action": [str(pk) for pk in ids]})
+
+    def test_order_csv_action_streams_selected_rows(self):
+        response = self._action("/admin/core/order/", "export_csv", [self.shipped.pk, self.plain.pk])
+
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("Nomor Pesanan,Tanggal,Status"))
+        self.assertIn("Rappocini,RESI123", lines[1])
+        self.assertIn("Menunggu Pembayaran", lines[2])
+
+    def test_export_uses_one_query_per_chunk(self):
+        with self.assertNumQueries(1):
+            rows = list(iter_csv(ORDER_EXPORT, chunk_size=100))
+        self.assertEqual(len(rows), 3)
+
+    def test_shipment_xlsx_action(self):
+        response = self._action("/admin/shipping/shipment/", "export_xlsx", [self.shipped.shipment.pk])
+
+        workbook = load_workbook(BytesIO(b"".join(response.streaming_content)), read_only=True)
+        rows = list(workbook.active.values)
+        self.assertEqual(rows[1][0], self.shipped.order_number)
+        self.assertEqual(rows[1][-1], "RESI123")
+
+    def test_command_escapes_formula_cells(self):
+        ContactMessage.objects.create(
+            name="=HYPERLINK(1)", email="a@example.com", phone="0812", subject="Halo", message="Tes"
+        )
+        output = StringIO()
+        call_command("export_records", "contact_messages", stdout=output)
+
+        self.assertIn("'=HYPERLINK(1)", output.getvalue())
@@ -1,5 +1,6 @@
 import json
 import logging
+import time
 import uuid
 from decimal import Decimal, InvalidOperation
 
@@ -17,6 +18,7 @@ from django.core.paginator import Paginator
 from django.utils.formats import number_format
 from django.urls import reverse
 
+from .backends import login_identity
 from .models import (
     Cart,
     CartItem,
@@ -28,10 +30,17 @@ from .models import (
     Watchlist,
     EmailVerification,
 )
-from catalog.models import Product, DiscountCode, Testimonial
+from catalog.flash_sales import FlashSaleHoldExpired, FlashSaleSoldOut, claim_flash_sale_unit
+from catalog.models import Product, Testimonial
 from .forms import CustomUserRegistrationForm, TestimonialForm
 from .utils import send_verification_email, send_welcome_email
+from .services.associations import get_frequently_bought_together
+from .services.checkout import get_checkout_quote, refresh_checkout_quote
+from .services import throttling
+from .services.idempotency import idempotent, mark_failed
+from .services.order_numbers import next_order_number
 from .services.orders import create_order_from_checkout, cancel_order_due_to_timeout
+from .services.session_state import get_checkout, set_checkout
 from shipping.models import District, Address
 from shipping.views import calculate_shipping_cost, validate_shipping_data
 from shipping.forms import AddressForm
@@ -127,9 +136,12 @@ def _prepare_selected_cart_items(selected_items_qs):
 @login_required
 def cart_view(request):
     """Display user's shopping cart"""
-    cart, created = Cart.objects.get_or_create(user=request.user)
+    cart, created = Cart.objects.prefetch_related('items__product').get_or_create(user=request.user)
+    # The template and get_selected_total reuse these prefetched, priced items.
+    cart_product_ids = [item.product_id for item in cart.price_items(cart.items.all())]
     context = {
         'cart': cart,
+        'bought_together': get_frequently_bought_together(cart_product_ids, limit=4),
     }
     return render(request, 'core/cart.html', context)
 
@@ -232,6 +244,16 @@ def flash_sale_buy_now(request, slug):
         messages.error(request, message)
         return redirect(referer)
 
+    try:
+        # Hold one unit of the quota so checkout cannot oversell the campaign
+        claim_flash_sale_unit(product, request.user)
+    except FlashSaleSoldOut:
+        message = "Kuota flash sale untuk produk ini sudah habis."
+        if is_ajax:
+            return JsonResponse({'success': False, 'message': message}, status=409)
+        messages.error(request, message)
+        return redirect(referer)
+
     cart, _ = Cart.objects.get_or_create(user=request.user)
 
     try:
@@ -384,6 +406,7 @@ def checkout(request):
         return redirect('core:cart')
 
     selected_items, _ = _prepare_selected_cart_items(selected_items_qs)
+    cart.price_items(selected_items)
 
     # Get user profile for pre-filling form
     try:
@@ -412,7 +435,7 @@ def checkout(request):
     # Get default address if exists
     default_address = next((addr for addr in user_addresses if addr.is_default), None)
 
-    checkout_data = request.session.get('checkout', {})
+    checkout_data = get_checkout(request)
     selected_address_id = checkout_data.get('address_id')
     active_address = None
 
@@ -425,8 +448,7 @@ def checkout(request):
             # Selected address no longer available; clear stale session state
             for key in ['address_id', 'shipping_method', 'shipping_cost', 'eta']:
                 checkout_data.pop(key, None)
-            request.session['checkout'] = checkout_data
-            request.session.modified = True
+            set_checkout(request, checkout_data)
             messages.warning(
                 request,
                 'Alamat aktif Anda sudah tidak tersedia. Silakan pilih alamat lain.',
@@ -437,7 +459,7 @@ def checkout(request):
 
     districts = District.objects.filter(is_active=True).order_by('name')
 
-    subtotal = Decimal(cart.get_selected_total() or 0)
+    subtotal = get_checkout_quote(request, cart).subtotal
     raw_shipping_cost = checkout_data.get('shipping_cost')
     selected_shipping_cost = None
 
@@ -478,7 +500,7 @@ def checkout_payment(request):
         messages.error(request, 'Pilih minimal 1 item untuk checkout.')
         return redirect('core:cart')
 
-    checkout_data = request.session.get('checkout', {})
+    checkout_data = get_checkout(request)
     address_id = checkout_data.get('address_id')
     shipping_method = checkout_data.get('shipping_method')
     raw_shipping_cost = checkout_data.get('shipping_cost')
@@ -492,13 +514,13 @@ def checkout_payment(request):
     except (InvalidOperation, TypeError, ValueError):
         for key in ['shipping_cost', 'shipping_method', 'eta']:
             checkout_data.pop(key, None)
-        request.session['checkout'] = checkout_data
-        request.session.modified = True
+        set_checkout(request, checkout_data)
         messages.warning(request, 'Informasi ongkir tidak valid. Silakan pilih ulang alamat dan kurir.')
         return redirect('core:checkout')
 
-    subtotal = Decimal(cart.get_selected_total() or 0)
-    total = subtotal + shipping_cost
+    quote = get_checkout_quote(request, cart)
+    subtotal = quote.subtotal
+    total = quote.total_before_discount
 
     payment_methods_qs = PaymentMethod.objects.filter(is_active=True).order_by('display_order', 'name')
     payment_methods = list(payment_methods_qs)
@@ -519,8 +541,7 @@ def checkout_payment(request):
         )
         if selected_payment_method is None:
             checkout_data.pop('payment_method', None)
-            request.session['checkout'] = checkout_data
-            request.session.modified = True
+            set_checkout(request, checkout_data)
 
     if selected_payment_method is None and payment_methods:
         selected_payment_method = payment_methods[0]
@@ -537,8 +558,7 @@ def checkout_payment(request):
             messages.error(request, 'Pilih metode pembayaran yang tersedia.')
         else:
             checkout_data['payment_method'] = chosen_method.slug
-            request.session['checkout'] = checkout_data
-            request.session.modified = True
+            set_checkout(request, checkout_data)
             return redirect('core:checkout_review')
 
     selected_payment_slug = selected_payment_method.slug if selected_payment_method else None
@@ -572,7 +592,7 @@ def checkout_review(request):
         messages.error(request, 'Pilih minimal 1 item untuk checkout.')
         return redirect('core:cart')
 
-    checkout_data = request.session.get('checkout', {})
+    checkout_data = get_checkout(request)
     address_id = checkout_data.get('address_id')
 
     payment_method_slug = checkout_data.get('payment_method')
@@ -588,8 +608,7 @@ def checkout_review(request):
 
     if payment_method is None:
         checkout_data.pop('payment_method', None)
-        request.session['checkout'] = checkout_data
-        request.session.modified = True
+        set_checkout(request, checkout_data)
         messages.warning(request, 'Metode pembayaran yang dipilih tidak tersedia. Silakan pilih ulang.')
         return redirect('core:checkout_payment')
 
@@ -605,63 +624,17 @@ def checkout_review(request):
         messages.warning(request, 'Alamat pengiriman tidak ditemukan. Silakan pilih ulang.')
         return redirect('core:checkout')
 
-    raw_shipping_cost = checkout_data.get('shipping_cost')
-    try:
-        shipping_cost = Decimal(raw_shipping_cost or 0)
-    except (InvalidOperation, TypeError, ValueError):
-        shipping_cost = Decimal('0')
-
-    subtotal = Decimal(cart.get_selected_total() or 0)
-    checkout_data['subtotal'] = str(subtotal)
-    request.session['checkout'] = checkout_data
-    request.session.modified = True
-
-    discount_session = request.session.get('discount') or {}
-    discount_amount = Decimal('0')
-    discount_code = discount_session.get('code')
-    discount_type_label = discount_session.get('type_label', '')
-
-    shipping_method = checkout_data.get('shipping_method')
-    grand_total = subtotal + shipping_cost
-
-    if discount_code:
-        discount_obj = DiscountCode.objects.filter(code__iexact=discount_code).first()
-        if discount_obj and discount_obj.is_valid():
-            if discount_obj.is_shipping_allowed(shipping_method):
-                if grand_total >= discount_obj.get_min_spend():
-                    discount_amount = discount_obj.calculate_discount(grand_total)
-                    if discount_amount > grand_total:
-                        discount_amount = grand_total
-                    discount_type_label = discount_obj.get_type_label()
-                    request.session['discount'] = {
-                        'code': discount_code,
-                        'amount': str(discount_amount),
-                        'type': discount_obj.discount_type,
-                        'type_label': discount_type_label,
-                    }
-                    request.session.modified = True
-                else:
-                    request.session.pop('discount', None)
-                    request.session.modified = True
-                    discount_code = None
-                    discount_type_label = ''
-            else:
-                request.session.pop('discount', None)
-                request.session.modified = True
-                discount_code = None
-                discount_type_label = ''
-        else:
-            request.session.pop('discount', None)
-            request.session.modified = True
-            discount_code = None
-            discount_amount = Decimal('0')
-            discount_type_label = ''
-
-    total = subtotal + shipping_cost - discount_amount
-    if total < 0:
-        total = Decimal('0')
+    # A coupon that stopped applying is dropped from the session by the quote.
+    quote = get_checkout_quote(request, cart)
+    subtotal = quote.subtotal
+    shipping_cost = quote.shipping_cost
+    discount_amount = quote.discount_amount
+    discount_code = quote.discount_code or None
+    discount_type_label = quote.discount_type_label
+    total = quote.total
 
     selected_items, _ = _prepare_selected_cart_items(selected_items_qs)
+    cart.price_items(selected_items)
 
     shipping_method = checkout_data.get('shipping_method')
     shipping_method_label = 'Express' if str(shipping_method).upper() == 'EXP' else 'Reguler'
@@ -706,11 +679,14 @@ def checkout_review(request):
         'payment_create_doku_checkout_url': reverse('payment:create_doku_checkout'),
         'payment_doku_return_url': reverse('payment:doku_return'),
         'order_complete_url': reverse('core:order_list'),
+        # Reused by double clicks and retries so only one order is placed.
+        'idempotency_key': uuid.uuid4().hex,
     }
     return render(request, 'core/checkout_review.html', context)
 
 
 @login_required
+@idempotent('place_order')
 def place_order(request):
     """Process order placement with shipping integration - only selected items"""
     if request.method != 'POST':
@@ -723,7 +699,7 @@ def place_order(request):
 
     if not selected_items_qs.exists():
         messages.error(request, 'Pilih minimal 1 item untuk checkout.')
-        return redirect('core:cart')
+        return mark_failed(redirect('core:cart'))
 
     selected_items, selected_quantities = _prepare_selected_cart_items(selected_items_qs)
 
@@ -732,7 +708,7 @@ def place_order(request):
         quantity = selected_quantities.get(item.pk, item.quantity)
         if item.product.stock < quantity:
             messages.error(request, f'Stok {item.product.name} tidak mencukupi.')
-            return redirect('core:cart')
+            return mark_failed(redirect('core:cart'))
 
     # Validate shipping data (JANGAN PERCAYA DATA DARI CLIENT!)
     district_id = request.POST.get('district_id')
@@ -742,51 +718,58 @@ def place_order(request):
         is_valid, error_message = validate_shipping_data(district_id, service)
         if not is_valid:
             messages.error(request, f'Data pengiriman tidak valid: {error_message}')
-            return redirect('core:checkout')
+            return mark_failed(redirect('core:checkout'))
 
         # Re-lookup shipping cost from database (SERVER-SIDE VALIDATION)
         # Use selected items total only
-        subtotal = cart.get_selected_total()
+        unit_prices = {item.pk: item.get_unit_price() for item in cart.price_items(selected_items)}
+        subtotal = sum(unit_prices[item.pk] * item.quantity for item in selected_items)
         shipping_cost, eta, district_name = calculate_shipping_cost(
             district_id, service, subtotal
         )
 
     except Exception as e:
         messages.error(request, f'Terjadi kesalahan dalam perhitungan ongkir: {str(e)}')
-        return redirect('core:checkout')
+        return mark_failed(redirect('core:checkout'))
 
-    order_number = f'ORD-{uuid.uuid4().hex[:8].upper()}'
+    order_number = next_order_number('ORD')
     total = subtotal + shipping_cost
     service_label = 'Express' if str(service).upper() == 'EXP' else 'Reguler'
 
-    with transaction.atomic():
-        order = create_order_from_checkout(
-            user=request.user,
-            cart=cart,
-            selected_items=selected_items,
-            selected_quantities=selected_quantities,
-            order_number=order_number,
-            subtotal=subtotal,
-            shipping_cost=shipping_cost,
-            total=total,
-            shipping_full_name=request.POST.get('full_name', ''),
-            shipping_email=request.POST.get('email', ''),
-            shipping_phone=request.POST.get('phone', ''),
-            shipping_address_text=request.POST.get('street', ''),
-            shipping_city='Makassar',
-            shipping_postal_code=request.POST.get('postal_code', ''),
-            courier_service=service,
-            district_name=district_name,
-            eta=eta,
-            notes=request.POST.get('notes', ''),
-            shipping_service_name=service_label,
-        )
+    try:
+        with transaction.atomic():
+            order = create_order_from_checkout(
+                user=request.user,
+                cart=cart,
+                selected_items=selected_items,
+                selected_quantities=selected_quantities,
+                order_number=order_number,
+                subtotal=subtotal,
+                shipping_cost=shipping_cost,
+                total=total,
+                shipping_full_name=request.POST.get('full_name', ''),
+                shipping_email=request.POST.get('email', ''),
+                shipping_phone=request.POST.get('phone', ''),
+                shipping_address_text=request.POST.get('street', ''),
+                shipping_city='Makassar',
+                shipping_postal_code=request.POST.get('postal_code', ''),
+                courier_service=service,
+                district_name=district_name,
+                eta=eta,
+                notes=request.POST.get('notes', ''),
+                shipping_service_name=service_label,
+                unit_prices=unit_prices,
+            )
+    except FlashSaleHoldExpired as exc:
+        messages.error(request, str(exc))
+        return mark_failed(redirect('core:cart'))
 
     messages.success(request, f'Pesanan berhasil dibuat! Nomor pesanan: {order_number}')
     return redirect('core:order_detail', order_number=order_number)
 
 
 @login_required
+@idempotent('place_order')
 def place_order_from_address(request):
     """Place order from new multi-step checkout"""
     if request.method != 'POST':
@@ -801,7 +784,7 @@ def place_order_from_address(request):
 
     if not selected_items_qs.exists():
         messages.error(request, 'Pilih minimal 1 item untuk checkout.')
-        return redirect('core:cart')
+        return mark_failed(redirect('core:cart'))
 
     selected_items, selected_quantities = _prepare_selected_cart_items(selected_items_qs)
 
@@ -810,7 +793,7 @@ def place_order_from_address(request):
         quantity = selected_quantities.get(item.pk, item.quantity)
         if item.product.stock < quantity:
             messages.error(request, f'Stok {item.product.name} tidak mencukupi.')
-            return redirect('core:cart')
+            return mark_failed(redirect('core:cart'))
 
     # Get shipping data from POST
     address_id = request.POST.get('address_id')
@@ -829,45 +812,51 @@ def place_order_from_address(request):
         is_valid, error_message = validate_shipping_data(address.district.id, service)
         if not is_valid:
             messages.error(request, f'Data pengiriman tidak valid: {error_message}')
-            return redirect('core:checkout')
+            return mark_failed(redirect('core:checkout'))
 
         # Calculate shipping cost from database
-        subtotal = cart.get_selected_total()
+        unit_prices = {item.pk: item.get_unit_price() for item in cart.price_items(selected_items)}
+        subtotal = sum(unit_prices[item.pk] * item.quantity for item in selected_items)
         shipping_cost, eta, district_name = calculate_shipping_cost(
             address.district.id, service, subtotal
         )
 
     except Exception as e:
         messages.error(request, f'Terjadi kesalahan: {str(e)}')
-        return redirect('core:checkout')
+        return mark_failed(redirect('core:checkout'))
 
-    order_number = f'ORD-{uuid.uuid4().hex[:8].upper()}'
+    order_number = next_order_number('ORD')
     total = subtotal + shipping_cost
     service_label = 'Express' if str(service).upper() == 'EXP' else 'Reguler'
 
-    with transaction.atomic():
-        order = create_order_from_checkout(
-            user=request.user,
-            cart=cart,
-            selected_items=selected_items,
-            selected_quantities=selected_quantities,
-            order_number=order_number,
-            subtotal=subtotal,
-            shipping_cost=shipping_cost,
-            total=total,
-            shipping_full_name=address.full_name,
-            shipping_email=request.user.email,
-            shipping_phone=address.phone,
-            shipping_address_text=address.get_full_address(),
-            shipping_city=address.city,
-            shipping_postal_code=address.postal_code,
-            courier_service=service,
-            district_name=district_name,
-            eta=eta,
-            notes=request.POST.get('notes', ''),
-            shipping_address_obj=address,
-            shipping_service_name=service_label,
-        )
+    try:
+        with transaction.atomic():
+            order = create_order_from_checkout(
+                user=request.user,
+                cart=cart,
+                selected_items=selected_items,
+                selected_quantities=selected_quantities,
+                order_number=order_number,
+                subtotal=subtotal,
+                shipping_cost=shipping_cost,
+                total=total,
+                shipping_full_name=address.full_name,
+                shipping_email=request.user.email,
+                shipping_phone=address.phone,
+                shipping_address_text=address.get_full_address(),
+                shipping_city=address.city,
+                shipping_postal_code=address.postal_code,
+                courier_service=service,
+                district_name=district_name,
+                eta=eta,
+                notes=request.POST.get('notes', ''),
+                shipping_address_obj=address,
+                shipping_service_name=service_label,
+                unit_prices=unit_prices,
+            )
+    except FlashSaleHoldExpired as exc:
+        messages.error(request, str(exc))
+        return mark_failed(redirect('core:cart'))
 
     messages.success(request, f'Pesanan berhasil dibuat! Nomor pesanan: {order_number}')
     return redirect('core:order_detail', order_number=order_number)
@@ -1064,27 +1053,27 @@ def login_view(request):
             }
             return render(request, 'core/login.html', context)
 
-        # Try to find user by username or email
-        from django.contrib.auth.models import User
-        try:
-            if '@' in username_or_email:
-                user = User.objects.get(email=username_or_email)
-                username = user.username
-            else:
-                username = username_or_email
-        except User.DoesNotExist:
-            messages.error(request, 'Username atau email tidak ditemukan.')
+        # Every attempt counts per IP and per account; the account's attempt is
+        # refunded below when the password turns out to be right
+        attempted_at = time.time()
+        account = login_identity(username_or_email)
+        retry_after = max(
+            throttling.hit(throttling.LOGIN_PER_IP, throttling.get_client_ip(request)),
+            throttling.hit(throttling.LOGIN_PER_ACCOUNT, account, now=attempted_at),
+        )
+        if retry_after:
             context = {
                 'form': AuthenticationForm(),
                 'entered_username': entered_username,
                 'remember_me': remember_me,
             }
-            return render(request, 'core/login.html', context)
+            return _too_many_attempts(request, 'core/login.html', context, retry_after)
 
-        # Authenticate
-        user = authenticate(username=username, password=password)
+        # EmailOrUsernameBackend resolves either with one indexed lookup
+        user = authenticate(request, username=username_or_email, password=password)
 
         if user is not None:
+            throttling.refund(throttling.LOGIN_PER_ACCOUNT, account, attempted_at)
             login(request, user)
             if remember_me:
                 request.session.set_expiry(1209600)  # 2 weeks
@@ -1105,6 +1094,25 @@ def login_view(request):
     return render(request, 'core/login.html', context)
 
 
+def _too_many_attempts(request, template_name, context, retry_after):
+    """Render ``template_name`` as a 429 response with a ``Retry-After`` header."""
+    minutes = max(1, -(-retry_after // 60))
+    messages.error(request, f'Terlalu banyak percobaan. Silakan coba lagi dalam {minutes} menit.')
+    response = render(request, template_name, context, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def _verify_email_context(user_id):
+    from django.contrib.auth.models import User
+    user = User.objects.get(id=user_id)
+    masked_email = user.email[:3] + '***@' + user.email.split('@')[1]
+    return {
+        'masked_email': masked_email,
+        'is_registration': True,
+    }
+
+
 def verify_email_view(request):
     """Verify email with OTP code after registration"""
     # Check if there's a pending verification
@@ -1118,6 +1126,13 @@ def verify_email_view(request):
     if request.method == 'POST':
         code = request.POST.get('code', '').strip()
 
+        retry_after = throttling.check(
+            (throttling.OTP_VERIFY_PER_USER, user_id),
+            (throttling.OTP_PER_IP, throttling.get_client_ip(request)),
+        )
+        if retry_after:
+            return _too_many_attempts(request, 'core/verify_email.html', _verify_email_context(user_id), retry_after)
+
         try:
             verification = EmailVerification.objects.get(id=verification_id)
 
@@ -1152,16 +1167,7 @@ def verify_email_view(request):
             messages.error(request, 'Verifikasi tidak ditemukan. Silakan daftar kembali.')
             return redirect('core:register')
 
-    # Get user email for display
-    from django.contrib.auth.models import User
-    user = User.objects.get(id=user_id)
-    masked_email = user.email[:3] + '***@' + user.email.split('@')[1]
-
-    context = {
-        'masked_email': masked_email,
-        'is_registration': True,
-    }
-    return render(request, 'core/verify_email.html', context)
+    return render(request, 'core/verify_email.html', _verify_email_context(user_id))
 
 
 def resend_verification_code(request):
@@ -1175,8 +1181,17 @@ def resend_verification_code(request):
     from django.contrib.auth.models import User
     user = User.objects.get(id=user_id)
 
-    # Create new verification code
+    # Each resend writes a row and sends a mail, so cap it before doing either
     ip_address = request.META.get('REMOTE_ADDR')
+    retry_after = throttling.check(
+        (throttling.OTP_RESEND_PER_USER, user_id),
+        (throttling.OTP_RESEND_PER_USER, user.email),
+        (throttling.OTP_PER_IP, throttling.get_client_ip(request)),
+    )
+    if retry_after:
+        return _too_many_attempts(request, 'core/verify_email.html', _verify_email_context(user_id), retry_after)
+
+    # Create new verification code
     verification = EmailVerification.create_verification(user, ip_address)
 
     # Send email
@@ -1490,22 +1505,22 @@ def set_shipping_method(request):
         shipping_cost = Decimal(district.reg_cost or 0)
         eta = district.eta_reg
 
-    cart = Cart.objects.filter(user=request.user).first()
+    cart = Cart.objects.filter(user=request.user).order_by('-updated_at', '-id').first()
     if not cart:
         return JsonResponse({'success': False, 'message': 'Keranjang tidak ditemukan.'}, status=400)
 
-    subtotal = Decimal(cart.get_selected_total() or 0)
-    total = subtotal + shipping_cost
-
-    checkout_data = request.session.get('checkout', {})
+    checkout_data = get_checkout(request)
     checkout_data.update({
         'address_id': address.id,
         'shipping_method': method,
         'shipping_cost': str(shipping_cost),
         'eta': eta,
     })
-    request.session['checkout'] = checkout_data
-    request.session.modified = True
+    set_checkout(request, checkout_data)
+
+    quote = refresh_checkout_quote(request, cart)
+    subtotal = quote.subtotal
+    total = quote.total_before_discount
 
     return JsonResponse({
         'success': True,
@@ -2,6 +2,7 @@
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 load_dotenv()
 
 
@@ -89,6 +90,8 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    # Set flash sale aktif dibaca dari cache sekali per request
+    'catalog.middleware.ActiveFlashSalesMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -123,6 +126,35 @@ DATABASES = {
 }
 
 
+# Cache bersama untuk semua worker gunicorn: sesi, rate limit login/OTP, cache harga, flash sale
+# dan kode diskon. Isi CACHE_URL dengan redis://host:6379/1 atau memcached://host:11211 (butuh pymemcache).
+# Tanpa CACHE_URL setiap proses memakai LocMemCache sendiri (hanya cocok untuk satu proses).
+CACHE_URL = os.getenv('CACHE_URL', '')
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}}
+elif CACHE_URL.startswith('memcached://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': CACHE_URL.removeprefix('memcached://'),
+        }
+    }
+elif CACHE_URL:
+    raise ImproperlyConfigured(f'CACHE_URL tidak dikenal: {CACHE_URL} (gunakan redis:// atau memcached://)')
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+# Dengan cache bersama sesi dibaca dari cache dan disimpan ke cache + database; tanpa itu hanya
+# database, agar worker lain tidak membaca sesi basi. Kunci dan ukuran isinya dibatasi
+# (core.services.session_state.SESSION_SCHEMA). Hapus sesi kedaluwarsa: `manage.py purge_expired_sessions`
+SESSION_ENGINE = 'core.sessions' if CACHE_URL else 'core.sessions.db'
+
+
+# Login dengan username atau email (pencarian email memakai indeks LOWER(email))
+AUTHENTICATION_BACKENDS = ['core.backends.EmailOrUsernameBackend']
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -165,6 +197,47 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Pengiriman file media: "nginx" (X-Accel-Redirect ke MEDIA_ACCEL_PREFIX yang
+# di-set `internal` di nginx), "sendfile" (X-Sendfile Apache), atau kosong untuk FileResponse
+MEDIA_ACCEL_BACKEND = os.getenv('MEDIA_ACCEL_BACKEND', '')
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+# max-age untuk media tanpa hash konten; URL ber-hash (?v=) selalu immutable 1 tahun
+MEDIA_CACHE_MAX_AGE = int(os.getenv('MEDIA_CACHE_MAX_AGE', 3600))
+
+# Jumlah dilihat produk ditampung per proses lalu ditulis ke ProductStats tiap N detik
+PRODUCT_VIEW_FLUSH_INTERVAL = float(os.getenv('PRODUCT_VIEW_FLUSH_INTERVAL', 5))
+# Skor trending (`manage.py refresh_trending_products`): waktu paruh dan bobot 1 unit terjual vs 1 kali dilihat
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 72))
+TRENDING_SALES_WEIGHT = float(os.getenv('TRENDING_SALES_WEIGHT', 5))
+
+# Dashboard admin: umur cache KPI (detik) dan batas stok yang dianggap menipis
+ADMIN_DASHBOARD_CACHE_TTL = int(os.getenv('ADMIN_DASHBOARD_CACHE_TTL', 60))
+LOW_STOCK_THRESHOLD = int(os.getenv('LOW_STOCK_THRESHOLD', 5))
+
+# Lama (menit) satu unit flash sale ditahan untuk pembeli sebelum dilepas jika belum jadi pesanan
+FLASH_SALE_HOLD_MINUTES = int(os.getenv('FLASH_SALE_HOLD_MINUTES', 15))
+# Umur cache (detik) kode diskon yang sudah dicari; disimpan/dihapus lewat admin langsung dibuang dari cache
+DISCOUNT_CODE_CACHE_TTL = int(os.getenv('DISCOUNT_CODE_CACHE_TTL', 60))
+# Umur maksimum (detik) ringkasan harga checkout di sesi sebelum dihitung ulang walau keranjang tidak berubah
+CHECKOUT_QUOTE_TTL = int(os.getenv('CHECKOUT_QUOTE_TTL', 300))
+# Lama (menit) kunci idempotensi pembuatan pesanan disimpan; permintaan ulang dengan kunci yang sama mendapat respons pertama
+IDEMPOTENCY_KEY_TTL_MINUTES = int(os.getenv('IDEMPOTENCY_KEY_TTL_MINUTES', 60))
+# Lama (detik) permintaan kedua dengan kunci yang sama menunggu respons permintaan pertama sebelum mendapat 409
+IDEMPOTENCY_WAIT_SECONDS = int(os.getenv('IDEMPOTENCY_WAIT_SECONDS', 10))
+# Lama (detik) kunci yang sedang diproses tetap terkunci bila prosesnya mati sebelum menyimpan respons
+IDEMPOTENCY_CLAIM_SECONDS = int(os.getenv('IDEMPOTENCY_CLAIM_SECONDS', 120))
+# Jumlah nomor pesanan yang dipesan sekaligus oleh setiap proses (satu query per blok)
+ORDER_NUMBER_BLOCK_SIZE = int(os.getenv('ORDER_NUMBER_BLOCK_SIZE', 50))
+
+# Batas percobaan login (per 5 menit) dan OTP verifikasi email (per 10 menit); lewat batas dijawab HTTP 429
+LOGIN_RATE_LIMIT_PER_IP = int(os.getenv('LOGIN_RATE_LIMIT_PER_IP', 20))
+LOGIN_RATE_LIMIT_PER_ACCOUNT = int(os.getenv('LOGIN_RATE_LIMIT_PER_ACCOUNT', 5))
+OTP_VERIFY_RATE_LIMIT = int(os.getenv('OTP_VERIFY_RATE_LIMIT', 5))
+OTP_RESEND_RATE_LIMIT = int(os.getenv('OTP_RESEND_RATE_LIMIT', 3))
+OTP_RATE_LIMIT_PER_IP = int(os.getenv('OTP_RATE_LIMIT_PER_IP', 20))
+# Aktifkan hanya di belakang reverse proxy tepercaya: IP klien dibaca dari X-Forwarded-For
+USE_X_FORWARDED_FOR = os.getenv('USE_X_FORWARDED_FOR', 'False') == 'True'
+
 # Storage untuk Whitenoise (compress + hash)
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
@@ -206,6 +279,10 @@ SERVER_EMAIL = DEFAULT_FROM_EMAIL
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 
 
+# Fake payment gateway (`manage.py fake_payment_gateway`) untuk load/integration test.
+# Jika diisi, Midtrans dan DOKU diarahkan ke server ini kecuali URL spesifik di-set.
+PAYMENT_GATEWAY_STUB_URL = os.getenv('PAYMENT_GATEWAY_STUB_URL', '').rstrip('/')
+
 # Midtrans configuration
 MIDTRANS_IS_PRODUCTION = os.getenv('MIDTRANS_IS_PRODUCTION', 'False') == 'True'
 MIDTRANS_SERVER_KEY = os.getenv('MIDTRANS_SERVER_KEY', '')
@@ -216,6 +293,18 @@ MIDTRANS_SNAP_JS_URL = (
     else "https://app.sandbox.midtrans.com/snap/snap.js"
 )
 MIDTRANS_PAYMENT_METHOD_SLUG = os.getenv('MIDTRANS_PAYMENT_METHOD_SLUG', 'midtrans').strip().lower()
+# Kosongkan untuk memakai endpoint resmi (sandbox/production)
+MIDTRANS_API_BASE_URL = os.getenv('MIDTRANS_API_BASE_URL', PAYMENT_GATEWAY_STUB_URL)
+MIDTRANS_SNAP_BASE_URL = os.getenv(
+    'MIDTRANS_SNAP_BASE_URL',
+    f'{PAYMENT_GATEWAY_STUB_URL}/snap/v1' if PAYMENT_GATEWAY_STUB_URL else '',
+)
+# Status lookup tuning: cache TTL (detik), timeout (connect, read) dan retry dengan backoff
+MIDTRANS_STATUS_CACHE_TTL = int(os.getenv('MIDTRANS_STATUS_CACHE_TTL', 10))
+MIDTRANS_HTTP_TIMEOUT = (3.05, float(os.getenv('MIDTRANS_HTTP_READ_TIMEOUT', 10)))
+MIDTRANS_HTTP_MAX_RETRIES = int(os.getenv('MIDTRANS_HTTP_MAX_RETRIES', 2))
+MIDTRANS_HTTP_BACKOFF_FACTOR = float(os.getenv('MIDTRANS_HTTP_BACKOFF_FACTOR', 0.3))
+MIDTRANS_HTTP_POOL_SIZE = int(os.getenv('MIDTRANS_HTTP_POOL_SIZE', 10))
 
 # DOKU configuration
 DOKU_IS_PRODUCTION = os.getenv('DOKU_IS_PRODUCTION', 'False') == 'True'
@@ -223,8 +312,12 @@ DOKU_CLIENT_ID = os.getenv('DOKU_CLIENT_ID', '')
 DOKU_SECRET_KEY = os.getenv('DOKU_SECRET_KEY', '')
 DOKU_MERCHANT_CODE = os.getenv('DOKU_MERCHANT_CODE', '')
 DOKU_PAYMENT_METHOD_SLUG = os.getenv('DOKU_PAYMENT_METHOD_SLUG', 'doku').strip().lower()
-DOKU_SANDBOX_BASE_URL = os.getenv('DOKU_SANDBOX_BASE_URL', 'https://api-sandbox.doku.com')
-DOKU_PRODUCTION_BASE_URL = os.getenv('DOKU_PRODUCTION_BASE_URL', 'https://api.doku.com')
+DOKU_SANDBOX_BASE_URL = os.getenv('DOKU_SANDBOX_BASE_URL', PAYMENT_GATEWAY_STUB_URL or 'https://api-sandbox.doku.com')
+DOKU_PRODUCTION_BASE_URL = os.getenv('DOKU_PRODUCTION_BASE_URL', PAYMENT_GATEWAY_STUB_URL or 'https://api.doku.com')
+
+# Payment notification inbox: "thread" (drainer per proses web), "inline", atau
+# "worker" (hanya diproses oleh `manage.py process_payment_events`)
+PAYMENT_EVENTS_DISPATCH = os.getenv('PAYMENT_EVENTS_DISPATCH', 'thread')
 
 
 # Jazzmin settings
@@ -249,6 +342,7 @@ JAZZMIN_SETTINGS = {
         "core.Order": "fas fa-receipt",
         "core.UserProfile": "fas fa-user-circle",
         "core.Watchlist": "fas fa-heart",
+        "payment.PaymentEvent": "fas fa-inbox",
     },
 
     "show_sidebar": True,
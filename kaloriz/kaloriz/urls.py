@@ -1,11 +1,12 @@
 from django.contrib import admin
 from django.contrib.sitemaps.views import sitemap
 from django.http import HttpResponse
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
 from catalog.sitemaps import CategorySitemap, ProductSitemap, StaticViewSitemap
+from core.media import serve_media
 
 
 sitemaps = {
@@ -31,4 +32,7 @@ urlpatterns = [
 
 # SELALU tambahkan static & media (tidak pakai if settings.DEBUG)
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Media dilayani lewat X-Accel-Redirect/X-Sendfile atau FileResponse (lihat core.media)
+urlpatterns += [
+    re_path(rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.*)$", serve_media, name="media"),
+]
@@ -0,0 +1,18 @@
+from django.contrib import admin
+
+from .models import PaymentEvent
+
+
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(admin.ModelAdmin):
+    list_display = ['order_number', 'gateway', 'raw_status', 'status', 'outcome', 'received_at', 'processed_at']
+    list_filter = ['gateway', 'status', 'outcome', 'received_at']
+    search_fields = ['order_number', 'gateway_order_id', 'event_id']
+    readonly_fields = [field.name for field in PaymentEvent._meta.fields]
+    date_hierarchy = 'received_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
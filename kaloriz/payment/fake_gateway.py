@@ -0,0 +1,342 @@
+"""In-process fake of the Midtrans and DOKU endpoints used by checkout.
+
+Point ``PAYMENT_GATEWAY_STUB_URL`` at a running :class:`FakePaymentGateway`
+(``manage.py fake_payment_gateway``) to drive checkout → pay → notify cycles
+offline. Supported endpoints:
+
+* ``POST /snap/v1/transactions`` – Snap ``create_transaction``
+* ``GET /v2/<order_id>/status`` – Midtrans transaction status
+* ``POST /checkout/v1/payment`` – DOKU checkout session
+* ``POST /_fake/pay/<order_id>`` – settle (or fail) a transaction and send
+  the gateway notification callback. Midtrans callbacks are signed with
+  ``server_key`` and go to ``payment:midtrans_notification``; DOKU callbacks
+  go to ``payment:doku_notification``.
+* ``GET /_fake/transactions`` – dump every known transaction
+
+Latency, jitter, injected error rate and automatic payment are configured
+through :class:`FakeGatewayConfig`.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import parse as urllib_parse
+from urllib import request as urllib_request
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+GATEWAY_MIDTRANS = "midtrans"
+GATEWAY_DOKU = "doku"
+
+# Final statuses are given in Midtrans terms and translated for DOKU callbacks.
+_DOKU_STATUS_BY_MIDTRANS = {
+    "capture": "SUCCESS",
+    "settlement": "SUCCESS",
+    "pending": "PENDING",
+    "deny": "FAILED",
+    "cancel": "FAILED",
+    "failure": "FAILED",
+    "expire": "EXPIRED",
+}
+
+
+@dataclass
+class FakeGatewayConfig:
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    auto_pay_after: float | None = None
+    final_status: str = "settlement"
+    midtrans_notify_url: str = ""
+    doku_notify_url: str = ""
+    server_key: str = ""
+    seed: int | None = None
+
+
+class FakePaymentGateway:
+    """Threaded HTTP server emulating the gateway endpoints."""
+
+    def __init__(self, config: FakeGatewayConfig | None = None, *, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeGatewayConfig()
+        self.transactions: dict[str, dict] = {}
+        self.notifications: list[dict] = []
+        self.stats = {"requests": 0, "errors_injected": 0, "notifications_sent": 0, "notifications_failed": 0}
+        self._lock = threading.Lock()
+        self._random = random.Random(self.config.seed)
+        self._server = ThreadingHTTPServer((host, port), _FakeGatewayHandler)
+        self._server.daemon_threads = True
+        self._server.gateway = self
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakePaymentGateway":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-gateway", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FakePaymentGateway":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    # Behaviour knobs -----------------------------------------------------
+
+    def _simulate_latency(self) -> None:
+        with self._lock:
+            delay = self.config.latency + self._random.uniform(0, self.config.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            self.stats["requests"] += 1
+            failed = self.config.error_rate > 0 and self._random.random() < self.config.error_rate
+            if failed:
+                self.stats["errors_injected"] += 1
+        return failed
+
+    # Transactions --------------------------------------------------------
+
+    def create_transaction(self, gateway: str, order_id: str, gross_amount) -> dict | None:
+        """Register a pending transaction, or return ``None`` if ``order_id`` is missing or taken."""
+
+        with self._lock:
+            if not order_id or order_id in self.transactions:
+                return None
+            transaction = {
+                "gateway": gateway,
+                "order_id": order_id,
+                "gross_amount": str(gross_amount or "0"),
+                "token": uuid.uuid4().hex,
+                "transaction_id": str(uuid.uuid4()),
+                "transaction_status": "pending",
+                "transaction_time": timezone.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            self.transactions[order_id] = transaction
+
+        if self.config.auto_pay_after is not None:
+            timer = threading.Timer(self.config.auto_pay_after, self.pay, args=(order_id,))
+            timer.daemon = True
+            timer.start()
+        return dict(transaction)
+
+    def get_transaction(self, order_id: str) -> dict | None:
+        with self._lock:
+            transaction = self.transactions.get(order_id)
+            return dict(transaction) if transaction else None
+
+    def pay(self, order_id: str, status: str | None = None) -> dict | None:
+        """Move a transaction to its final status and send the notification callback."""
+
+        status = (status or self.config.final_status).lower()
+        with self._lock:
+            transaction = self.transactions.get(order_id)
+            if transaction is None:
+                return None
+            transaction["transaction_status"] = status
+            transaction["settlement_time"] = timezone.now().strftime("%Y-%m-%d %H:%M:%S")
+            snapshot = dict(transaction)
+
+        self._send_notification(snapshot)
+        return snapshot
+
+    def midtrans_status_payload(self, transaction: dict) -> dict:
+        status = transaction["transaction_status"]
+        return {
+            "status_code": "201" if status == "pending" else "200",
+            "status_message": "Success, transaction is found",
+            "transaction_id": transaction["transaction_id"],
+            "order_id": transaction["order_id"],
+            "gross_amount": transaction["gross_amount"],
+            "currency": "IDR",
+            "payment_type": "bank_transfer",
+            "transaction_time": transaction["transaction_time"],
+            "transaction_status": status,
+            "fraud_status": "accept",
+        }
+
+    def _midtrans_notification_payload(self, transaction: dict) -> dict:
+        payload = self.midtrans_status_payload(transaction)
+        raw = f"{payload['order_id']}{payload['status_code']}{payload['gross_amount']}{self.config.server_key}"
+        payload["signature_key"] = hashlib.sha512(raw.encode("utf-8")).hexdigest()
+        return payload
+
+    def _doku_notification_payload(self, transaction: dict) -> dict:
+        return {
+            "order": {"invoice_number": transaction["order_id"], "amount": transaction["gross_amount"]},
+            "transaction": {
+                "status": _DOKU_STATUS_BY_MIDTRANS.get(transaction["transaction_status"], "FAILED"),
+                "date": transaction.get("settlement_time", ""),
+            },
+        }
+
+    def _send_notification(self, transaction: dict) -> None:
+        if transaction["gateway"] == GATEWAY_DOKU:
+            url = self.config.doku_notify_url
+            payload = self._doku_notification_payload(transaction)
+        else:
+            url = self.config.midtrans_notify_url
+            payload = self._midtrans_notification_payload(transaction)
+
+        with self._lock:
+            self.notifications.append({"url": url, "payload": payload})
+        if not url:
+            return
+
+        request_obj = urllib_request.Request(
+            url,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib_request.urlopen(request_obj, timeout=10):
+                pass
+        except OSError as exc:
+            logger.warning("Fake gateway notification to %s failed: %s", url, exc)
+            stat = "notifications_failed"
+        else:
+            stat = "notifications_sent"
+        with self._lock:
+            self.stats[stat] += 1
+
+
+class _FakeGatewayHandler(BaseHTTPRequestHandler):
+    server_version = "FakePaymentGateway/1.0"
+
+    @property
+    def gateway(self) -> FakePaymentGateway:
+        return self.server.gateway
+
+    def log_message(self, format, *args):  # noqa: A002 - signature from BaseHTTPRequestHandler
+        logger.debug("fake gateway: " + format, *args)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return {}
+
+    def _send_json(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _gateway_call(self) -> bool:
+        """Apply latency and error injection; return ``False`` if an error was sent."""
+
+        self.gateway._simulate_latency()
+        if self.gateway._should_fail():
+            self._send_json(500, {"status_code": "500", "status_message": "Fake gateway error"})
+            return False
+        return True
+
+    def do_GET(self):
+        path = urllib_parse.urlsplit(self.path).path.rstrip("/")
+        parts = path.split("/")
+
+        if path == "/_fake/transactions":
+            with self.gateway._lock:
+                self._send_json(200, list(self.gateway.transactions.values()))
+            return
+
+        if len(parts) == 4 and parts[1] == "v2" and parts[3] == "status":
+            if not self._gateway_call():
+                return
+            order_id = urllib_parse.unquote(parts[2])
+            transaction = self.gateway.get_transaction(order_id)
+            if transaction is None:
+                self._send_json(404, {"status_code": "404", "status_message": "Transaction doesn't exist."})
+                return
+            self._send_json(200, self.gateway.midtrans_status_payload(transaction))
+            return
+
+        self._send_json(404, {"message": "Not found"})
+
+    def do_POST(self):
+        path = urllib_parse.urlsplit(self.path).path.rstrip("/")
+        payload = self._read_json()
+
+        if path.startswith("/_fake/pay/"):
+            order_id = urllib_parse.unquote(path[len("/_fake/pay/"):])
+            transaction = self.gateway.pay(order_id, payload.get("status"))
+            if transaction is None:
+                self._send_json(404, {"message": "Transaction not found"})
+            else:
+                self._send_json(200, transaction)
+            return
+
+        if path == "/snap/v1/transactions":
+            if not self._gateway_call():
+                return
+            details = payload.get("transaction_details") or {}
+            transaction = self.gateway.create_transaction(
+                GATEWAY_MIDTRANS, str(details.get("order_id") or ""), details.get("gross_amount")
+            )
+            if transaction is None:
+                self._send_json(400, {"error_messages": ["transaction_details.order_id sudah digunakan"]})
+                return
+            self._send_json(
+                201,
+                {
+                    "token": transaction["token"],
+                    "redirect_url": f"{self.gateway.url}/snap/v2/vtweb/{transaction['token']}",
+                },
+            )
+            return
+
+        if path == "/checkout/v1/payment":
+            if not self._gateway_call():
+                return
+            order = payload.get("order") or {}
+            transaction = self.gateway.create_transaction(
+                GATEWAY_DOKU, str(order.get("invoice_number") or ""), order.get("amount")
+            )
+            if transaction is None:
+                self._send_json(400, {"message": ["Invoice number sudah digunakan"]})
+                return
+            self._send_json(
+                200,
+                {
+                    "message": ["SUCCESS"],
+                    "response": {
+                        "order": order,
+                        "payment": {
+                            "token_id": transaction["token"],
+                            "url": f"{self.gateway.url}/checkout/link/{transaction['token']}",
+                        },
+                    },
+                },
+            )
+            return
+
+        self._send_json(404, {"message": "Not found"})
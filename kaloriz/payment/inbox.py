@@ -0,0 +1,277 @@
+"""Idempotent inbox for gateway payment notifications.
+
+Views only append a :class:`PaymentEvent` and return immediately. Events are
+applied later in arrival order per order by :func:`process_pending_payment_events`,
+which skips duplicates and out-of-order downgrades and batches the resulting
+order updates, stock restores and notifications.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import Notification, Order
+from core.services.orders import (
+    TRANSITION_APPLIED,
+    compare_and_set_order_status,
+    restore_stock_for_orders,
+)
+from payment.models import PaymentEvent
+
+logger = logging.getLogger(__name__)
+
+MIDTRANS_STATUS_MAP = {
+    "capture": "paid",
+    "settlement": "paid",
+    "pending": "pending",
+    "deny": "cancelled",
+    "cancel": "cancelled",
+    "expire": "cancelled",
+    "failure": "cancelled",
+}
+
+DOKU_STATUS_MAP = {
+    "SUCCESS": "paid",
+    "COMPLETED": "paid",
+    "PAID": "paid",
+    "PENDING": "pending",
+    "WAITING": "pending",
+    "IN_PROGRESS": "pending",
+    "FAILED": "cancelled",
+    "CANCELLED": "cancelled",
+    "EXPIRED": "cancelled",
+    "VOID": "cancelled",
+}
+
+# Gateway events may only move an order out of ``pending``; the later
+# fulfilment steps in ``Order.STATUS_TRANSITIONS`` belong to staff.
+_GATEWAY_TRANSITIONS = {
+    "pending": Order.STATUS_TRANSITIONS["pending"],
+}
+
+_drain_wakeup = threading.Event()
+_drain_thread: threading.Thread | None = None
+_drain_thread_lock = threading.Lock()
+
+
+def _payload_digest(payload: dict) -> str:
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def build_event_id(gateway: str, payload: dict, raw_status: str) -> str:
+    """Return a key that stays stable across gateway retries of one notification."""
+
+    if gateway == PaymentEvent.GATEWAY_MIDTRANS:
+        transaction_id = payload.get("transaction_id")
+        if transaction_id:
+            return f"{transaction_id}:{raw_status}"[:128]
+    return _payload_digest(payload)
+
+
+def build_payment_event(
+    *,
+    gateway: str,
+    order_number: str,
+    gateway_order_id: str,
+    raw_status: str,
+    payload: dict,
+) -> PaymentEvent:
+    """Return an unsaved inbox event with its status normalized."""
+
+    raw_status = (raw_status or "").strip()
+    if gateway == PaymentEvent.GATEWAY_DOKU:
+        status = DOKU_STATUS_MAP.get(raw_status.upper(), "")
+    else:
+        status = MIDTRANS_STATUS_MAP.get(raw_status.lower(), "")
+
+    return PaymentEvent(
+        gateway=gateway,
+        event_id=build_event_id(gateway, payload, raw_status),
+        order_number=order_number,
+        gateway_order_id=(gateway_order_id or "")[:100],
+        raw_status=raw_status[:50],
+        status=status,
+        payload=payload,
+    )
+
+
+def record_payment_event(
+    *,
+    gateway: str,
+    order_number: str,
+    gateway_order_id: str,
+    raw_status: str,
+    payload: dict,
+) -> None:
+    """Append a gateway notification to the inbox, ignoring exact duplicates."""
+
+    event = build_payment_event(
+        gateway=gateway,
+        order_number=order_number,
+        gateway_order_id=gateway_order_id,
+        raw_status=raw_status,
+        payload=payload,
+    )
+    PaymentEvent.objects.bulk_create([event], ignore_conflicts=True)
+    transaction.on_commit(schedule_payment_event_processing)
+
+
+def process_pending_payment_events(*, batch_size: int = 200, event_ids=None) -> dict[str, int]:
+    """Apply one batch of unprocessed events and return a count per outcome.
+
+    ``event_ids`` limits the batch to those events instead of the whole inbox.
+    """
+
+    with transaction.atomic():
+        pending = PaymentEvent.objects.select_for_update(skip_locked=True).filter(processed_at__isnull=True)
+        if event_ids is not None:
+            pending = pending.filter(pk__in=event_ids)
+        events = list(pending.order_by("id")[:batch_size])
+        if not events:
+            return {}
+
+        orders = {
+            order.order_number: order
+            for order in Order.objects.select_for_update().filter(
+                order_number__in={event.order_number for event in events}
+            )
+        }
+        current_status = {number: order.status for number, order in orders.items()}
+        outcomes: dict[str, list[int]] = defaultdict(list)
+
+        for event in events:
+            order_status = current_status.get(event.order_number)
+            if order_status is None:
+                outcome = PaymentEvent.OUTCOME_MISSING_ORDER
+            elif not event.status:
+                outcome = PaymentEvent.OUTCOME_IGNORED
+            elif event.status == order_status:
+                outcome = PaymentEvent.OUTCOME_DUPLICATE
+            elif event.status in _GATEWAY_TRANSITIONS.get(order_status, ()):
+                current_status[event.order_number] = event.status
+                outcome = PaymentEvent.OUTCOME_APPLIED
+            else:
+                outcome = PaymentEvent.OUTCOME_STALE
+                if order_status == "cancelled" and event.status == "paid":
+                    logger.warning(
+                        "Payment for cancelled order %s received from %s",
+                        event.order_number,
+                        event.gateway,
+                    )
+            outcomes[outcome].append(event.pk)
+
+        changed_orders = [
+            order for number, order in orders.items() if current_status[number] != order.status
+        ]
+        _apply_status_changes(changed_orders, current_status)
+
+        now = timezone.now()
+        for outcome, pks in outcomes.items():
+            PaymentEvent.objects.filter(pk__in=pks).update(processed_at=now, outcome=outcome)
+
+    return {outcome: len(pks) for outcome, pks in outcomes.items()}
+
+
+def _apply_status_changes(orders: list[Order], target_status: dict[str, str]) -> None:
+    if not orders:
+        return
+
+    now = timezone.now()
+    by_status: dict[str, list[Order]] = defaultdict(list)
+    for order in orders:
+        by_status[target_status[order.order_number]].append(order)
+
+    changed: list[Order] = []
+    for status, status_orders in by_status.items():
+        if status == "cancelled":
+            continue
+        # Leaving ``pending`` is one-way, so the status guard alone cannot ABA.
+        order_ids = [order.pk for order in status_orders]
+        updated = Order.objects.filter(pk__in=order_ids, status="pending").update(
+            status=status,
+            version=F("version") + 1,
+            midtrans_token="",
+            paid_at=now if status == "paid" else None,
+            updated_at=now,
+        )
+        if not updated:
+            continue
+        # Only the rows this update moved carry its timestamp; notify just those.
+        moved = set(
+            Order.objects.filter(pk__in=order_ids, status=status, updated_at=now).values_list("pk", flat=True)
+        )
+        for order in status_orders:
+            if order.pk in moved:
+                order.status = status
+                order.version += 1
+                changed.append(order)
+
+    # Stock is only returned for orders this worker actually moved to cancelled.
+    cancelled = [
+        order
+        for order in by_status.get("cancelled", [])
+        if compare_and_set_order_status(order, "cancelled", midtrans_token="") == TRANSITION_APPLIED
+    ]
+    if cancelled:
+        restore_stock_for_orders([order.pk for order in cancelled])
+    changed.extend(cancelled)
+
+    Notification.objects.bulk_create([Notification.for_order_status(order) for order in changed])
+
+
+def drain_payment_events(*, batch_size: int = 200, event_ids=None) -> dict[str, int]:
+    """Process batches until the inbox (or ``event_ids``) is empty and return the combined counts."""
+
+    totals: dict[str, int] = defaultdict(int)
+    while True:
+        counts = process_pending_payment_events(batch_size=batch_size, event_ids=event_ids)
+        if not counts:
+            return dict(totals)
+        for outcome, count in counts.items():
+            totals[outcome] += count
+
+
+def _drain_loop() -> None:
+    while True:
+        _drain_wakeup.wait()
+        _drain_wakeup.clear()
+        close_old_connections()
+        try:
+            drain_payment_events()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to process payment events")
+        finally:
+            close_old_connections()
+
+
+def schedule_payment_event_processing() -> None:
+    """Kick off inbox processing according to ``PAYMENT_EVENTS_DISPATCH``.
+
+    ``thread`` wakes a per-process background drainer, ``inline`` drains
+    synchronously (tests, local development) and ``worker`` leaves the inbox
+    to ``manage.py process_payment_events``.
+    """
+
+    global _drain_thread
+
+    mode = getattr(settings, "PAYMENT_EVENTS_DISPATCH", "thread")
+    if mode == "inline":
+        drain_payment_events()
+        return
+    if mode != "thread":
+        return
+
+    with _drain_thread_lock:
+        if _drain_thread is None or not _drain_thread.is_alive():
+            _drain_thread = threading.Thread(target=_drain_loop, name="payment-events", daemon=True)
+            _drain_thread.start()
+    _drain_wakeup.set()
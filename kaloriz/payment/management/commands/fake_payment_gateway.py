@@ -0,0 +1,62 @@
+"""
+Management command untuk menjalankan fake gateway Midtrans/DOKU secara lokal.
+
+Usage:
+    python manage.py fake_payment_gateway --port 8765
+    python manage.py fake_payment_gateway --latency 0.2 --jitter 0.1 --error-rate 0.05 --auto-pay 2 \\
+        --midtrans-notify-url http://127.0.0.1:8000/payment/midtrans/notification/ \\
+        --doku-notify-url http://127.0.0.1:8000/payment/doku/notification/
+
+Notifikasi Midtrans ditandatangani dengan MIDTRANS_SERVER_KEY (atau --server-key),
+jadi nilainya harus sama dengan server Django.
+
+Lalu jalankan server Django dengan PAYMENT_GATEWAY_STUB_URL=http://127.0.0.1:8765
+agar Snap, status Midtrans dan checkout DOKU diarahkan ke fake gateway.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from payment.fake_gateway import FakeGatewayConfig, FakePaymentGateway
+
+
+class Command(BaseCommand):
+    help = 'Jalankan fake gateway Midtrans/DOKU untuk load test dan integration test offline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Alamat bind server')
+        parser.add_argument('--port', type=int, default=8765, help='Port server')
+        parser.add_argument('--latency', type=float, default=0.0, help='Latensi dasar per request (detik)')
+        parser.add_argument('--jitter', type=float, default=0.0, help='Tambahan latensi acak maksimum (detik)')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Peluang respons 500 (0-1)')
+        parser.add_argument('--auto-pay', type=float, default=None, help='Bayar otomatis setelah N detik')
+        parser.add_argument('--final-status', default='settlement', help='Status akhir (istilah Midtrans)')
+        parser.add_argument('--midtrans-notify-url', default='', help='URL notifikasi HTTP Midtrans')
+        parser.add_argument('--doku-notify-url', default='', help='URL notifikasi DOKU')
+        parser.add_argument(
+            '--server-key', default=None, help='Server key untuk signature notifikasi Midtrans (default: MIDTRANS_SERVER_KEY)'
+        )
+        parser.add_argument('--seed', type=int, default=None, help='Seed random untuk hasil yang dapat diulang')
+
+    def handle(self, *args, **options):
+        config = FakeGatewayConfig(
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            auto_pay_after=options['auto_pay'],
+            final_status=options['final_status'],
+            midtrans_notify_url=options['midtrans_notify_url'],
+            doku_notify_url=options['doku_notify_url'],
+            server_key=settings.MIDTRANS_SERVER_KEY if options['server_key'] is None else options['server_key'],
+            seed=options['seed'],
+        )
+        gateway = FakePaymentGateway(config, host=options['host'], port=options['port'])
+
+        self.stdout.write(self.style.SUCCESS(f'Fake payment gateway berjalan di {gateway.url}'))
+        self.stdout.write(f'Set PAYMENT_GATEWAY_STUB_URL={gateway.url} pada server Django.')
+        try:
+            gateway.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stdout.write(f'Statistik: {gateway.stats}')
@@ -0,0 +1,38 @@
+"""
+Management command untuk memproses inbox notifikasi pembayaran (PaymentEvent).
+
+Usage:
+    python manage.py process_payment_events
+    python manage.py process_payment_events --loop --interval 2
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from payment.inbox import drain_payment_events
+
+
+class Command(BaseCommand):
+    help = 'Terapkan notifikasi pembayaran yang tertunda ke status pesanan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Jumlah event per transaksi')
+        parser.add_argument('--loop', action='store_true', help='Terus berjalan sebagai worker')
+        parser.add_argument('--interval', type=float, default=2.0, help='Jeda (detik) saat inbox kosong')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        while True:
+            counts = drain_payment_events(batch_size=batch_size)
+            if counts:
+                summary = ', '.join(f'{outcome}: {count}' for outcome, count in sorted(counts.items()))
+                self.stdout.write(self.style.SUCCESS(f'Processed {sum(counts.values())} events ({summary})'))
+            elif not options['loop']:
+                self.stdout.write('Tidak ada event pembayaran yang tertunda.')
+
+            if not options['loop']:
+                break
+            if not counts:
+                time.sleep(options['interval'])
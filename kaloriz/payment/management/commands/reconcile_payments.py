@@ -0,0 +1,39 @@
+"""
+Management command untuk mencocokkan pesanan pending dengan status Midtrans.
+
+Usage:
+    python manage.py reconcile_payments
+    python manage.py reconcile_payments --workers 16 --rate 30 --min-age 15
+"""
+
+from django.core.management.base import BaseCommand
+
+from payment.reconciliation import reconcile_pending_orders
+
+
+class Command(BaseCommand):
+    help = 'Cek status Midtrans untuk pesanan pending secara paralel dan terapkan hasilnya'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Jumlah request paralel ke Midtrans')
+        parser.add_argument('--rate', type=float, default=20.0, help='Batas request per detik (0 = tanpa batas)')
+        parser.add_argument('--batch-size', type=int, default=100, help='Jumlah event per transaksi')
+        parser.add_argument('--min-age', type=int, default=0, help='Hanya pesanan yang lebih tua dari N menit')
+        parser.add_argument('--limit', type=int, default=None, help='Maksimum pesanan yang dicek')
+
+    def handle(self, *args, **options):
+        report = reconcile_pending_orders(
+            workers=options['workers'],
+            rate=options['rate'],
+            batch_size=options['batch_size'],
+            min_age_minutes=options['min_age'],
+            limit=options['limit'],
+        )
+
+        summary = ', '.join(f'{outcome}: {count}' for outcome, count in sorted(report.outcomes.items()))
+        self.stdout.write(
+            f'Dicek {report.checked} pesanan dalam {report.elapsed:.2f}s '
+            f'({report.throughput:.1f} pesanan/detik); '
+            f'masih pending: {report.still_pending}, tidak ditemukan: {report.not_found}'
+        )
+        self.stdout.write(self.style.SUCCESS(f'Queued {report.queued} events ({summary or "-"})'))
@@ -0,0 +1,109 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="PaymentEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "gateway",
+                    models.CharField(
+                        choices=[("midtrans", "Midtrans"), ("doku", "DOKU")],
+                        max_length=20,
+                        verbose_name="Gateway",
+                    ),
+                ),
+                ("event_id", models.CharField(max_length=128, verbose_name="ID Event")),
+                (
+                    "order_number",
+                    models.CharField(
+                        db_index=True, max_length=100, verbose_name="Nomor Pesanan"
+                    ),
+                ),
+                (
+                    "gateway_order_id",
+                    models.CharField(
+                        blank=True, max_length=100, verbose_name="Order ID Gateway"
+                    ),
+                ),
+                (
+                    "raw_status",
+                    models.CharField(
+                        blank=True, max_length=50, verbose_name="Status Gateway"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        blank=True,
+                        help_text="Status pesanan hasil normalisasi (paid/pending/cancelled)",
+                        max_length=20,
+                        verbose_name="Status Pesanan",
+                    ),
+                ),
+                (
+                    "payload",
+                    models.JSONField(blank=True, default=dict, verbose_name="Payload"),
+                ),
+                (
+                    "received_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Diterima"),
+                ),
+                (
+                    "processed_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Diproses"
+                    ),
+                ),
+                (
+                    "outcome",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("applied", "Diterapkan"),
+                            ("duplicate", "Duplikat"),
+                            ("stale", "Kedaluwarsa / Urutan Salah"),
+                            ("ignored", "Diabaikan"),
+                            ("missing_order", "Pesanan Tidak Ditemukan"),
+                        ],
+                        max_length=20,
+                        verbose_name="Hasil",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Event Pembayaran",
+                "verbose_name_plural": "Event Pembayaran",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["processed_at", "id"],
+                        name="payment_pay_process_9e8ae3_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("gateway", "event_id"),
+                        name="unique_payment_event_per_gateway",
+                    )
+                ],
+            },
+        ),
+    ]
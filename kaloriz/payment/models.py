@@ -0,0 +1,55 @@
+from django.db import models
+
+
+class PaymentEvent(models.Model):
+    """Append-only inbox of payment notifications received from gateways."""
+
+    GATEWAY_MIDTRANS = "midtrans"
+    GATEWAY_DOKU = "doku"
+    GATEWAY_CHOICES = [
+        (GATEWAY_MIDTRANS, "Midtrans"),
+        (GATEWAY_DOKU, "DOKU"),
+    ]
+
+    OUTCOME_APPLIED = "applied"
+    OUTCOME_DUPLICATE = "duplicate"
+    OUTCOME_STALE = "stale"
+    OUTCOME_IGNORED = "ignored"
+    OUTCOME_MISSING_ORDER = "missing_order"
+    OUTCOME_CHOICES = [
+        (OUTCOME_APPLIED, "Diterapkan"),
+        (OUTCOME_DUPLICATE, "Duplikat"),
+        (OUTCOME_STALE, "Kedaluwarsa / Urutan Salah"),
+        (OUTCOME_IGNORED, "Diabaikan"),
+        (OUTCOME_MISSING_ORDER, "Pesanan Tidak Ditemukan"),
+    ]
+
+    gateway = models.CharField(max_length=20, choices=GATEWAY_CHOICES, verbose_name="Gateway")
+    event_id = models.CharField(max_length=128, verbose_name="ID Event")
+    order_number = models.CharField(max_length=100, db_index=True, verbose_name="Nomor Pesanan")
+    gateway_order_id = models.CharField(max_length=100, blank=True, verbose_name="Order ID Gateway")
+    raw_status = models.CharField(max_length=50, blank=True, verbose_name="Status Gateway")
+    status = models.CharField(
+        max_length=20,
+        blank=True,
+        verbose_name="Status Pesanan",
+        help_text="Status pesanan hasil normalisasi (paid/pending/cancelled)",
+    )
+    payload = models.JSONField(default=dict, blank=True, verbose_name="Payload")
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name="Diterima")
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name="Diproses")
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES, blank=True, verbose_name="Hasil")
+
+    class Meta:
+        verbose_name = "Event Pembayaran"
+        verbose_name_plural = "Event Pembayaran"
+        ordering = ["id"]
+        constraints = [
+            models.UniqueConstraint(fields=["gateway", "event_id"], name="unique_payment_event_per_gateway"),
+        ]
+        indexes = [
+            models.Index(fields=["processed_at", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_gateway_display()} {self.order_number} - {self.raw_status or self.status}"
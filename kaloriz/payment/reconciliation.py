@@ -0,0 +1,153 @@
+"""Reconcile pending orders against the Midtrans status API.
+
+Orders whose frontend callback never reached ``payment_finish`` stay pending
+even after Midtrans settled them. This module checks them concurrently through
+a bounded thread pool with a shared rate limit and feeds the results through
+the payment inbox so transitions are applied in batched transactions.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Order
+from payment.inbox import build_payment_event, drain_payment_events
+from payment.models import PaymentEvent
+from payment.services import fetch_midtrans_transaction_status
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing ``rate`` acquisitions per second."""
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, int(rate)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+@dataclass
+class ReconciliationReport:
+    checked: int = 0
+    not_found: int = 0
+    still_pending: int = 0
+    queued: int = 0
+    outcomes: dict[str, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Orders checked per second."""
+        return self.checked / self.elapsed if self.elapsed else 0.0
+
+
+def get_reconcilable_orders(*, min_age_minutes: int = 0, limit: int | None = None):
+    """Return ``(order_number, midtrans_order_id)`` pairs for pending Midtrans orders."""
+
+    doku_slug = getattr(settings, "DOKU_PAYMENT_METHOD_SLUG", "doku") or ""
+    queryset = (
+        Order.objects.filter(status="pending")
+        .exclude(midtrans_order_id="")
+        .exclude(payment_method__iexact=doku_slug)
+        .order_by("created_at")
+    )
+    if min_age_minutes:
+        queryset = queryset.filter(created_at__lte=timezone.now() - timedelta(minutes=min_age_minutes))
+    pairs = queryset.values_list("order_number", "midtrans_order_id")
+    return list(pairs[:limit] if limit else pairs)
+
+
+def reconcile_pending_orders(
+    *,
+    workers: int = 8,
+    rate: float = 20.0,
+    batch_size: int = 100,
+    min_age_minutes: int = 0,
+    limit: int | None = None,
+) -> ReconciliationReport:
+    """Check pending orders concurrently and apply settled or failed payments."""
+
+    report = ReconciliationReport()
+    started = time.monotonic()
+    orders = get_reconcilable_orders(min_age_minutes=min_age_minutes, limit=limit)
+    limiter = RateLimiter(rate)
+
+    def lookup(midtrans_order_id: str):
+        limiter.acquire()
+        return fetch_midtrans_transaction_status(midtrans_order_id, use_cache=False)
+
+    pending_events: list[PaymentEvent] = []
+
+    def flush() -> None:
+        if not pending_events:
+            return
+        event_keys = [event.event_id for event in pending_events]
+        recorded = PaymentEvent.objects.filter(gateway=PaymentEvent.GATEWAY_MIDTRANS, event_id__in=event_keys)
+        with transaction.atomic():
+            # Events already in the inbox (from a webhook or an earlier run) are
+            # neither re-inserted nor counted; the inbox worker handles those.
+            known = set(recorded.values_list("event_id", flat=True))
+            PaymentEvent.objects.bulk_create(
+                [event for event in pending_events if event.event_id not in known], ignore_conflicts=True
+            )
+            inserted = list(recorded.exclude(event_id__in=known).values_list("pk", flat=True))
+        report.queued += len(inserted)
+        pending_events.clear()
+        if not inserted:
+            return
+        for outcome, count in drain_payment_events(batch_size=batch_size, event_ids=inserted).items():
+            report.outcomes[outcome] = report.outcomes.get(outcome, 0) + count
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="reconcile") as executor:
+        futures = {
+            executor.submit(lookup, midtrans_order_id): (order_number, midtrans_order_id)
+            for order_number, midtrans_order_id in orders
+        }
+        for future in as_completed(futures):
+            order_number, midtrans_order_id = futures[future]
+            report.checked += 1
+            status_payload = future.result()
+            if not status_payload:
+                report.not_found += 1
+                continue
+
+            event = build_payment_event(
+                gateway=PaymentEvent.GATEWAY_MIDTRANS,
+                order_number=order_number,
+                gateway_order_id=midtrans_order_id,
+                raw_status=status_payload.get("transaction_status") or "",
+                payload=status_payload,
+            )
+            if event.status in ("", "pending"):
+                report.still_pending += 1
+                continue
+
+            pending_events.append(event)
+            if len(pending_events) >= batch_size:
+                flush()
+
+    flush()
+    report.elapsed = time.monotonic() - started
+    return report
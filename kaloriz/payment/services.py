@@ -1,15 +1,17 @@
 """Helper functions for payment workflows."""
 from __future__ import annotations
 
-import base64
-import json
 import logging
+import threading
+import time
 from typing import Tuple
-from urllib import error as urllib_error
 from urllib import parse as urllib_parse
-from urllib import request as urllib_request
 
+import requests
 from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from core.models import Order
 
@@ -17,45 +19,203 @@ logger = logging.getLogger(__name__)
 
 _RETRYABLE_STATUSES = {"expire", "cancel", "deny", "failure"}
 
+_MIDTRANS_STATUS_CACHE_PREFIX = "payment:midtrans-status:"
+_MIDTRANS_STATUS_MISSING = "__missing__"
 
-def fetch_midtrans_transaction_status(order_id: str) -> dict | None:
-    """Fetch the latest Midtrans transaction status for the given order_id."""
+_midtrans_session: requests.Session | None = None
+_midtrans_session_lock = threading.Lock()
 
-    if not order_id or not getattr(settings, "MIDTRANS_SERVER_KEY", ""):
-        return None
+_inflight_lookups: dict[str, "_InflightLookup"] = {}
+_inflight_lock = threading.Lock()
 
-    base_url = "https://api.midtrans.com" if settings.MIDTRANS_IS_PRODUCTION else "https://api.sandbox.midtrans.com"
-    encoded_order_id = urllib_parse.quote(order_id, safe="")
-    url = f"{base_url}/v2/{encoded_order_id}/status"
+_metrics_lock = threading.Lock()
+_metrics = {
+    "requests": 0,
+    "cache_hits": 0,
+    "coalesced": 0,
+    "not_found": 0,
+    "errors": 0,
+    "latency_total_ms": 0.0,
+    "latency_max_ms": 0.0,
+}
+
+
+class _InflightLookup:
+    """A status lookup that other threads can wait on instead of repeating it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: dict | None = None
+
+
+def _record_metric(name: str, amount: float = 1) -> None:
+    with _metrics_lock:
+        _metrics[name] += amount
+
+
+def _record_latency(elapsed_ms: float) -> None:
+    with _metrics_lock:
+        _metrics["latency_total_ms"] += elapsed_ms
+        if elapsed_ms > _metrics["latency_max_ms"]:
+            _metrics["latency_max_ms"] = elapsed_ms
+
+
+def get_midtrans_status_metrics() -> dict:
+    """Return a snapshot of the Midtrans status lookup counters."""
+
+    with _metrics_lock:
+        snapshot = dict(_metrics)
+    requests_made = snapshot["requests"]
+    snapshot["latency_avg_ms"] = (
+        snapshot["latency_total_ms"] / requests_made if requests_made else 0.0
+    )
+    return snapshot
+
+
+def reset_midtrans_status_metrics() -> None:
+    """Zero the Midtrans status lookup counters."""
+
+    with _metrics_lock:
+        for key in _metrics:
+            _metrics[key] = 0.0 if key.startswith("latency") else 0
+
+
+def _get_midtrans_session() -> requests.Session:
+    """Return the shared keep-alive session used for Midtrans API calls."""
+
+    global _midtrans_session
+
+    if _midtrans_session is not None:
+        return _midtrans_session
+
+    with _midtrans_session_lock:
+        if _midtrans_session is None:
+            retry = Retry(
+                total=getattr(settings, "MIDTRANS_HTTP_MAX_RETRIES", 2),
+                backoff_factor=getattr(settings, "MIDTRANS_HTTP_BACKOFF_FACTOR", 0.3),
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset({"GET"}),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_maxsize=getattr(settings, "MIDTRANS_HTTP_POOL_SIZE", 10),
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Accept": "application/json"})
+            _midtrans_session = session
+
+    return _midtrans_session
+
+
+def _get_midtrans_api_base_url() -> str:
+    override = getattr(settings, "MIDTRANS_API_BASE_URL", "")
+    if override:
+        return override.rstrip("/")
+    if settings.MIDTRANS_IS_PRODUCTION:
+        return "https://api.midtrans.com"
+    return "https://api.sandbox.midtrans.com"
 
-    credentials = f"{settings.MIDTRANS_SERVER_KEY}:".encode("utf-8")
-    authorization = base64.b64encode(credentials).decode("utf-8")
 
-    request_obj = urllib_request.Request(url, method="GET")
-    request_obj.add_header("Authorization", f"Basic {authorization}")
-    request_obj.add_header("Accept", "application/json")
+def _midtrans_status_cache_key(order_id: str) -> str:
+    return f"{_MIDTRANS_STATUS_CACHE_PREFIX}{order_id}"
 
+
+def invalidate_midtrans_status_cache(order_id: str) -> None:
+    """Drop the cached Midtrans status so the next lookup hits the gateway."""
+
+    if order_id:
+        cache.delete(_midtrans_status_cache_key(order_id))
+
+
+def _request_midtrans_transaction_status(order_id: str) -> tuple[dict | None, bool]:
+    """Call the Midtrans status API and return ``(payload, cacheable)``."""
+
+    encoded_order_id = urllib_parse.quote(order_id, safe="")
+    url = f"{_get_midtrans_api_base_url()}/v2/{encoded_order_id}/status"
+    timeout = getattr(settings, "MIDTRANS_HTTP_TIMEOUT", (3.05, 10))
+
+    started = time.monotonic()
+    _record_metric("requests")
     try:
-        with urllib_request.urlopen(request_obj, timeout=15) as response:
-            raw_body = response.read().decode("utf-8")
-    except urllib_error.HTTPError as exc:  # pragma: no cover - network failures hard to simulate
-        raw_body = exc.read().decode("utf-8", errors="replace")
-        if exc.code == 404:
-            logger.info("Midtrans status for %s not found", order_id)
-            return None
-    except urllib_error.URLError as exc:  # pragma: no cover - network failures hard to simulate
+        response = _get_midtrans_session().get(
+            url,
+            auth=(settings.MIDTRANS_SERVER_KEY, ""),
+            timeout=timeout,
+        )
+    except requests.RequestException as exc:  # pragma: no cover - network failures hard to simulate
+        _record_metric("errors")
         logger.warning("Failed to fetch Midtrans status for %s: %s", order_id, exc)
-        return None
+        return None, False
+    finally:
+        _record_latency((time.monotonic() - started) * 1000)
 
-    if not raw_body:
-        return None
+    if response.status_code == 404:
+        _record_metric("not_found")
+        logger.info("Midtrans status for %s not found", order_id)
+        return None, True
+
+    if not response.content:
+        return None, False
 
     try:
-        return json.loads(raw_body)
-    except json.JSONDecodeError:  # pragma: no cover - defensive
-        logger.warning("Failed to parse Midtrans status response for %s: %s", order_id, raw_body)
+        payload = response.json()
+    except ValueError:  # pragma: no cover - defensive
+        _record_metric("errors")
+        logger.warning("Failed to parse Midtrans status response for %s: %s", order_id, response.text)
+        return None, False
+
+    if response.status_code >= 500:
+        _record_metric("errors")
+        return payload, False
+
+    return payload, True
+
+
+def fetch_midtrans_transaction_status(order_id: str, *, use_cache: bool = True) -> dict | None:
+    """Fetch the latest Midtrans transaction status for the given order_id.
+
+    Results are cached per ``order_id`` for ``MIDTRANS_STATUS_CACHE_TTL``
+    seconds and concurrent lookups for the same order share one request.
+    """
+
+    if not order_id or not getattr(settings, "MIDTRANS_SERVER_KEY", ""):
         return None
 
+    cache_key = _midtrans_status_cache_key(order_id)
+    if use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            _record_metric("cache_hits")
+            return None if cached == _MIDTRANS_STATUS_MISSING else cached
+
+    with _inflight_lock:
+        lookup = _inflight_lookups.get(order_id)
+        is_leader = lookup is None
+        if is_leader:
+            lookup = _InflightLookup()
+            _inflight_lookups[order_id] = lookup
+
+    if not is_leader:
+        _record_metric("coalesced")
+        lookup.done.wait(timeout=30)
+        return lookup.result
+
+    try:
+        payload, cacheable = _request_midtrans_transaction_status(order_id)
+        ttl = getattr(settings, "MIDTRANS_STATUS_CACHE_TTL", 10)
+        if cacheable and ttl > 0:
+            cache.set(cache_key, payload if payload is not None else _MIDTRANS_STATUS_MISSING, ttl)
+        lookup.result = payload
+    finally:
+        with _inflight_lock:
+            _inflight_lookups.pop(order_id, None)
+        lookup.done.set()
+
+    return payload
+
 
 def _should_refresh_midtrans_token(status_payload: dict | None) -> bool:
     if not status_payload:
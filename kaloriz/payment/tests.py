@@ -0,0 +1,327 @@
+import json
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from catalog.models import Category, Product
+from core.models import Notification, Order, OrderItem
+from payment import services, views
+from payment.fake_gateway import FakeGatewayConfig, FakePaymentGateway
+from payment.inbox import _apply_status_changes, drain_payment_events, record_payment_event
+from payment.models import PaymentEvent
+from payment.reconciliation import reconcile_pending_orders
+
+
+class _FakeResponse:
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.content = b"{}" if payload is not None else b""
+        self.text = ""
+
+    def json(self):
+        return self._payload
+
+
+@override_settings(MIDTRANS_SERVER_KEY="server-key", MIDTRANS_STATUS_CACHE_TTL=30)
+class MidtransStatusLookupTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        services.reset_midtrans_status_metrics()
+
+    def _patch_session(self, get):
+        session = mock.Mock()
+        session.get.side_effect = get
+        return mock.patch.object(services, "_get_midtrans_session", return_value=session), session
+
+    def test_status_is_cached_per_order_id(self):
+        patcher, session = self._patch_session(
+            lambda *args, **kwargs: _FakeResponse(payload={"transaction_status": "pending"})
+        )
+        with patcher:
+            first = services.fetch_midtrans_transaction_status("KALORIZ-1")
+            second = services.fetch_midtrans_transaction_status("KALORIZ-1")
+
+        self.assertEqual(first, {"transaction_status": "pending"})
+        self.assertEqual(second, first)
+        self.assertEqual(session.get.call_count, 1)
+        metrics = services.get_midtrans_status_metrics()
+        self.assertEqual(metrics["requests"], 1)
+        self.assertEqual(metrics["cache_hits"], 1)
+
+    def test_not_found_is_cached_and_invalidation_forces_refetch(self):
+        patcher, session = self._patch_session(lambda *args, **kwargs: _FakeResponse(status_code=404))
+        with patcher:
+            self.assertIsNone(services.fetch_midtrans_transaction_status("KALORIZ-2"))
+            self.assertIsNone(services.fetch_midtrans_transaction_status("KALORIZ-2"))
+            services.invalidate_midtrans_status_cache("KALORIZ-2")
+            services.fetch_midtrans_transaction_status("KALORIZ-2")
+
+        self.assertEqual(session.get.call_count, 2)
+        self.assertEqual(services.get_midtrans_status_metrics()["not_found"], 2)
+
+    def test_concurrent_lookups_are_coalesced(self):
+        def slow_get(*args, **kwargs):
+            time.sleep(0.2)
+            return _FakeResponse(payload={"transaction_status": "settlement"})
+
+        patcher, session = self._patch_session(slow_get)
+        results = []
+
+        def worker():
+            results.append(services.fetch_midtrans_transaction_status("KALORIZ-3"))
+
+        with patcher:
+            threads = [threading.Thread(target=worker) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(session.get.call_count, 1)
+        self.assertEqual(results, [{"transaction_status": "settlement"}] * 5)
+
+
+class PaymentOrderTestMixin:
+    def _create_order(self, order_number="INV-1", quantity=2):
+        self.user = User.objects.create_user(username="budi", email="budi@example.com", password="secret123")
+        category = Category.objects.create(name="Makanan")
+        self.product = Product.objects.create(
+            category=category,
+            name="Salad Ayam",
+            description="Salad",
+            price=Decimal("30000.00"),
+            stock=3,
+        )
+        order = Order.objects.create(
+            user=self.user,
+            order_number=order_number,
+            status="pending",
+            full_name="Budi",
+            email="budi@example.com",
+            phone="08123456789",
+            address="Jl. Contoh",
+            city="Makassar",
+            postal_code="90111",
+            subtotal=Decimal("60000.00"),
+            total=Decimal("60000.00"),
+        )
+        OrderItem.objects.create(
+            order=order,
+            product=self.product,
+            product_name=self.product.name,
+            product_price=self.product.price,
+            quantity=quantity,
+            subtotal=self.product.price * quantity,
+        )
+        return order
+
+
+@override_settings(PAYMENT_EVENTS_DISPATCH="worker")
+class PaymentEventInboxTests(PaymentOrderTestMixin, TestCase):
+    def setUp(self):
+        self.order = self._create_order()
+
+    def _post_doku(self, status):
+        payload = {"order": {"invoice_number": self.order.order_number}, "transaction": {"status": status}}
+        return self.client.post(
+            reverse("payment:doku_notification"),
+            data=json.dumps(payload),
+            content_type="application/json",
+        )
+
+    def test_duplicate_notifications_restore_stock_once(self):
+        for _ in range(3):
+            response = self._post_doku("FAILED")
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+        # The gateway's own requests do not create sessions.
+        self.assertFalse(Session.objects.exists())
+        counts = drain_payment_events()
+
+        self.order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual(counts, {PaymentEvent.OUTCOME_APPLIED: 1})
+        self.assertEqual(self.order.status, "cancelled")
+        self.assertEqual(self.product.stock, 5)
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 1)
+
+    def test_out_of_order_downgrade_is_skipped(self):
+        self.client.login(username="budi", password="secret123")
+        for status in ("settlement", "pending"):
+            self.client.post(
+                reverse("payment:finish"),
+                data=json.dumps({"result": {
+                    "order_id": self.order.order_number,
+                    "transaction_id": "trx-1",
+                    "transaction_status": status,
+                }}),
+                content_type="application/json",
+            )
+        self.assertEqual(self.client.session["midtrans_last_result"], [self.order.order_number, "pending"])
+
+        counts = drain_payment_events()
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "paid")
+        self.assertEqual(counts, {PaymentEvent.OUTCOME_APPLIED: 1, PaymentEvent.OUTCOME_STALE: 1})
+
+    def test_orders_changed_meanwhile_are_not_notified(self):
+        other = Order.objects.create(
+            user=self.user, order_number="INV-2", status="pending", full_name="Budi", email="budi@example.com",
+            phone="08123456789", address="Jl. Contoh", city="Makassar", postal_code="90111",
+            subtotal=Decimal("30000.00"), total=Decimal("30000.00"),
+        )
+        orders = [self.order, other]
+        # Cancelled by the timeout job after these instances were loaded.
+        Order.objects.filter(pk=other.pk).update(status="cancelled")
+
+        _apply_status_changes(orders, {order.order_number: "paid" for order in orders})
+
+        self.assertEqual(
+            list(Order.objects.order_by("pk").values_list("status", flat=True)), ["paid", "cancelled"]
+        )
+        messages = list(Notification.objects.values_list("message", flat=True))
+        self.assertEqual(len(messages), 1)
+        self.assertIn(self.order.order_number, messages[0])
+        self.assertEqual(other.status, "pending")
+
+    @override_settings(MIDTRANS_SERVER_KEY="server-key")
+    def test_signed_midtrans_notification_from_fake_gateway_is_queued(self):
+        gateway = FakePaymentGateway(FakeGatewayConfig(server_key="server-key")).start()
+        self.addCleanup(gateway.stop)
+        gateway.create_transaction("midtrans", self.order.order_number, "60000.00")
+        gateway.pay(self.order.order_number)
+        payload = gateway.notifications[-1]["payload"]
+        url = reverse("payment:midtrans_notification")
+
+        tampered = {**payload, "gross_amount": "1.00"}
+        response = self.client.post(url, data=json.dumps(tampered), content_type="application/json")
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.post(url, data=json.dumps(payload), content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(drain_payment_events(), {PaymentEvent.OUTCOME_APPLIED: 1})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "paid")
+
+
+@override_settings(MIDTRANS_SERVER_KEY="server-key", PAYMENT_EVENTS_DISPATCH="worker")
+class PaymentReconciliationTests(PaymentOrderTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.paid_order = self._create_order("INV-PAID")
+        self.paid_order.midtrans_order_id = "INV-PAID-1"
+        self.paid_order.save(update_fields=["midtrans_order_id"])
+        self.expired_order = self._create_midtrans_order("INV-EXPIRED", "INV-EXPIRED-2")
+        self.unknown_order = self._create_midtrans_order("INV-UNKNOWN", "INV-UNKNOWN-1")
+
+    def _create_midtrans_order(self, order_number, midtrans_order_id):
+        return Order.objects.create(
+            user=self.user,
+            order_number=order_number,
+            status="pending",
+            full_name="Budi",
+            email="budi@example.com",
+            phone="08123456789",
+            address="Jl. Contoh",
+            city="Makassar",
+            postal_code="90111",
+            subtotal=Decimal("30000.00"),
+            total=Decimal("30000.00"),
+            midtrans_order_id=midtrans_order_id,
+        )
+
+    def test_pending_orders_are_reconciled_concurrently(self):
+        statuses = {
+            "INV-PAID-1": {"transaction_id": "trx-paid", "transaction_status": "settlement"},
+            "INV-EXPIRED-2": {"transaction_id": "trx-expired", "transaction_status": "expire"},
+        }
+
+        def get(url, **kwargs):
+            order_id = url.rstrip("/").split("/")[-2]
+            payload = statuses.get(order_id)
+            return _FakeResponse(payload=payload) if payload else _FakeResponse(status_code=404)
+
+        # An unrelated webhook event waiting in the inbox is left to its worker.
+        other = self._create_midtrans_order("INV-OTHER", "INV-OTHER-1")
+        record_payment_event(
+            gateway=PaymentEvent.GATEWAY_MIDTRANS,
+            order_number=other.order_number,
+            gateway_order_id=other.midtrans_order_id,
+            raw_status="settlement",
+            payload={"transaction_id": "trx-other", "transaction_status": "settlement"},
+        )
+        statuses["INV-OTHER-1"] = {"transaction_id": "trx-other", "transaction_status": "settlement"}
+
+        session = mock.Mock()
+        session.get.side_effect = get
+        with mock.patch.object(services, "_get_midtrans_session", return_value=session):
+            report = reconcile_pending_orders(workers=3, rate=0)
+
+        self.assertEqual(report.checked, 4)
+        self.assertEqual(report.not_found, 1)
+        self.assertEqual(report.queued, 2)
+        self.assertEqual(report.outcomes, {PaymentEvent.OUTCOME_APPLIED: 2})
+        self.assertTrue(PaymentEvent.objects.get(order_number="INV-OTHER").processed_at is None)
+        self.assertEqual(Order.objects.get(pk=self.paid_order.pk).status, "paid")
+        self.assertEqual(Order.objects.get(pk=self.expired_order.pk).status, "cancelled")
+        self.assertEqual(Order.objects.get(pk=self.unknown_order.pk).status, "pending")
+
+
+class FakePaymentGatewayTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.gateway = FakePaymentGateway(FakeGatewayConfig(seed=1)).start()
+        self.addCleanup(self.gateway.stop)
+        settings_override = override_settings(
+            MIDTRANS_SERVER_KEY="server-key",
+            MIDTRANS_API_BASE_URL=self.gateway.url,
+            MIDTRANS_SNAP_BASE_URL=f"{self.gateway.url}/snap/v1",
+            DOKU_CLIENT_ID="client-id",
+            DOKU_SECRET_KEY="secret-key",
+            DOKU_SANDBOX_BASE_URL=self.gateway.url,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_snap_transaction_status_follows_payment(self):
+        snap = views._build_midtrans_client()
+        response = snap.create_transaction({"transaction_details": {"order_id": "INV-9-1", "gross_amount": 50000}})
+
+        self.assertTrue(response["token"])
+        status = services.fetch_midtrans_transaction_status("INV-9-1", use_cache=False)
+        self.assertEqual(status["transaction_status"], "pending")
+
+        self.gateway.pay("INV-9-1")
+        status = services.fetch_midtrans_transaction_status("INV-9-1", use_cache=False)
+        self.assertEqual(status["transaction_status"], "settlement")
+        self.assertIsNone(services.fetch_midtrans_transaction_status("INV-UNKNOWN", use_cache=False))
+
+    def test_doku_checkout_and_notification_payload(self):
+        status_code, data, _ = views._call_doku_api(
+            "/checkout/v1/payment", {"order": {"invoice_number": "INV-10", "amount": 75000}}
+        )
+
+        self.assertEqual(status_code, 200)
+        self.assertTrue(data["response"]["payment"]["url"].startswith(self.gateway.url))
+
+        self.gateway.pay("INV-10", "expire")
+        notification = self.gateway.notifications[-1]["payload"]
+        self.assertEqual(notification["order"]["invoice_number"], "INV-10")
+        self.assertEqual(notification["transaction"]["status"], "EXPIRED")
+
+    def test_error_rate_injects_server_errors(self):
+        self.gateway.config.error_rate = 1.0
+        status_code, _, _ = views._call_doku_api("/checkout/v1/payment", {"order": {"invoice_number": "INV-11"}})
+
+        self.assertEqual(status_code, 500)
+        self.assertEqual(self.gateway.stats["errors_injected"], 1)
@@ -22,11 +22,24 @@ from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
-from catalog.models import DiscountCode
+from catalog.discounts import DiscountError, get_discount_code
+from catalog.flash_sales import FlashSaleHoldExpired
 from core.models import Cart, Order, PaymentMethod
 from core.views import _get_active_cart, _prepare_selected_cart_items
-from core.services.orders import create_order_from_checkout, restore_order_stock, cancel_order_due_to_timeout
-from payment.services import get_or_create_midtrans_snap_token
+from core.services.checkout import clear_checkout_quote, get_checkout_quote
+from core.services.idempotency import idempotent
+from core.services.order_numbers import next_order_number
+from core.services.orders import create_order_from_checkout, cancel_order_due_to_timeout
+from core.services.session_state import (
+    clear_checkout,
+    clear_session_discount_code,
+    get_checkout,
+    set_checkout,
+    set_midtrans_result,
+)
+from payment.inbox import record_payment_event
+from payment.models import PaymentEvent
+from payment.services import get_or_create_midtrans_snap_token, invalidate_midtrans_status_cache
 from shipping.models import Address
 
 logger = logging.getLogger(__name__)
@@ -171,10 +184,7 @@ def _to_int_amount(value: Decimal) -> int:
 def _extract_order_number_from_midtrans(order_id: str | None) -> str:
     if not order_id:
         return ""
-    separator = getattr(Order, "MIDTRANS_RETRY_SEPARATOR", "::retry::")
-    if separator not in order_id:
-        return order_id
-    return order_id.split(separator, 1)[0]
+    return Order.split_midtrans_order_id(order_id)[0]
 
 
 def _extract_midtrans_error(exc: Exception, default_message: str) -> tuple[str, dict | None, int | None]:
@@ -237,50 +247,33 @@ def _build_midtrans_client():
     if not settings.MIDTRANS_SERVER_KEY:
         raise RuntimeError("MIDTRANS_SERVER_KEY tidak dikonfigurasi")
 
-    return midtransclient.Snap(
+    snap = midtransclient.Snap(
         is_production=settings.MIDTRANS_IS_PRODUCTION,
         server_key=settings.MIDTRANS_SERVER_KEY,
         client_key=settings.MIDTRANS_CLIENT_KEY,
     )
+    snap_base_url = getattr(settings, "MIDTRANS_SNAP_BASE_URL", "")
+    if snap_base_url:
+        snap.api_config.SNAP_SANDBOX_BASE_URL = snap_base_url.rstrip("/")
+        snap.api_config.SNAP_PRODUCTION_BASE_URL = snap_base_url.rstrip("/")
+    return snap
 
 
-def _calculate_discount(
-    subtotal: Decimal,
-    shipping_cost: Decimal,
-    shipping_method: str,
-    discount_session: dict | None,
-) -> tuple[Decimal, str]:
-    discount_session = discount_session or {}
-    discount_code = discount_session.get("code")
-
-    if not discount_code:
-        return Decimal("0"), ""
-
-    discount_obj = DiscountCode.objects.filter(code__iexact=discount_code).first()
-    if not discount_obj:
-        return Decimal("0"), ""
-
-    if not discount_obj.is_valid():
-        return Decimal("0"), ""
-
-    if not discount_obj.is_shipping_allowed(shipping_method):
-        return Decimal("0"), ""
-
-    grand_total = subtotal + shipping_cost
-    if grand_total < discount_obj.get_min_spend():
-        return Decimal("0"), ""
-
-    discount_amount = discount_obj.calculate_discount(grand_total)
-    if discount_amount > grand_total:
-        discount_amount = grand_total
+def _quoted_price(item, unit_prices) -> Decimal:
+    price = (unit_prices or {}).get(item.pk)
+    return item.product.get_display_price() if price is None else price
 
-    return discount_amount, discount_obj.code.upper()
 
-
-def _build_item_details(selected_items, shipping_cost: Decimal, discount_amount: Decimal, discount_code: str):
+def _build_item_details(
+    selected_items,
+    shipping_cost: Decimal,
+    discount_amount: Decimal,
+    discount_code: str,
+    unit_prices=None,
+):
     details = []
     for item in selected_items:
-        price = _to_int_amount(item.product.get_display_price())
+        price = _to_int_amount(_quoted_price(item, unit_prices))
         details.append(
             {
                 "id": str(item.product.id),
@@ -358,6 +351,7 @@ def _build_doku_line_items(
     shipping_cost: Decimal,
     discount_amount: Decimal,
     total_amount: Decimal,
+    unit_prices=None,
 ):
     has_discount = discount_amount and discount_amount > 0
     line_items = []
@@ -369,7 +363,7 @@ def _build_doku_line_items(
         quantity = int(getattr(item, "quantity", 0))
         if quantity <= 0:
             continue
-        price = _to_int_amount(product.get_display_price())
+        price = _to_int_amount(_quoted_price(item, unit_prices))
         line_items.append(
             {
                 "name": product.name[:50],
@@ -546,17 +540,10 @@ def _build_doku_line_items_from_order(order: Order) -> list[dict]:
 
     return line_items
 
-def _generate_unique_checkout_order_number(prefix: str = "INV") -> str:
-    """Generate a timestamp + UUID based order number that fits Midtrans limits."""
-
-    timestamp = timezone.now().strftime("%Y%m%d%H%M%S")
-    random_suffix = uuid.uuid4().hex[:8].upper()
-    return f"{prefix}-{timestamp}-{random_suffix}"
-
-
 @csrf_exempt
 @login_required
 @require_POST
+@idempotent("snap_token")
 def payment_create_snap_token(request):
     """Create a Midtrans Snap transaction token safely.
 
@@ -619,16 +606,14 @@ def payment_create_snap_token(request):
             extra={"cart_id": cart_id},
         )
 
-    checkout_data = request.session.get("checkout")
-    if not isinstance(checkout_data, dict):
-        checkout_data = {}
+    checkout_data = get_checkout(request)
     if checkout_data.get("user_id") and checkout_data.get("user_id") != request.user.id:
         # Checkout milik user sebelumnya. Reset agar tidak ikut ke user baru.
         logger.info(
             "Checkout data belongs to different user. Resetting checkout session.",
             extra={**log_context, "checkout_owner": checkout_data.get("user_id")},
         )
-        request.session.pop("checkout", None)
+        clear_checkout(request)
         checkout_data = {}
 
     if not checkout_data:
@@ -638,8 +623,7 @@ def payment_create_snap_token(request):
         )
     if not checkout_data.get("user_id"):
         checkout_data["user_id"] = request.user.id
-        request.session["checkout"] = checkout_data
-        request.session.modified = True
+        set_checkout(request, checkout_data)
 
     midtrans_slug = getattr(settings, "MIDTRANS_PAYMENT_METHOD_SLUG", "midtrans") or ""
     selected_payment_slug = (checkout_data.get("payment_method") or "").strip().lower()
@@ -680,17 +664,10 @@ def payment_create_snap_token(request):
     if not shipping_method:
         return _json_error("Metode pengiriman belum dipilih.", reason="missing_shipping_method")
 
-    shipping_cost = _to_decimal(raw_shipping_cost)
-    subtotal = _to_decimal(cart.get_selected_total())
-    discount_amount, discount_code = _calculate_discount(
-        subtotal,
-        shipping_cost,
-        shipping_method,
-        request.session.get("discount"),
-    )
-    total = subtotal + shipping_cost - discount_amount
-    if total < 0:
-        total = Decimal("0")
+    quote = get_checkout_quote(request, cart)
+    subtotal, shipping_cost, total = quote.subtotal, quote.shipping_cost, quote.total
+    discount_amount, discount_code = quote.discount_amount, quote.discount_code
+    discount_obj = get_discount_code(discount_code) if discount_code else None
 
     selected_items, selected_quantities = _prepare_selected_cart_items(selected_items_qs)
     for item in selected_items:
@@ -707,9 +684,10 @@ def payment_create_snap_token(request):
         shipping_cost,
         discount_amount,
         discount_code or "",
+        quote.unit_prices,
     )
 
-    order_number = _generate_unique_checkout_order_number()
+    order_number = next_order_number()
     service_code = str(shipping_method or "").upper()
     service_label = "Express" if service_code == "EXP" else "Reguler"
     district_name = getattr(getattr(shipping_address, "district", None), "name", "")
@@ -754,6 +732,9 @@ def payment_create_snap_token(request):
                 payment_method_display=(
                     payment_method_obj.name if payment_method_obj else selected_payment_slug
                 ),
+                discount=discount_obj,
+                discount_amount=discount_amount,
+                unit_prices=quote.unit_prices,
             )
 
             midtrans_order_id = order.order_number
@@ -786,6 +767,11 @@ def payment_create_snap_token(request):
             order.midtrans_token = token
             order.save(update_fields=["midtrans_token"])
 
+    except DiscountError as exc:
+        return _json_error(str(exc), reason="discount_unavailable", status=409)
+    except FlashSaleHoldExpired as exc:
+        clear_checkout_quote(request)
+        return _json_error(str(exc), reason="flash_sale_hold_expired", status=409)
     except RuntimeError as exc:
         logger.exception("Failed to create Midtrans Snap transaction: %s", exc, extra=log_context)
         return _json_error(str(exc), reason="midtrans_token", status=400)
@@ -800,9 +786,9 @@ def payment_create_snap_token(request):
         return _json_error(message or default_message, status=http_status, extra=log_extra)
 
     request.session["midtrans_order_id"] = order.order_number
-    request.session.pop("checkout", None)
-    request.session.pop("discount", None)
-    request.session.modified = True
+    clear_checkout(request)
+    clear_session_discount_code(request)
+    clear_checkout_quote(request)
 
     logger.info(
         "Snap token created successfully",
@@ -814,10 +800,11 @@ def payment_create_snap_token(request):
 @csrf_exempt
 @login_required
 @require_POST
+@idempotent("doku_checkout")
 def payment_create_doku_checkout(request):
     """Create a DOKU redirect checkout session."""
 
-    checkout_data = request.session.get("checkout", {})
+    checkout_data = get_checkout(request)
     doku_slug = getattr(settings, "DOKU_PAYMENT_METHOD_SLUG", "doku")
     selected_payment_slug = (checkout_data.get("payment_method") or "").strip().lower()
     if selected_payment_slug != (doku_slug or "").lower():
@@ -827,6 +814,8 @@ def payment_create_doku_checkout(request):
     if not config.get("client_id") or not config.get("secret_key"):
         return JsonResponse({"message": "Konfigurasi DOKU belum lengkap."}, status=500)
 
+    payment_method_obj = PaymentMethod.objects.filter(slug__iexact=selected_payment_slug).first()
+
     try:
         cart = _get_active_cart(request)
     except Exception as exc:  # pylint: disable=broad-except
@@ -847,19 +836,10 @@ def payment_create_doku_checkout(request):
     if not shipping_address:
         return JsonResponse({"message": "Alamat pengiriman tidak ditemukan."}, status=400)
 
-    shipping_cost = _to_decimal(checkout_data.get("shipping_cost"))
-    subtotal = _to_decimal(cart.get_selected_total())
-
-    discount_amount, discount_code = _calculate_discount(
-        subtotal,
-        shipping_cost,
-        checkout_data.get("shipping_method"),
-        request.session.get("discount"),
-    )
-
-    total = subtotal + shipping_cost - discount_amount
-    if total < 0:
-        total = Decimal("0")
+    quote = get_checkout_quote(request, cart)
+    subtotal, shipping_cost, total = quote.subtotal, quote.shipping_cost, quote.total
+    discount_amount, discount_code = quote.discount_amount, quote.discount_code
+    discount_obj = get_discount_code(discount_code) if discount_code else None
 
     selected_items, selected_quantities = _prepare_selected_cart_items(selected_items_qs)
     if not selected_items:
@@ -873,15 +853,14 @@ def payment_create_doku_checkout(request):
                 status=400,
             )
 
-    # Generate unique order_id dengan UUID penuh untuk menghindari collision
-    order_id = f"INV-{timezone.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex.upper()}"
+    order_id = next_order_number()
     service_code = str(checkout_data.get("shipping_method") or "").upper()
     service_label = "Express" if service_code == "EXP" else "Reguler"
     district_name = getattr(getattr(shipping_address, "district", None), "name", "")
     eta = checkout_data.get("eta")
     notes = checkout_data.get("notes", "")
 
-    line_items = _build_doku_line_items(selected_items, shipping_cost, discount_amount, total)
+    line_items = _build_doku_line_items(selected_items, shipping_cost, discount_amount, total, quote.unit_prices)
 
     order_payload = {
         "amount": _to_int_amount(total),
@@ -943,6 +922,9 @@ def payment_create_doku_checkout(request):
                 shipping_service_name=service_label,
                 payment_method_slug=selected_payment_slug,
                 payment_method_display=(payment_method_obj.name if payment_method_obj else selected_payment_slug),
+                discount=discount_obj,
+                discount_amount=discount_amount,
+                unit_prices=quote.unit_prices,
             )
 
             status_code, response_data, _ = _call_doku_api("/checkout/v1/payment", payload)
@@ -961,6 +943,11 @@ def payment_create_doku_checkout(request):
             if not payment_url:
                 raise RuntimeError("URL pembayaran DOKU tidak tersedia.")
 
+    except DiscountError as exc:
+        return JsonResponse({"message": str(exc)}, status=409)
+    except FlashSaleHoldExpired as exc:
+        clear_checkout_quote(request)
+        return JsonResponse({"message": str(exc)}, status=409)
     except RuntimeError as exc:
         logger.exception("Failed to create DOKU checkout: %s", exc)
         return JsonResponse({"message": str(exc)}, status=400)
@@ -970,9 +957,9 @@ def payment_create_doku_checkout(request):
         return JsonResponse({"message": "Gagal membuat sesi pembayaran DOKU."}, status=400)
 
     request.session["doku_order_id"] = order.order_number
-    request.session.pop("checkout", None)
-    request.session.pop("discount", None)
-    request.session.modified = True
+    clear_checkout(request)
+    clear_session_discount_code(request)
+    clear_checkout_quote(request)
 
     return JsonResponse({"payment_url": payment_url, "order_id": order.order_number})
 
@@ -1135,7 +1122,7 @@ def payment_create_order_doku_checkout(request, order_number):
 @login_required
 @require_POST
 def payment_finish(request):
-    """Receive payment result callbacks from the frontend and update order status."""
+    """Receive payment result callbacks from the frontend and queue them for the inbox worker."""
     try:
         payload = json.loads(request.body or "{}")
     except json.JSONDecodeError:
@@ -1149,48 +1136,69 @@ def payment_finish(request):
     if not order_id:
         return JsonResponse({"message": "Order ID tidak ditemukan."}, status=400)
 
-    order = Order.objects.filter(order_number=order_id).first()
-    if order and transaction_status:
-        success_states = {"capture", "settlement"}
-        pending_states = {"pending"}
-        failure_states = {"deny", "cancel", "expire", "failure"}
-
-        if transaction_status in success_states and order.status != "paid":
-            order.status = "paid"
-            update_fields = ["status"]
-            if order.midtrans_token:
-                order.midtrans_token = ""
-                update_fields.append("midtrans_token")
-            order.save(update_fields=update_fields)
-        elif transaction_status in pending_states and order.status != "pending":
-            order.status = "pending"
-            order.save(update_fields=["status"])
-        elif transaction_status in failure_states and order.status != "cancelled":
-            with transaction.atomic():
-                restore_order_stock(order)
-                order.status = "cancelled"
-                update_fields = ["status"]
-                if order.midtrans_token:
-                    order.midtrans_token = ""
-                    update_fields.append("midtrans_token")
-                order.save(update_fields=update_fields)
-
-    request.session["midtrans_last_result"] = result
-    request.session.modified = True
-
-    response_payload = {"message": "Status pembayaran diterima.", "order_id": order_id}
+    invalidate_midtrans_status_cache(raw_order_id)
+
+    if transaction_status:
+        record_payment_event(
+            gateway=PaymentEvent.GATEWAY_MIDTRANS,
+            order_number=order_id,
+            gateway_order_id=raw_order_id,
+            raw_status=transaction_status,
+            payload=result,
+        )
+
+    set_midtrans_result(request, raw_order_id, transaction_status)
+
+    response_payload = {"message": "Status pembayaran diterima.", "order_id": order_id, "queued": True}
     if raw_order_id and raw_order_id != order_id:
         response_payload["gateway_order_id"] = raw_order_id
-    if order:
-        response_payload["status"] = order.status
 
     return JsonResponse(response_payload)
 
 
+def _midtrans_signature(payload: dict, server_key: str) -> str:
+    raw = f"{payload.get('order_id', '')}{payload.get('status_code', '')}{payload.get('gross_amount', '')}{server_key}"
+    return hashlib.sha512(raw.encode("utf-8")).hexdigest()
+
+
+@csrf_exempt
+@require_POST
+def midtrans_notification(request):
+    """Queue Midtrans HTTP notifications (server to server, signed with the server key)."""
+
+    try:
+        payload = json.loads(request.body or "{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"message": "Payload tidak valid."}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({"message": "Payload tidak valid."}, status=400)
+
+    server_key = getattr(settings, "MIDTRANS_SERVER_KEY", "")
+    if not server_key or not hmac.compare_digest(
+        str(payload.get("signature_key") or ""), _midtrans_signature(payload, server_key)
+    ):
+        return JsonResponse({"message": "Signature tidak valid."}, status=403)
+
+    raw_order_id = payload.get("order_id")
+    order_id = _extract_order_number_from_midtrans(raw_order_id)
+    if not order_id:
+        return JsonResponse({"message": "Order ID tidak ditemukan."}, status=400)
+
+    invalidate_midtrans_status_cache(raw_order_id)
+    record_payment_event(
+        gateway=PaymentEvent.GATEWAY_MIDTRANS,
+        order_number=order_id,
+        gateway_order_id=raw_order_id,
+        raw_status=payload.get("transaction_status") or "",
+        payload=payload,
+    )
+    return JsonResponse({"message": "Notifikasi Midtrans diterima.", "order_id": order_id, "queued": True})
+
+
 @csrf_exempt
 @require_POST
 def doku_notification(request):
-    """Handle asynchronous payment status notifications from DOKU."""
+    """Queue asynchronous payment status notifications from DOKU."""
 
     try:
         payload = json.loads(request.body or "{}")
@@ -1215,35 +1223,17 @@ def doku_notification(request):
     if not order_id:
         return JsonResponse({"message": "Order ID tidak ditemukan."}, status=400)
 
-    order = Order.objects.filter(order_number=order_id).first()
-    if order is None:
-        return JsonResponse({"message": "Pesanan tidak ditemukan."}, status=404)
-
-    normalized_status = (transaction_status or "").strip().upper()
-    success_states = {"SUCCESS", "COMPLETED", "PAID"}
-    pending_states = {"PENDING", "WAITING", "IN_PROGRESS"}
-    failure_states = {"FAILED", "CANCELLED", "EXPIRED", "VOID"}
-
-    if normalized_status in success_states and order.status != "paid":
-        order.status = "paid"
-        order.save(update_fields=["status"])
-    elif normalized_status in pending_states and order.status != "pending":
-        order.status = "pending"
-        order.save(update_fields=["status"])
-    elif normalized_status in failure_states and order.status != "cancelled":
-        with transaction.atomic():
-            restore_order_stock(order)
-            order.status = "cancelled"
-            order.save(update_fields=["status"])
-
-    request.session["doku_last_result"] = payload
-    request.session.modified = True
+    record_payment_event(
+        gateway=PaymentEvent.GATEWAY_DOKU,
+        order_number=order_id,
+        gateway_order_id=raw_order_id,
+        raw_status=transaction_status or "",
+        payload=payload,
+    )
 
-    response_payload = {"message": "Status pembayaran DOKU diterima.", "order_id": order_id}
+    response_payload = {"message": "Status pembayaran DOKU diterima.", "order_id": order_id, "queued": True}
     if raw_order_id and raw_order_id != order_id:
         response_payload["gateway_order_id"] = raw_order_id
-    if order:
-        response_payload["status"] = order.status
 
     return JsonResponse(response_payload)
 
@@ -1,4 +1,7 @@
 from django.contrib import admin
+
+from core.exports import SHIPMENT_EXPORT, export_actions
+
 from .models import District, Address, Shipment
 
 
@@ -118,6 +121,7 @@ class ShipmentAdmin(admin.ModelAdmin):
     ]
     list_select_related = ['order']
     readonly_fields = ['order', 'created_at', 'updated_at']
+    actions = export_actions(SHIPMENT_EXPORT)
 
     fieldsets = (
         ('Pesanan', {
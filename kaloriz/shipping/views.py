@@ -6,6 +6,7 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.db.models.deletion import ProtectedError
 from decimal import Decimal
+from core.services.session_state import get_checkout, set_checkout
 from .models import District, Address
 
 
@@ -334,12 +335,11 @@ def archive_address(request, address_id):
         address.is_deleted = True
         address.save(update_fields=['is_default', 'is_deleted', 'updated_at'])
 
-        checkout_data = request.session.get('checkout', {})
+        checkout_data = get_checkout(request)
         if checkout_data.get('address_id') == address.id:
             for key in ['address_id', 'shipping_method', 'shipping_cost', 'eta']:
                 checkout_data.pop(key, None)
-            request.session['checkout'] = checkout_data
-            request.session.modified = True
+            set_checkout(request, checkout_data)
 
         messages.success(request, 'Alamat diarsipkan. Alamat ini tidak akan tampil saat checkout.')
 